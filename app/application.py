@@ -0,0 +1,559 @@
+import asyncio
+import itertools
+import signal
+from functools import partial
+from typing import Callable, Coroutine
+
+import asyncpg
+import uvloop
+from fastapi import FastAPI
+from loguru import logger as LOGGER
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.sessions import SessionMiddleware
+
+from app.configs import Settings
+from app.db.crud_events import EVENTS_COLUMNS, KucoinEventsManager
+from app.db.crud_shadow_triggers import SHADOW_ALERTS_COLUMNS, KucoinShadowTriggersManager
+from app.db.crud_triggers import KucoinTriggersManager
+from app.db.models import KucoinEvent, KucoinShadowAlert
+from app.db.session import Database
+from app.managers.shadow_manager import restart_shadow_triggers
+from app.modules.amqp import AMQPClient
+from app.modules.batcher import CopyBatcher
+from app.modules.book_detector import BookDetector
+from app.modules.bot import TGBot
+from app.modules.cache import Cache
+from app.modules.candles import CandleStore
+from app.modules.clients.kucoin_api import APIClient
+from app.modules.clients.kucoin_ws import WSClient
+from app.modules.conflator import StateConflator
+from app.modules.leader import LeaderElection, get_election_name
+from app.modules.live_candles import LiveCandlesBuilder
+from app.modules.order_book import OrderBookManager
+from app.modules.ownership import SymbolOwnership
+from app.modules.prices import PriceSnapshot
+from app.modules.readiness import Readiness
+from app.modules.reconciler import TriggersReconciler
+from app.modules.scheduler import Scheduler
+from app.modules.shadow import ShadowEvaluator
+from app.modules.trades_archive import TradeArchive
+from app.modules.ws_server import WSServer
+from app.routers.account import accounts_router
+from app.routers.dashboard import dashboard_router
+from app.routers.detector import detector_router
+from app.routers.market import market_router
+from app.routers.system import system_router
+from app.utils.enums import AppRole, StartupPhase
+from app.utils.logger import CustomLogger, LogLevel
+from app.utils.tasks import (
+    TRIGGERING_MESSAGES_QUEUE,
+    listen_websocket,
+    process_triggered_data,
+    reconcile_triggers,
+    track_trigger_books,
+    update_prices,
+)
+
+
+asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+# in-process state saved on drain and restored on the next start
+SHADOW_STATE_KEY = "STATE-SHADOW"
+DASHBOARD_STATE_KEY = "STATE-DASHBOARD"
+
+
+class Application(FastAPI):
+    config: Settings
+    roles: set[AppRole]
+    is_ingest_elected: bool
+    singleton_roles: set[AppRole]
+    amqp_client: AMQPClient
+    api_client: APIClient
+    prices: PriceSnapshot
+    candles: CandleStore
+    live_candles: LiveCandlesBuilder
+    trades_archive: TradeArchive
+    order_books: OrderBookManager
+    book_detector: BookDetector | None
+    ws_client: WSClient
+    ws_server: WSServer
+    conflator: StateConflator
+    reconciler: TriggersReconciler
+    scheduler: Scheduler
+    bot: TGBot | None
+    cache: Cache | None
+    db: Database | None
+    db_triggers: KucoinTriggersManager | None
+    db_events: KucoinEventsManager | None
+    events: CopyBatcher
+    db_shadow_triggers: KucoinShadowTriggersManager | None
+    shadow_alerts: CopyBatcher
+    shadow: ShadowEvaluator
+    readiness: Readiness
+    leaders: dict[AppRole, LeaderElection]
+    ownership: SymbolOwnership | None
+    connection_id: str | None
+    running_tasks: list[asyncio.Task]
+    leader_tasks: dict[AppRole, list[asyncio.Task]]
+
+    def __init__(self, settings: Settings):
+        CustomLogger.make_logger(level=LogLevel.DEBUG)
+        self.docs_url = "/"
+        self.config = settings
+
+        self.roles = self.config.ROLES
+        self.connection_id = None
+        self.running_tasks = []
+        self.leader_tasks = {}
+        # sharded ingest runs on every node, otherwise ingest is a singleton run by the leader
+        self.is_ingest_elected = (
+            AppRole.INGEST in self.roles
+            and self.config.LEADER_ELECTION_ENABLED
+            and not self.config.INGEST_SHARDING_ENABLED
+        )
+        # roles run by a single node across replicas, processes without them don't join the election
+        self.singleton_roles = self.roles & {AppRole.SCHEDULER, AppRole.BOT}
+        if AppRole.INGEST in self.roles and not self.config.INGEST_SHARDING_ENABLED:
+            self.singleton_roles.add(AppRole.INGEST)
+        # without ingest there are no triggers to restore, the process is ready once probes are done,
+        # followers never restore triggers, so with election it is the same for every replica
+        is_restoring = AppRole.INGEST in self.roles and not self.is_ingest_elected
+        self.readiness = Readiness(
+            ready_phase=StartupPhase.TRIGGERS_RESTORED if is_restoring else StartupPhase.PROBES_DONE
+        )
+        self.amqp_client = AMQPClient(url=self.config.RABBITMQ_URL)
+        self.api_client = APIClient(
+            api_key=self.config.KUCOIN_API_KEY,
+            api_secret=self.config.KUCOIN_API_SECRET,
+            api_passphrase=self.config.KUCOIN_API_PASSPHRASE,
+        )
+        self.prices = PriceSnapshot(api_client=self.api_client)
+        self.candles = CandleStore(api_client=self.api_client, base_dir=self.config.CANDLES_DIR)
+        self.live_candles = LiveCandlesBuilder()
+        self.trades_archive = TradeArchive(base_dir=self.config.TRADES_DIR)
+        self.ws_client = WSClient()
+        self.book_detector = None
+        if self.config.BOOK_DETECTOR_ENABLED:
+            self.book_detector = BookDetector(
+                band_pct=self.config.BOOK_DETECTOR_BAND_PCT,
+                imbalance_threshold=self.config.BOOK_DETECTOR_IMBALANCE,
+                wall_notional=self.config.BOOK_DETECTOR_WALL_NOTIONAL,
+                cooldown_sec=self.config.BOOK_DETECTOR_COOLDOWN_SEC,
+            )
+        self.order_books = OrderBookManager(
+            api_client=self.api_client,
+            ws_client=self.ws_client,
+            detector=self.book_detector,
+        )
+        self.ws_server = WSServer()
+        self.conflator = StateConflator(ws_server=self.ws_server, rate_hz=self.config.DASHBOARD_STATE_HZ)
+        self.db = Database(
+            url=self.config.POSTGRES_URL,
+            echo=self.config.APP_DEBUG,
+            pool_size=self.config.POSTGRES_POOL_SIZE,
+            max_overflow=self.config.POSTGRES_MAX_OVERFLOW,
+            pool_recycle_sec=self.config.POSTGRES_POOL_RECYCLE_SEC,
+            statement_cache_size=self.config.POSTGRES_STATEMENT_CACHE_SIZE,
+        )
+        self.db_triggers = KucoinTriggersManager(db=self.db)
+        self.db_events = KucoinEventsManager(db=self.db)
+        self.events = CopyBatcher(
+            db=self.db,
+            table_name=KucoinEvent.__tablename__,
+            columns=EVENTS_COLUMNS,
+            max_rows=self.config.EVENTS_FLUSH_ROWS,
+            flush_interval_ms=self.config.EVENTS_FLUSH_INTERVAL_MS,
+        )
+        self.db_shadow_triggers = KucoinShadowTriggersManager(db=self.db)
+        self.shadow_alerts = CopyBatcher(
+            db=self.db,
+            table_name=KucoinShadowAlert.__tablename__,
+            columns=SHADOW_ALERTS_COLUMNS,
+            flush_interval_ms=self.config.EVENTS_FLUSH_INTERVAL_MS,
+        )
+        self.shadow = ShadowEvaluator(prices=self.prices, alerts=self.shadow_alerts)
+        self.cache = Cache(url=self.config.REDIS_URL, decode_responses=False)
+        self.bot = TGBot(
+            token=self.config.TELEGRAM_BOT_TOKEN,
+            admin_chat_id=self.config.TELEGRAM_ADMIN_CHAT_ID,
+            db_triggers=self.db_triggers,
+            cache=self.cache,
+        )
+        self.ownership = None
+        if self.config.INGEST_SHARDING_ENABLED:
+            self.ownership = SymbolOwnership(cache=self.cache, ttl_ms=self.config.INGEST_NODE_TTL_MS)
+        self.reconciler = TriggersReconciler(
+            db_triggers=self.db_triggers,
+            db_shadow_triggers=self.db_shadow_triggers,
+            ws_client=self.ws_client,
+            prices=self.prices,
+            cache=self.cache,
+            shadow=self.shadow,
+            concurrency=self.config.TRIGGERS_RESTORE_CONCURRENCY,
+            ownership=self.ownership,
+            handover_ttl_sec=self.config.WARM_STATE_TTL_SEC,
+        )
+        self.scheduler = Scheduler(cache=self.cache, db_events=self.db_events)
+        # one lease per role, processes without singleton roles don't join any election
+        self.leaders = {}
+        if self.config.LEADER_ELECTION_ENABLED:
+            self.leaders = {
+                role: LeaderElection(
+                    cache=self.cache,
+                    name=get_election_name(role=role),
+                    lease_ms=self.config.LEADER_LEASE_MS,
+                )
+                for role in self.singleton_roles
+            }
+
+        super().__init__(
+            title=self.config.APP_TITLE,
+            description=self.config.APP_DESCRIPTION,
+            docs_url=self.docs_url,
+        )
+
+        self.add_event_handler("startup", self.mount_routers)
+        self.add_event_handler("startup", self.run_probes)
+        self.add_event_handler("startup", self.run_tasks)
+
+        self.add_event_handler("shutdown", self.drain)
+        self.add_event_handler("shutdown", self.stop_db_listener)
+        self.add_event_handler("shutdown", self.close_amqp)
+        self.add_event_handler("shutdown", self.stop_bot)
+
+        self.add_middleware(
+            middleware_class=SessionMiddleware,
+            secret_key=self.config.APP_SECRET_KEY,
+            max_age=self.config.APP_EXPIRE_TOKEN,
+        )
+        self.add_middleware(
+            middleware_class=CORSMiddleware,
+            allow_origins=["*"],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+        self.handle_shutdown_signals()
+
+    async def run_probes(self) -> None:
+        # probes don't depend on each other, websocket only waits for the connection id from cache
+        probes = [self.ping_db(), self.ping_bot()]
+        if self.roles & {AppRole.INGEST, AppRole.CONSUMER}:
+            probes.append(self.connect_amqp())
+        if AppRole.INGEST in self.roles and not self.is_ingest_elected:
+            probes.append(self.start_ws())
+        else:
+            probes.append(self.ping_cache())
+        await asyncio.gather(*probes)
+        self.readiness.mark(StartupPhase.PROBES_DONE)
+
+    async def connect_amqp(self) -> None:
+        await self.amqp_client.connect()
+        self.readiness.set_component(name="amqp", is_available=True)
+
+    async def ping_db(self) -> None:
+        is_available = await self.db.ping()
+        self.readiness.set_component(name="db", is_available=is_available)
+        if not is_available:
+            self.db = None
+            return
+        try:
+            await self.db_triggers.start_listening()
+        except (OSError, asyncpg.PostgresError) as e:
+            LOGGER.error(f"[MAIN] Triggers listener is not started, reading triggers from database: {e}")
+        await self.db_events.ensure_partitions()
+
+    async def ping_cache(self) -> None:
+        is_connected, connection_id = await self.cache.ping()
+        self.readiness.set_component(name="cache", is_available=is_connected)
+        if not is_connected:
+            self.cache = None
+            return
+        self.connection_id = connection_id
+
+    async def ping_bot(self) -> None:
+        if not self.config.TELEGRAM_BOT_ENABLED:
+            self.bot = None
+            return
+        # other roles only send notifications, webhook is reset by the poller
+        if AppRole.BOT in self.roles:
+            await self.bot.prestart()
+        self.readiness.set_component(name="bot", is_available=True)
+
+    async def start_ws(self) -> None:
+        await self.ping_cache()
+        await self.ws_client.start(self.connection_id)
+        self.readiness.mark(StartupPhase.WS_CONNECTED)
+
+    async def restart_triggers(self) -> None:
+        shadow_state, dashboard_state = None, None
+        if self.cache:
+            shadow_state, dashboard_state = await self.cache.get_many(names=[SHADOW_STATE_KEY, DASHBOARD_STATE_KEY])
+        if dashboard_state:
+            self.conflator.restore(states=dashboard_state)
+        if self.ownership:
+            # shadow windows of sharded nodes are handed over per symbol, the node joins before taking them
+            shadow_state = None
+            await self.ownership.heartbeat()
+
+        # shadow triggers are loaded first, so the reconciler keeps their subscriptions
+        await restart_shadow_triggers(
+            db_shadow_triggers=self.db_shadow_triggers,
+            shadow=self.shadow,
+            ws_client=self.ws_client,
+            state=shadow_state,
+        )
+        await self.reconciler.reconcile()
+        self.readiness.mark(StartupPhase.TRIGGERS_RESTORED)
+
+    def add_task(self, coro: Coroutine, name: str) -> None:
+        self.running_tasks.append(asyncio.create_task(coro, name=name))
+
+    def add_leader_task(self, coro: Coroutine, name: str, role: AppRole) -> None:
+        self.leader_tasks.setdefault(role, []).append(asyncio.create_task(coro, name=name))
+
+    async def run_tasks(self) -> None:
+        LOGGER.debug(f"[MAIN] ROLES: {sorted(self.roles)}")
+        if AppRole.INGEST in self.roles and self.ownership:
+            self.run_ingest_tasks(add_task=self.add_task)
+        if AppRole.CONSUMER in self.roles:
+            self.run_consumer_tasks()
+        if self.roles & {AppRole.INGEST, AppRole.CONSUMER}:
+            # events are written by both ingest and consumer, dashboard state is updated by both
+            self.add_task(self.events.run(), name="write_events")
+            self.add_task(self.conflator.run(), name="flush_dashboard_state")
+        if self.cache:
+            # dashboards connect to api processes, which may be other processes than the publishing ones
+            if self.roles & {AppRole.INGEST, AppRole.CONSUMER}:
+                self.ws_server.enable_relay()
+                self.add_task(self.ws_server.run_relay(cache=self.cache), name="relay_dashboard")
+            if AppRole.API in self.roles:
+                self.add_task(self.ws_server.run_listener(cache=self.cache), name="deliver_dashboard")
+        if AppRole.SCHEDULER in self.roles:
+            await self.scheduler.add_tasks()
+        for role in sorted(self.singleton_roles):
+            leader = self.leaders.get(role)
+            if leader:
+                self.add_task(
+                    leader.run(lead=partial(self.lead, role=role), on_change=partial(self.on_leader_change, role=role)),
+                    name=f"leader_election_{role}",
+                )
+            else:
+                self.add_task(self.lead(role=role), name=f"lead_{role}")
+        task_names = [task.get_name() for task in self.running_tasks]
+        LOGGER.warning(f"[MAIN] RUNNING TASKS: {task_names}")
+
+    async def lead(self, role: AppRole) -> None:
+        """
+        Run a role that must have a single instance across replicas: scheduler, bot or not sharded ingest.
+
+        Without election every process is the leader, with election it is run while the role lease is held.
+        """
+        add_task = partial(self.add_leader_task, role=role)
+        try:
+            if role == AppRole.INGEST:
+                if not self.ws_client.is_connected:
+                    await self.start_ws()
+                self.run_ingest_tasks(add_task=add_task)
+            elif role == AppRole.SCHEDULER:
+                LOGGER.debug("5. STARTING SCHEDULER")
+                add_task(self.scheduler.start(), name="start_scheduler")
+            elif role == AppRole.BOT and self.bot:
+                LOGGER.debug("6. STARTING BOT")
+                add_task(self.bot.start(), name="start_bot_polling")
+            task_names = [task.get_name() for task in self.leader_tasks.get(role, [])]
+            LOGGER.warning(f"[MAIN] RUNNING {role} TASKS: {task_names}")
+            await asyncio.Event().wait()
+        finally:
+            tasks = self.leader_tasks.pop(role, [])
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if role == AppRole.INGEST:
+                # socket is reopened by the next leadership, subscriptions are restored by its reconcile,
+                # books are tracked again on it from a fresh snapshot
+                for symbol in list(self.order_books.books):
+                    await self.order_books.unwatch(symbol=symbol)
+                await self.close_ws()
+
+    def on_leader_change(self, is_leader: bool, role: AppRole) -> None:
+        # messages published by the previous ingest leader are dropped by consumers once the token is newer,
+        # sharded ingest nodes are not elected, so their messages are not fenced
+        if role == AppRole.INGEST:
+            self.amqp_client.fencing_token = self.leaders[role].token if is_leader else None
+        self.readiness.set_component(name=f"leader_{role}", is_available=is_leader)
+
+    def run_ingest_tasks(self, add_task: Callable[..., None]) -> None:
+        # restart subscriptions for triggers in database, then reconcile them on change
+        LOGGER.debug("1. RESTARTING TRIGGERS")
+        add_task(self.restart_triggers(), name="restart_triggers")
+        check_period_sec = 5
+        if self.ownership:
+            add_task(self.ownership.run(), name="ingest_heartbeat")
+            check_period_sec = self.ownership.heartbeat_interval_sec
+        add_task(
+            reconcile_triggers(reconciler=self.reconciler, check_period_sec=check_period_sec),
+            name="reconcile_triggers",
+        )
+
+        # add price listener for triggers
+        LOGGER.debug("2. UPDATING PRICES")
+        add_task(
+            update_prices(
+                prices=self.prices,
+                cache=self.cache,
+                db_triggers=self.db_triggers,
+                ownership=self.ownership,
+            ),
+            name="update_prices",
+        )
+
+        # start listening for messages
+        LOGGER.debug("3. LISTENING WEBSOCKETS")
+        add_task(
+            listen_websocket(
+                ws_client=self.ws_client,
+                cache=self.cache,
+                amqp_client=self.amqp_client,
+                live_candles=self.live_candles,
+                order_books=self.order_books,
+                ws_server=self.ws_server,
+                events=self.events,
+                trades_archive=self.trades_archive,
+                shadow=self.shadow,
+                conflator=self.conflator,
+                readiness=self.readiness,
+            ),
+            name="listen_websocket",
+        )
+
+        # start writing trades archive and shadow alerts in batches
+        LOGGER.debug("4.1. WRITING TRADES ARCHIVE")
+        add_task(self.trades_archive.run(), name="write_trades_archive")
+        add_task(self.shadow_alerts.run(), name="write_shadow_alerts")
+
+        # mirror order books of triggers symbols, order book routes serve them from memory
+        LOGGER.debug("4.2. TRACKING ORDER BOOKS")
+        add_task(
+            track_trigger_books(
+                db_triggers=self.db_triggers,
+                order_books=self.order_books,
+                ownership=self.ownership,
+            ),
+            name="track_trigger_books",
+        )
+
+        # start order book detector for triggers symbols
+        if self.book_detector:
+            LOGGER.debug("4.3. STARTING ORDER BOOK DETECTOR")
+            add_task(
+                self.book_detector.process_alerts(bot=self.bot, ws_server=self.ws_server),
+                name="process_book_alerts",
+            )
+
+    def run_consumer_tasks(self) -> None:
+        # start processing triggered messages
+        LOGGER.debug("4. PROCESSING TRIGGERED DATA")
+        self.add_task(
+            process_triggered_data(
+                cache=self.cache,
+                bot=self.bot,
+                amqp_client=self.amqp_client,
+                events=self.events,
+                ws_server=self.ws_server,
+                conflator=self.conflator,
+                is_fenced=self.config.LEADER_ELECTION_ENABLED,
+            ),
+            name="process_triggered_data",
+        )
+
+    def get_task(self, name: str) -> asyncio.Task | None:
+        tasks = [*self.running_tasks, *itertools.chain.from_iterable(self.leader_tasks.values())]
+        return next((task for task in tasks if task.get_name() == name), None)
+
+    async def drain(self) -> None:
+        """
+        Stop reading the socket, let triggered messages be processed, save in-process state and stop tasks.
+
+        Buffered events, shadow alerts and trades are flushed by their tasks on cancel.
+        Window counters and notified flags of live triggers are already kept in redis.
+        """
+        if self.readiness.is_draining:
+            return
+        self.readiness.is_draining = True
+        LOGGER.warning("[MAIN] DRAINING")
+        deadline = asyncio.get_running_loop().time() + self.config.DRAIN_TIMEOUT_SEC
+
+        # closed socket ends the listener loop after the message being processed
+        await self.close_ws()
+        listen_task = self.get_task(name="listen_websocket")
+        if listen_task:
+            await asyncio.wait([listen_task], timeout=self.config.DRAIN_TIMEOUT_SEC)
+
+        # unacked messages are redelivered after restart, so waiting is bounded
+        while self.amqp_client.channel and asyncio.get_running_loop().time() < deadline:
+            try:
+                if not await self.amqp_client.get_message_count(queue_name=TRIGGERING_MESSAGES_QUEUE):
+                    break
+            except Exception as e:
+                LOGGER.error(f"[MAIN] Triggered messages are not drained: {e}")
+                break
+            await asyncio.sleep(0.1)
+
+        # only the node which was ingesting has the state, followers must not overwrite it
+        if self.cache and listen_task:
+            try:
+                await self.save_state()
+            except Exception as e:
+                LOGGER.error(f"[MAIN] State is not saved: {e}")
+        await self.stop_tasks()
+
+    async def save_state(self) -> None:
+        objects = {DASHBOARD_STATE_KEY: self.conflator.states}
+        if self.ownership:
+            # owned symbols go to the nodes left, or back to this one if it is the only node
+            await self.reconciler.release_all()
+        else:
+            objects[SHADOW_STATE_KEY] = self.shadow.dump()
+        await self.cache.save_state(objects=objects, ttl_seconds=self.config.WARM_STATE_TTL_SEC)
+
+    async def stop_tasks(self) -> None:
+        LOGGER.warning("[MAIN] STOPPING TASKS")
+
+        for task in self.running_tasks:
+            task_name = task.get_name()
+            LOGGER.warning(f"[MAIN] STOPPING TASK: {task_name}")
+            task.cancel()
+
+        # Wait for tasks to be cancelled
+        await asyncio.gather(*self.running_tasks, return_exceptions=True)
+
+    def handle_shutdown_signals(self):
+        loop = asyncio.get_event_loop()
+
+        # Register signal handlers
+        loop.add_signal_handler(signal.SIGINT, lambda: asyncio.create_task(self.drain()))
+        loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.drain()))
+
+    async def stop_bot(self) -> None:
+        LOGGER.debug("[MAIN] Stopping BOT")
+        await self.bot.stop()
+
+    async def close_ws(self) -> None:
+        LOGGER.debug("[MAIN] Closing WS")
+        await self.ws_client.stop()
+
+    async def stop_db_listener(self) -> None:
+        LOGGER.debug("[MAIN] Stopping triggers listener")
+        await self.db_triggers.stop_listening()
+
+    async def close_amqp(self) -> None:
+        LOGGER.debug("[MAIN] Closing AMQP")
+        await self.amqp_client.close_connection()
+
+    def mount_routers(self) -> None:
+        self.include_router(router=dashboard_router, prefix="/api/v1", tags=["Dashboard"])
+        self.include_router(router=detector_router, prefix="/api/v1", tags=["Detector"])
+        self.include_router(router=market_router, prefix="/api/v1", tags=["Market"])
+        self.include_router(router=accounts_router, prefix="/api/v1", tags=["Accounts"])
+        self.include_router(router=system_router, prefix="/api/v1", tags=["System"])
@@ -1,5 +1,7 @@
 from pydantic import BaseSettings
 
+from app.utils.enums import AppRole
+
 
 class Settings(BaseSettings):
     APP_DEBUG: bool = False
@@ -7,12 +9,42 @@ class Settings(BaseSettings):
     APP_DESCRIPTION: str = "Still the best."
     APP_SECRET_KEY: str = "wowthatissupersecretwow"
     APP_EXPIRE_TOKEN: int = 60 * 60 * 24 * 7 * 2  # two weeks in seconds
+    # comma separated roles started by the process, see `AppRole`
+    APP_ROLES: str = ",".join(AppRole)
+
+    @property
+    def ROLES(self) -> set[AppRole]:
+        return {AppRole(role.strip().lower()) for role in self.APP_ROLES.split(",") if role.strip()}
 
     KUCOIN_API: str = "https://api.kucoin.com"
     KUCOIN_API_KEY: str
     KUCOIN_API_SECRET: str
     KUCOIN_API_PASSPHRASE: str
 
+    CANDLES_DIR: str = "data/candles"
+    TRADES_DIR: str = "data/trades"
+    BACKTEST_WORKERS: int = 4
+
+    DASHBOARD_STATE_HZ: float = 4
+
+    TRIGGERS_RESTORE_CONCURRENCY: int = 10
+    DRAIN_TIMEOUT_SEC: float = 10
+    WARM_STATE_TTL_SEC: int = 600
+
+    # ingest, scheduler and bot run only on the leader replica
+    LEADER_ELECTION_ENABLED: bool = False
+    LEADER_LEASE_MS: int = 5000
+
+    # ingest nodes split symbols between them instead of electing a single one
+    INGEST_SHARDING_ENABLED: bool = False
+    INGEST_NODE_TTL_MS: int = 6000
+
+    BOOK_DETECTOR_ENABLED: bool = False
+    BOOK_DETECTOR_BAND_PCT: float = 2.0
+    BOOK_DETECTOR_IMBALANCE: float = 0.6
+    BOOK_DETECTOR_WALL_NOTIONAL: float = 50_000.0
+    BOOK_DETECTOR_COOLDOWN_SEC: int = 300
+
     TELEGRAM_BOT_ENABLED: bool
     TELEGRAM_BOT_TOKEN: str
     TELEGRAM_ADMIN_CHAT_ID: int
@@ -22,6 +54,13 @@ class Settings(BaseSettings):
     POSTGRES_HOST: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
+    POSTGRES_POOL_SIZE: int = 10
+    POSTGRES_MAX_OVERFLOW: int = 20
+    POSTGRES_POOL_RECYCLE_SEC: int = 1800
+    POSTGRES_STATEMENT_CACHE_SIZE: int = 500
+
+    EVENTS_FLUSH_ROWS: int = 1000
+    EVENTS_FLUSH_INTERVAL_MS: int = 500
 
     @property
     def POSTGRES_URL(self) -> str:
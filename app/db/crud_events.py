@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from loguru import logger as LOGGER
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.models import KucoinEvent
+from app.db.session import Database
+from app.utils.enums import EventKind
+
+
+# columns written by the events batcher, id is generated by the database
+EVENTS_COLUMNS = tuple(column.key for column in KucoinEvent.__table__.columns if column.key != "id")
+
+
+def next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+@dataclass
+class KucoinEventsManager:
+    db: Database
+
+    async def get_list(
+        self,
+        start_at: datetime,
+        end_at: datetime,
+        symbol: str | None = None,
+        kind: EventKind | None = None,
+        limit: int = 100,
+    ) -> list[KucoinEvent]:
+        query = (
+            select(KucoinEvent)
+            .where(KucoinEvent.time >= start_at, KucoinEvent.time < end_at)
+            .order_by(KucoinEvent.time.desc())
+            .limit(limit)
+        )
+        if symbol:
+            query = query.where(KucoinEvent.symbol == symbol)
+        if kind:
+            query = query.where(KucoinEvent.kind == kind)
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            return result.all()
+
+    async def ensure_partitions(self, months_ahead: int = 1) -> None:
+        """Create monthly partitions of events table for the current and next months"""
+        partition_start = date.today().replace(day=1)
+        try:
+            async with self.db.session() as session:
+                for _ in range(months_ahead + 1):
+                    partition_end = next_month(partition_start)
+                    partition_name = f"{KucoinEvent.__tablename__}_{partition_start:%Y_%m}"
+                    await session.execute(
+                        text(
+                            f"CREATE TABLE IF NOT EXISTS {partition_name} PARTITION OF {KucoinEvent.__tablename__} "
+                            f"FOR VALUES FROM ('{partition_start}') TO ('{partition_end}')"
+                        )
+                    )
+                    partition_start = partition_end
+                await session.commit()
+        except SQLAlchemyError as e:
+            LOGGER.error(f"[DB] Events partitions are not created: {e}")
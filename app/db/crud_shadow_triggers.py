@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import delete, func, select
+
+from app.db.models import KucoinShadowAlert, KucoinShadowTrigger
+from app.db.session import Database
+from app.utils.enums import TradeSide, TriggerPeriods
+
+
+# columns written by the shadow alerts batcher, id is generated by the database
+SHADOW_ALERTS_COLUMNS = tuple(column.key for column in KucoinShadowAlert.__table__.columns if column.key != "id")
+
+
+@dataclass
+class KucoinShadowTriggersManager:
+    db: Database
+
+    async def create(
+        self,
+        from_symbol: str,
+        to_symbol: str,
+        min_value_usdt: float,
+        max_value_usdt: float,
+        transactions_max_count: int,
+        side: TradeSide,
+        period_seconds: TriggerPeriods,
+        cooldown_seconds: int,
+    ) -> KucoinShadowTrigger:
+        new_trigger = KucoinShadowTrigger(
+            from_symbol=from_symbol,
+            to_symbol=to_symbol,
+            min_value_usdt=min_value_usdt,
+            max_value_usdt=max_value_usdt,
+            transactions_max_count=transactions_max_count,
+            side=side,
+            period_seconds=period_seconds,
+            cooldown_seconds=cooldown_seconds,
+            started_at=datetime.utcnow(),
+        )
+        async with self.db.session() as session:
+            session.add(new_trigger)
+            await session.commit()
+        return new_trigger
+
+    async def get_list(self, from_symbol: str | None = None, to_symbol: str | None = None) -> list[KucoinShadowTrigger]:
+        query = select(KucoinShadowTrigger).order_by(KucoinShadowTrigger.id)
+        if from_symbol:
+            query = query.where(KucoinShadowTrigger.from_symbol == from_symbol)
+        if to_symbol:
+            query = query.where(KucoinShadowTrigger.to_symbol == to_symbol)
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            return result.all()
+
+    async def remove(self, trigger_id: int) -> KucoinShadowTrigger | None:
+        query = (
+            delete(KucoinShadowTrigger)
+            .where(KucoinShadowTrigger.id == trigger_id)
+            .returning(KucoinShadowTrigger)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            deleted_trigger = result.one_or_none()
+            await session.commit()
+        return deleted_trigger
+
+    async def get_alerts_stats(self, since: datetime | None = None) -> dict[int, tuple[int, datetime]]:
+        """Shadow trigger id -> (alerts count, last alert time)"""
+        query = select(
+            KucoinShadowAlert.shadow_trigger_id,
+            func.count(),
+            func.max(KucoinShadowAlert.time),
+        ).group_by(KucoinShadowAlert.shadow_trigger_id)
+        if since:
+            query = query.where(KucoinShadowAlert.time >= since)
+        async with self.db.session() as session:
+            result = await session.execute(query)
+            return {trigger_id: (alerts_count, last_alert_at) for trigger_id, alerts_count, last_alert_at in result}
@@ -1,19 +1,129 @@
-from dataclasses import dataclass
+import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime
 
+import asyncpg
+import orjson
 from loguru import logger as LOGGER
-from sqlalchemy import exists, select
+from sqlalchemy import delete, exists, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 
 from app.db.models import KucoinTrigger
 from app.db.session import Database
 from app.utils.enums import TradeSide, TriggerPeriods
 
 
+# channel of the `kucoin_triggers_notify` database trigger
+TRIGGERS_CHANNEL = "kucoin_triggers_changes"
+LISTEN_RECONNECT_DELAY_SEC = 5
+
+
 @dataclass
 class KucoinTriggersManager:
+    """
+    Triggers CRUD with an in-memory snapshot of the table.
+
+    Snapshot is loaded once and kept up to date by NOTIFY of the `kucoin_triggers_notify` database trigger,
+    so changes made by other replicas are applied incrementally. Reads are served from the snapshot
+    and fall back to the database while it is not loaded.
+    """
+
     db: Database
+    version: int = 0
+    is_loaded: bool = False
+    _triggers: dict[int, KucoinTrigger] = field(default_factory=dict, init=False, repr=False)
+    _ids_by_pair: dict[tuple[str, str], int] = field(default_factory=dict, init=False, repr=False)
+    _pending_changes: list[tuple[KucoinTrigger, bool]] | None = field(default=None, init=False, repr=False)
+    _listen_connection: asyncpg.Connection | None = field(default=None, init=False, repr=False)
+    _reconnect_task: asyncio.Task | None = field(default=None, init=False, repr=False)
+
+    async def start_listening(self) -> None:
+        """LISTEN for triggers changes, then load the snapshot. Changes received while loading are replayed"""
+        self._pending_changes = []
+        try:
+            self._listen_connection = await self.db.connect_raw()
+            self._listen_connection.add_termination_listener(self.on_connection_lost)
+            await self._listen_connection.add_listener(TRIGGERS_CHANNEL, self.on_notification)
+            await self.load_snapshot()
+        finally:
+            pending_changes, self._pending_changes = self._pending_changes, None
+        for trigger, deleted in pending_changes:
+            self.apply(trigger=trigger, deleted=deleted)
+        LOGGER.debug(f"[DB] Listening for triggers changes, snapshot version {self.version}")
+
+    async def stop_listening(self) -> None:
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        connection, self._listen_connection = self._listen_connection, None
+        if connection and not connection.is_closed():
+            connection.remove_termination_listener(self.on_connection_lost)
+            await connection.close()
+        self.is_loaded = False
+
+    def on_connection_lost(self, connection: asyncpg.Connection) -> None:
+        # notifications may be missed until reconnected, so reads go to the database meanwhile
+        LOGGER.warning("[DB] Triggers listener connection lost, reconnecting")
+        self.is_loaded = False
+        self._listen_connection = None
+        if self._reconnect_task is None:
+            self._reconnect_task = asyncio.create_task(self.reconnect(), name="triggers_listener_reconnect")
+
+    async def reconnect(self) -> None:
+        try:
+            while True:
+                await asyncio.sleep(LISTEN_RECONNECT_DELAY_SEC)
+                try:
+                    await self.start_listening()
+                    return
+                except (OSError, asyncpg.PostgresError) as e:
+                    LOGGER.error(f"[DB] Triggers listener reconnect failed: {e}")
+        finally:
+            self._reconnect_task = None
+
+    def on_notification(self, connection: asyncpg.Connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            change = orjson.loads(payload)
+            trigger = self.row_to_trigger(row=change["row"])
+        except (orjson.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            LOGGER.error(f"[DB] Bad triggers notification {payload}: {e}")
+            return
+        deleted = change["op"] == "DELETE"
+        if self._pending_changes is not None:
+            self._pending_changes.append((trigger, deleted))
+            return
+        self.apply(trigger=trigger, deleted=deleted)
+
+    @staticmethod
+    def row_to_trigger(row: dict) -> KucoinTrigger:
+        values = {column.key: row.get(column.key) for column in KucoinTrigger.__table__.columns}
+        if values["started_at"]:
+            values["started_at"] = datetime.fromisoformat(values["started_at"])
+        return KucoinTrigger(**values)
+
+    async def load_snapshot(self) -> None:
+        query = select(KucoinTrigger).order_by(KucoinTrigger.id)
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            triggers = result.all()
+        self._triggers = {trigger.id: trigger for trigger in triggers}
+        self._ids_by_pair = {(trigger.from_symbol, trigger.to_symbol): trigger.id for trigger in triggers}
+        self.version += 1
+        self.is_loaded = True
+
+    def apply(self, trigger: KucoinTrigger, deleted: bool = False) -> None:
+        """Apply a single change to the snapshot, applying the same change twice is a no-op"""
+        old_trigger = self._triggers.pop(trigger.id, None)
+        if old_trigger:
+            self._ids_by_pair.pop((old_trigger.from_symbol, old_trigger.to_symbol), None)
+        if not deleted:
+            self._triggers[trigger.id] = trigger
+            self._ids_by_pair[(trigger.from_symbol, trigger.to_symbol)] = trigger.id
+        self.version += 1
 
     async def already_exists(self, from_symbol: str, to_symbol: str) -> bool:
+        if self.is_loaded:
+            return (from_symbol, to_symbol) in self._ids_by_pair
         query = select(exists().where(KucoinTrigger.from_symbol == from_symbol, KucoinTrigger.to_symbol == to_symbol))
         async with self.db.session() as session:
             result = await session.execute(query)
@@ -28,42 +138,155 @@ class KucoinTriggersManager:
         transactions_max_count: int,
         side: TradeSide,
         period_seconds: TriggerPeriods,
+        cooldown_seconds: int,
     ) -> KucoinTrigger | None:
-        if await self.already_exists(from_symbol=from_symbol, to_symbol=to_symbol):
+        """Insert a trigger in one statement, returns None if the pair already has a trigger"""
+        query = (
+            insert(KucoinTrigger)
+            .values(
+                from_symbol=from_symbol,
+                to_symbol=to_symbol,
+                min_value_usdt=min_value_usdt,
+                max_value_usdt=max_value_usdt,
+                transactions_max_count=transactions_max_count,
+                side=side,
+                period_seconds=period_seconds,
+                cooldown_seconds=cooldown_seconds,
+                started_at=datetime.utcnow(),
+            )
+            .on_conflict_do_nothing(index_elements=[KucoinTrigger.from_symbol, KucoinTrigger.to_symbol])
+            .returning(KucoinTrigger)
+        )
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            new_trigger = result.one_or_none()
+            await session.commit()
+        if new_trigger is None:
             LOGGER.debug(f"[DB] Trigger already exists: {from_symbol}-{to_symbol}")
             return None
-        new_trigger = KucoinTrigger(
-            from_symbol=from_symbol,
-            to_symbol=to_symbol,
-            min_value_usdt=min_value_usdt,
-            max_value_usdt=max_value_usdt,
-            transactions_max_count=transactions_max_count,
-            side=side,
-            period_seconds=period_seconds,
-            started_at=datetime.utcnow(),
+        self.apply(trigger=new_trigger)
+        return new_trigger
+
+    async def update(
+        self,
+        from_symbol: str,
+        to_symbol: str,
+        min_value_usdt: float,
+        max_value_usdt: float,
+        transactions_max_count: int,
+        side: TradeSide,
+        period_seconds: TriggerPeriods,
+        cooldown_seconds: int,
+    ) -> KucoinTrigger | None:
+        """Update trigger params of the pair in one statement, returns None if there is no trigger"""
+        query = (
+            update(KucoinTrigger)
+            .where(KucoinTrigger.from_symbol == from_symbol, KucoinTrigger.to_symbol == to_symbol)
+            .values(
+                min_value_usdt=min_value_usdt,
+                max_value_usdt=max_value_usdt,
+                transactions_max_count=transactions_max_count,
+                side=side,
+                period_seconds=period_seconds,
+                cooldown_seconds=cooldown_seconds,
+            )
+            .returning(KucoinTrigger)
+            .execution_options(synchronize_session=False)
         )
         async with self.db.session() as session:
-            session.add(new_trigger)
+            result = await session.scalars(query)
+            updated_trigger = result.one_or_none()
             await session.commit()
-            await session.refresh(new_trigger)
-        return new_trigger
+        if updated_trigger:
+            self.apply(trigger=updated_trigger)
+        return updated_trigger
 
     async def get(self, from_symbol: str, to_symbol: str) -> KucoinTrigger | None:
+        if self.is_loaded:
+            trigger_id = self._ids_by_pair.get((from_symbol, to_symbol))
+            return self._triggers.get(trigger_id)
         query = select(KucoinTrigger).filter_by(from_symbol=from_symbol, to_symbol=to_symbol)
         async with self.db.session() as session:
             result = await session.execute(query)
             return result.scalar()
 
-    async def get_list(self) -> list[KucoinTrigger] | None:
-        query = select(KucoinTrigger).order_by(KucoinTrigger.id)
+    async def get_list(
+        self,
+        offset: int = 0,
+        limit: int | None = None,
+        symbol_prefix: str | None = None,
+        side: TradeSide | None = None,
+    ) -> list[KucoinTrigger] | None:
+        if self.is_loaded:
+            triggers = sorted(self._triggers.values(), key=lambda trigger: trigger.id)
+            if symbol_prefix:
+                triggers = [trigger for trigger in triggers if trigger.from_symbol.startswith(symbol_prefix)]
+            if side:
+                triggers = [trigger for trigger in triggers if trigger.side == side]
+            end = offset + limit if limit else None
+            return triggers[offset:end]
+
+        query = select(KucoinTrigger).order_by(KucoinTrigger.id).offset(offset).limit(limit)
+        if symbol_prefix:
+            query = query.where(KucoinTrigger.from_symbol.startswith(symbol_prefix, autoescape=True))
+        if side:
+            query = query.where(KucoinTrigger.side == side)
         async with self.db.session() as session:
             result = await session.execute(query)
             return result.scalars().all()
 
     async def remove(self, from_symbol: str, to_symbol: str) -> KucoinTrigger | None:
-        db_trigger = await self.get(from_symbol=from_symbol, to_symbol=to_symbol)
-        if db_trigger:
-            async with self.db.session() as session:
-                await session.delete(db_trigger)
-                await session.commit()
-        return db_trigger
+        query = (
+            delete(KucoinTrigger)
+            .where(KucoinTrigger.from_symbol == from_symbol, KucoinTrigger.to_symbol == to_symbol)
+            .returning(KucoinTrigger)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            deleted_trigger = result.one_or_none()
+            await session.commit()
+        if deleted_trigger:
+            self.apply(trigger=deleted_trigger, deleted=True)
+        return deleted_trigger
+
+    async def bulk_create(self, triggers: list[dict]) -> list[KucoinTrigger]:
+        """Create triggers in one statement, pairs that already exist are skipped"""
+        started_at = datetime.utcnow()
+        new_triggers = {}
+        for trigger in triggers:
+            pair = (trigger["from_symbol"], trigger["to_symbol"])
+            new_triggers.setdefault(pair, {**trigger, "started_at": started_at})
+        if not new_triggers:
+            return []
+
+        query = (
+            insert(KucoinTrigger)
+            .values(list(new_triggers.values()))
+            .on_conflict_do_nothing(index_elements=[KucoinTrigger.from_symbol, KucoinTrigger.to_symbol])
+            .returning(KucoinTrigger)
+        )
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            created_triggers = result.all()
+            await session.commit()
+        if len(created_triggers) < len(new_triggers):
+            LOGGER.debug(f"[DB] Triggers already exist: {len(new_triggers) - len(created_triggers)}")
+        for trigger in created_triggers:
+            self.apply(trigger=trigger)
+        return created_triggers
+
+    async def bulk_remove(self, pairs: list[tuple[str, str]]) -> list[KucoinTrigger]:
+        query = (
+            delete(KucoinTrigger)
+            .where(tuple_(KucoinTrigger.from_symbol, KucoinTrigger.to_symbol).in_(pairs))
+            .returning(KucoinTrigger)
+            .execution_options(synchronize_session=False)
+        )
+        async with self.db.session() as session:
+            result = await session.scalars(query)
+            removed_triggers = result.all()
+            await session.commit()
+        for trigger in removed_triggers:
+            self.apply(trigger=trigger, deleted=True)
+        return removed_triggers
@@ -0,0 +1,51 @@
+"""add_kucoin_triggers_notify
+
+Revision ID: 5c3e9a7d41b2
+Revises: ba092c65fbd8
+Create Date: 2023-06-05 10:20:41.318904+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "5c3e9a7d41b2"
+down_revision = "ba092c65fbd8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # every change of kucoin_triggers is sent to listeners as {"op": ..., "row": ...}
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_kucoin_triggers() RETURNS trigger AS $$
+        DECLARE
+            changed_row kucoin_triggers;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                changed_row := OLD;
+            ELSE
+                changed_row := NEW;
+            END IF;
+            PERFORM pg_notify(
+                'kucoin_triggers_changes',
+                json_build_object('op', TG_OP, 'row', row_to_json(changed_row))::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER kucoin_triggers_notify
+        AFTER INSERT OR UPDATE OR DELETE ON kucoin_triggers
+        FOR EACH ROW EXECUTE FUNCTION notify_kucoin_triggers();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS kucoin_triggers_notify ON kucoin_triggers;")
+    op.execute("DROP FUNCTION IF EXISTS notify_kucoin_triggers();")
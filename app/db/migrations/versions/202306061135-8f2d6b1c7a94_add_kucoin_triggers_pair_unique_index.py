@@ -0,0 +1,33 @@
+"""add_kucoin_triggers_pair_unique_index
+
+Revision ID: 8f2d6b1c7a94
+Revises: 5c3e9a7d41b2
+Create Date: 2023-06-06 11:35:12.904127+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "8f2d6b1c7a94"
+down_revision = "5c3e9a7d41b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # keep the oldest trigger of each pair before making pairs unique
+    op.execute(
+        """
+        DELETE FROM kucoin_triggers AS duplicate
+        USING kucoin_triggers AS original
+        WHERE duplicate.from_symbol = original.from_symbol
+            AND duplicate.to_symbol = original.to_symbol
+            AND duplicate.id > original.id;
+        """
+    )
+    op.create_index("ix_kucoin_triggers_pair", "kucoin_triggers", ["from_symbol", "to_symbol"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_kucoin_triggers_pair", table_name="kucoin_triggers")
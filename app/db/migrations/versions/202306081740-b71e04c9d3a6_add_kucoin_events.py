@@ -0,0 +1,40 @@
+"""add_kucoin_events
+
+Revision ID: b71e04c9d3a6
+Revises: 8f2d6b1c7a94
+Create Date: 2023-06-08 17:40:27.551863+00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "b71e04c9d3a6"
+down_revision = "8f2d6b1c7a94"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # monthly partitions are created by the application, default one catches rows out of them
+    op.execute(
+        """
+        CREATE TABLE kucoin_events (
+            id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            time TIMESTAMP WITH TIME ZONE NOT NULL,
+            kind VARCHAR NOT NULL,
+            symbol VARCHAR NOT NULL,
+            side VARCHAR,
+            size DOUBLE PRECISION,
+            value_usdt DOUBLE PRECISION,
+            transactions_count INTEGER,
+            PRIMARY KEY (id, time)
+        ) PARTITION BY RANGE (time);
+        """
+    )
+    op.execute("CREATE TABLE kucoin_events_default PARTITION OF kucoin_events DEFAULT;")
+    op.execute("CREATE INDEX ix_kucoin_events_time ON kucoin_events USING brin (time);")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS kucoin_events;")
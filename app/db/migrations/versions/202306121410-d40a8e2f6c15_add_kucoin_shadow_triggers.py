@@ -0,0 +1,55 @@
+"""add_kucoin_shadow_triggers
+
+Revision ID: d40a8e2f6c15
+Revises: b71e04c9d3a6
+Create Date: 2023-06-12 14:10:53.207719+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "d40a8e2f6c15"
+down_revision = "b71e04c9d3a6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "kucoin_shadow_triggers",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("from_symbol", sa.String(), nullable=True),
+        sa.Column("to_symbol", sa.String(), nullable=True),
+        sa.Column("min_value_usdt", sa.Float(), nullable=True),
+        sa.Column("max_value_usdt", sa.Float(), nullable=True),
+        sa.Column("transactions_max_count", sa.Integer(), nullable=True),
+        sa.Column("side", sa.String(), nullable=True),
+        sa.Column("period_seconds", sa.Integer(), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=False), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_kucoin_shadow_triggers_from_symbol", "kucoin_shadow_triggers", ["from_symbol"])
+    op.create_table(
+        "kucoin_shadow_alerts",
+        sa.Column("id", sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column("shadow_trigger_id", sa.Integer(), nullable=False),
+        sa.Column("time", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("symbol", sa.String(), nullable=False),
+        sa.Column("transactions_count", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["shadow_trigger_id"], ["kucoin_shadow_triggers.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_kucoin_shadow_alerts_trigger_time",
+        "kucoin_shadow_alerts",
+        ["shadow_trigger_id", "time"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_kucoin_shadow_alerts_trigger_time", table_name="kucoin_shadow_alerts")
+    op.drop_table("kucoin_shadow_alerts")
+    op.drop_index("ix_kucoin_shadow_triggers_from_symbol", table_name="kucoin_shadow_triggers")
+    op.drop_table("kucoin_shadow_triggers")
@@ -0,0 +1,30 @@
+"""add_triggers_cooldown
+
+Revision ID: e5b18c3f92a7
+Revises: d40a8e2f6c15
+Create Date: 2023-06-14 10:25:17.604318+00:00
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b18c3f92a7"
+down_revision = "d40a8e2f6c15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing triggers keep the hourly re-arm they had before
+    for table_name in ("kucoin_triggers", "kucoin_shadow_triggers"):
+        op.add_column(
+            table_name,
+            sa.Column("cooldown_seconds", sa.Integer(), nullable=False, server_default="3600"),
+        )
+
+
+def downgrade() -> None:
+    for table_name in ("kucoin_triggers", "kucoin_shadow_triggers"):
+        op.drop_column(table_name, "cooldown_seconds")
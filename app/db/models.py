@@ -1,16 +1,19 @@
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String
+from sqlalchemy import BigInteger, Column, DateTime, Float, ForeignKey, Identity, Index, Integer, MetaData, String
 
 from app.db.session import Base
-from app.utils.enums import TradeSide, TriggerPeriods
+from app.utils.enums import EventKind, TradeSide, TriggerPeriods
 
 
 metadata = MetaData()
 
+DEFAULT_COOLDOWN_SECONDS = 60 * 60
+
 
 class KucoinTrigger(Base):
     __tablename__ = "kucoin_triggers"
+    __table_args__ = (Index("ix_kucoin_triggers_pair", "from_symbol", "to_symbol", unique=True),)
     metadata = metadata
 
     id: int = Column(Integer, primary_key=True)
@@ -24,4 +27,70 @@ class KucoinTrigger(Base):
     transactions_max_count: int = Column(Integer)
     side: TradeSide = Column(String)
     period_seconds: TriggerPeriods = Column(Integer)
+    # notifications are muted for this long after an alert
+    cooldown_seconds: int = Column(
+        Integer, nullable=False, default=DEFAULT_COOLDOWN_SECONDS, server_default=str(DEFAULT_COOLDOWN_SECONDS)
+    )
     started_at: datetime = Column(DateTime(timezone=False), default=datetime.utcnow)
+
+
+class KucoinEvent(Base):
+    """Triggering trades and fired alerts, range partitioned by time"""
+
+    __tablename__ = "kucoin_events"
+    __table_args__ = (
+        Index("ix_kucoin_events_time", "time", postgresql_using="brin"),
+        {"postgresql_partition_by": "RANGE (time)"},
+    )
+    metadata = metadata
+
+    id: int = Column(BigInteger, Identity(), primary_key=True)
+    time: datetime = Column(DateTime(timezone=True), primary_key=True)
+
+    kind: EventKind = Column(String, nullable=False)
+    symbol: str = Column(String, nullable=False)
+    side: TradeSide = Column(String)
+
+    size: float = Column(Float)
+    value_usdt: float = Column(Float)
+    transactions_count: int = Column(Integer)
+
+
+class KucoinShadowTrigger(Base):
+    """Candidate trigger params evaluated on the live stream, alerts are only recorded"""
+
+    __tablename__ = "kucoin_shadow_triggers"
+    metadata = metadata
+
+    id: int = Column(Integer, primary_key=True)
+
+    from_symbol: str = Column(String, index=True)
+    to_symbol: str = Column(String)
+
+    min_value_usdt: float = Column(Float)
+    max_value_usdt: float = Column(Float)
+
+    transactions_max_count: int = Column(Integer)
+    side: TradeSide = Column(String)
+    period_seconds: TriggerPeriods = Column(Integer)
+    # would-be alerts are not recorded again for this long
+    cooldown_seconds: int = Column(
+        Integer, nullable=False, default=DEFAULT_COOLDOWN_SECONDS, server_default=str(DEFAULT_COOLDOWN_SECONDS)
+    )
+    started_at: datetime = Column(DateTime(timezone=False), default=datetime.utcnow)
+
+
+class KucoinShadowAlert(Base):
+    __tablename__ = "kucoin_shadow_alerts"
+    __table_args__ = (Index("ix_kucoin_shadow_alerts_trigger_time", "shadow_trigger_id", "time"),)
+    metadata = metadata
+
+    id: int = Column(BigInteger, Identity(), primary_key=True)
+    shadow_trigger_id: int = Column(
+        Integer,
+        ForeignKey("kucoin_shadow_triggers.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    time: datetime = Column(DateTime(timezone=True), nullable=False)
+    symbol: str = Column(String, nullable=False)
+    transactions_count: int = Column(Integer)
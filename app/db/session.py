@@ -2,6 +2,7 @@ from asyncio import current_task
 from contextlib import asynccontextmanager
 from typing import Any, AsyncGenerator
 
+import asyncpg
 from loguru import logger as LOGGER
 from sqlalchemy import MetaData, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session, async_sessionmaker, create_async_engine
@@ -25,8 +26,24 @@ class Base:
 
 
 class Database:
-    def __init__(self, url: str, echo: bool = False) -> None:
-        self._engine = create_async_engine(url=url, echo=echo)
+    def __init__(
+        self,
+        url: str,
+        echo: bool = False,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        pool_recycle_sec: int = 1800,
+        statement_cache_size: int = 500,
+    ) -> None:
+        self._engine = create_async_engine(
+            url=url,
+            echo=echo,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            pool_recycle=pool_recycle_sec,
+            connect_args={"prepared_statement_cache_size": statement_cache_size},
+        )
         self._async_session_factory = async_scoped_session(
             async_sessionmaker(
                 bind=self._engine,
@@ -51,6 +68,22 @@ class Database:
             await session.close()
             await self._async_session_factory.remove()
 
+    @property
+    def dsn(self) -> str:
+        """Plain postgres url for raw asyncpg connections"""
+        return self._engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+    async def connect_raw(self) -> asyncpg.Connection:
+        """Dedicated asyncpg connection outside of the pool, e.g. for LISTEN"""
+        return await asyncpg.connect(dsn=self.dsn)
+
+    @asynccontextmanager
+    async def raw_connection(self) -> AsyncGenerator[asyncpg.Connection, None]:
+        """asyncpg connection from the engine pool, for driver level calls like COPY"""
+        async with self._engine.connect() as connection:
+            raw_connection = await connection.get_raw_connection()
+            yield raw_connection.driver_connection
+
     async def ping(self) -> bool:
         try:
             async with self.session() as session:
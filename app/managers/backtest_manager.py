@@ -0,0 +1,56 @@
+import asyncio
+
+from fastapi import HTTPException, status
+from loguru import logger as LOGGER
+
+from app.modules import backtest
+from app.modules.prices import PriceSnapshot
+from app.modules.trades_archive import TradeArchive
+from app.utils.enums import ExampleSymbols
+from app.utils.schemas import BacktestRequestSchema
+
+
+MAX_BACKTEST_CONFIGS = 1000
+
+
+async def run_backtest(
+    data: BacktestRequestSchema,
+    trades_archive: TradeArchive,
+    prices: PriceSnapshot,
+    max_workers: int,
+) -> list[dict]:
+    configs = backtest.make_grid(
+        min_value_usdt=data.min_value_usdt,
+        max_value_usdt=data.max_value_usdt,
+        transactions_max_count=data.transactions_max_count,
+        period_seconds=data.period_seconds,
+        side=data.side,
+        cooldown_seconds=data.cooldown_seconds,
+    )
+    if len(configs) > MAX_BACKTEST_CONFIGS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many parameters combinations: {len(configs)}, max is {MAX_BACKTEST_CONFIGS}",
+        )
+
+    start_ns = int(data.from_time.timestamp() * 1_000_000_000)
+    end_ns = int(data.to_time.timestamp() * 1_000_000_000)
+    trades_by_symbol = {}
+    quote_prices_usdt = {}
+    for pair in data.pairs:
+        symbol = f"{pair.from_symbol.upper()}-{pair.to_symbol.upper()}"
+        trades_by_symbol[symbol] = await asyncio.to_thread(
+            trades_archive.query, symbol=symbol, start_ns=start_ns, end_ns=end_ns
+        )
+        # trade values are converted to USDT by current quote price, as cached trigger prices are not archived
+        if pair.to_symbol.upper() != ExampleSymbols.USDT:
+            quote_prices_usdt[symbol] = float(await prices.get_price_in_usdt(from_symbol=pair.to_symbol.upper()))
+
+    trades_count = sum(len(trades["time"]) for trades in trades_by_symbol.values())
+    LOGGER.debug(f"[BACKTEST] {len(configs)} configs, {len(trades_by_symbol)} symbols, {trades_count} trades")
+    return await backtest.run_grid(
+        trades_by_symbol=trades_by_symbol,
+        configs=configs,
+        quote_prices_usdt=quote_prices_usdt,
+        max_workers=max_workers,
+    )
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from loguru import logger as LOGGER
+
+from app.db.crud_shadow_triggers import KucoinShadowTriggersManager
+from app.db.crud_triggers import KucoinTriggersManager
+from app.modules.clients.kucoin_ws import WSClient
+from app.modules.shadow import ShadowEvaluator
+from app.utils.schemas import AddTriggerRequestSchema, ShadowTriggerSchema
+
+
+async def get_all(
+    db_shadow_triggers: KucoinShadowTriggersManager,
+    since: datetime | None = None,
+) -> list[ShadowTriggerSchema]:
+    shadow_triggers = await db_shadow_triggers.get_list()
+    alerts_stats = await db_shadow_triggers.get_alerts_stats(since=since)
+    result = []
+    for trigger in shadow_triggers:
+        alerts_count, last_alert_at = alerts_stats.get(trigger.id, (0, None))
+        result.append(
+            ShadowTriggerSchema.from_orm(trigger).copy(
+                update={"alerts_count": alerts_count, "last_alert_at": last_alert_at},
+            )
+        )
+    return result
+
+
+async def add_shadow_trigger(
+    data: AddTriggerRequestSchema,
+    db_shadow_triggers: KucoinShadowTriggersManager,
+    shadow: ShadowEvaluator,
+    ws_client: WSClient,
+) -> ShadowTriggerSchema:
+    new_trigger = await db_shadow_triggers.create(**data.dict())
+    shadow.add(trigger=new_trigger)
+    await ws_client.subscribe(from_symbol=data.from_symbol, to_symbol=data.to_symbol)
+    return ShadowTriggerSchema.from_orm(new_trigger)
+
+
+async def remove_shadow_trigger(
+    trigger_id: int,
+    db_shadow_triggers: KucoinShadowTriggersManager,
+    db_triggers: KucoinTriggersManager,
+    shadow: ShadowEvaluator,
+    ws_client: WSClient,
+) -> ShadowTriggerSchema:
+    deleted_trigger = await db_shadow_triggers.remove(trigger_id=trigger_id)
+    if not deleted_trigger:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Shadow trigger was not found: {trigger_id}",
+        )
+    shadow.remove(trigger=deleted_trigger)
+
+    # keep the subscription while the pair has a live trigger or other shadow triggers
+    from_symbol, to_symbol = deleted_trigger.from_symbol, deleted_trigger.to_symbol
+    is_watched = f"{from_symbol}-{to_symbol}" in shadow.symbols or await db_triggers.already_exists(
+        from_symbol=from_symbol, to_symbol=to_symbol
+    )
+    if not is_watched:
+        await ws_client.unsubscribe(from_symbol=from_symbol, to_symbol=to_symbol)
+    return ShadowTriggerSchema.from_orm(deleted_trigger)
+
+
+async def restart_shadow_triggers(
+    db_shadow_triggers: KucoinShadowTriggersManager,
+    shadow: ShadowEvaluator,
+    ws_client: WSClient,
+    state: dict | None = None,
+) -> None:
+    LOGGER.debug("[TASK] Restarting shadow triggers...")
+    shadow.load(triggers=await db_shadow_triggers.get_list(), state=state)
+    unsubscribed_symbols = sorted(shadow.symbols - ws_client.subscribed)
+    if unsubscribed_symbols:
+        await ws_client.subscribe_many(pairs=[tuple(symbol.split("-")) for symbol in unsubscribed_symbols])
+    LOGGER.debug("[TASK] Restarting shadow triggers... Finished!")
@@ -1,34 +1,48 @@
 from fastapi import HTTPException, status
-from loguru import logger as LOGGER
 
 from app.db.crud_triggers import KucoinTriggersManager
 from app.modules.cache import Cache
-from app.modules.clients.kucoin_api import APIClient
 from app.modules.clients.kucoin_ws import WSClient
+from app.modules.prices import PriceSnapshot
+from app.modules.shadow import ShadowEvaluator
+from app.utils.enums import TradeSide
 from app.utils.schemas import (
     AddTriggerRequestSchema,
     CachedTriggerSchema,
     GetSingleTriggerSchema,
+    SingleTriggerSchema,
     TriggerExistsResponseSchema,
+    TriggerPairSchema,
 )
 
 
 async def get_all(
     db_triggers: KucoinTriggersManager,
     cache: Cache,
+    offset: int = 0,
+    limit: int | None = None,
+    symbol_prefix: str | None = None,
+    side: TradeSide | None = None,
 ) -> list[GetSingleTriggerSchema]:
-    triggers_list = await db_triggers.get_list()
+    triggers_list = await db_triggers.get_list(offset=offset, limit=limit, symbol_prefix=symbol_prefix, side=side)
+    if not triggers_list:
+        return []
+
+    # counts for all triggers are fetched in one round trip
+    periods = {f"EVENTS-{trigger.from_symbol}-{trigger.to_symbol}": trigger.period_seconds for trigger in triggers_list}
+    counts = await cache.get_counts(periods=periods)
+
+    result = []
     for trigger in triggers_list:
-        cached_trigger_key = f"{trigger.from_symbol}-{trigger.to_symbol}"
-        cached_transactions_count = await cache.get_count(name=f"EVENTS-{cached_trigger_key}")
-        trigger.transactions_count = cached_transactions_count
-        current_count = await cache.get_count_for_period(
-            name=f"EVENTS-{cached_trigger_key}",
-            period_seconds=trigger.period_seconds,
+        transactions_count, current_count = counts[f"EVENTS-{trigger.from_symbol}-{trigger.to_symbol}"]
+        result.append(
+            GetSingleTriggerSchema(
+                **SingleTriggerSchema.from_orm(trigger).dict(),
+                transactions_count=transactions_count,
+                current_count=current_count,
+            )
         )
-        trigger.current_count = current_count
-
-    return [GetSingleTriggerSchema.from_orm(trigger) for trigger in triggers_list]
+    return result
 
 
 async def already_exists(
@@ -56,17 +70,19 @@ async def get_trigger(
     # get cached trigger
     cached_trigger_key = f"{from_symbol}-{to_symbol}"
     cached_trigger = await cache.get(name=cached_trigger_key)
-    response.price_usdt = cached_trigger["price_usdt"] if cached_trigger else None
     cached_transactions_count = await cache.get_count(name=f"EVENTS-{cached_trigger_key}")
-    response.transactions_count = cached_transactions_count
-    return GetSingleTriggerSchema.from_orm(response)
+    return GetSingleTriggerSchema(
+        **SingleTriggerSchema.from_orm(response).dict(),
+        price_usdt=cached_trigger["price_usdt"] if cached_trigger else None,
+        transactions_count=cached_transactions_count,
+    )
 
 
 async def add_trigger(
     data: AddTriggerRequestSchema,
     db_triggers: KucoinTriggersManager,
     ws_client: WSClient,
-    api_client: APIClient,
+    prices: PriceSnapshot,
     cache: Cache,
 ) -> GetSingleTriggerSchema:
     """
@@ -79,7 +95,7 @@ async def add_trigger(
             detail=f"Couldn't create a trigger for pair {data.from_symbol}-{data.to_symbol}",
         )
     # get current ticker for 'from_symbol' in USDT
-    price_usdt = await api_client.get_price_in_usdt(from_symbol=data.from_symbol)
+    price_usdt = await prices.get_price_in_usdt(from_symbol=data.from_symbol)
 
     # add trigger with price to cache
     cached_trigger_key = f"{data.from_symbol}-{data.to_symbol}"
@@ -90,14 +106,46 @@ async def add_trigger(
         max_value_usdt=data.max_value_usdt,
         transactions_max_count=data.transactions_max_count,
         period_seconds=data.period_seconds,
+        cooldown_seconds=data.cooldown_seconds,
         side=data.side,
-        is_notified=False,
     )
     await cache.add(name=cached_trigger_key, obj=cached_trigger_data.dict())
-    new_trigger.price_usdt = price_usdt
 
     await ws_client.subscribe(from_symbol=data.from_symbol, to_symbol=data.to_symbol)
-    return GetSingleTriggerSchema.from_orm(new_trigger)
+    return GetSingleTriggerSchema(**SingleTriggerSchema.from_orm(new_trigger).dict(), price_usdt=price_usdt)
+
+
+async def update_trigger(
+    data: AddTriggerRequestSchema,
+    db_triggers: KucoinTriggersManager,
+    prices: PriceSnapshot,
+    cache: Cache,
+) -> GetSingleTriggerSchema:
+    """
+    Update trigger params in place, subscription and collected events are kept.
+    """
+    updated_trigger = await db_triggers.update(**data.dict())
+    if not updated_trigger:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trigger was not found for pair {data.from_symbol}-{data.to_symbol}",
+        )
+    price_usdt = await prices.get_price_in_usdt(from_symbol=data.from_symbol)
+
+    # replace cached trigger params
+    cached_trigger_key = f"{data.from_symbol}-{data.to_symbol}"
+    cached_trigger_data = CachedTriggerSchema(
+        price_usdt=price_usdt,
+        min_value_usdt=data.min_value_usdt,
+        max_value_usdt=data.max_value_usdt,
+        transactions_max_count=data.transactions_max_count,
+        period_seconds=data.period_seconds,
+        cooldown_seconds=data.cooldown_seconds,
+        side=data.side,
+    )
+    await cache.add(name=cached_trigger_key, obj=cached_trigger_data.dict())
+    await cache.reset_notified(names=[cached_trigger_key])
+    return GetSingleTriggerSchema(**SingleTriggerSchema.from_orm(updated_trigger).dict(), price_usdt=price_usdt)
 
 
 async def remove_trigger(
@@ -106,8 +154,8 @@ async def remove_trigger(
     db_triggers: KucoinTriggersManager,
     ws_client: WSClient,
     cache: Cache,
+    shadow: ShadowEvaluator,
 ) -> GetSingleTriggerSchema:
-    await ws_client.unsubscribe(from_symbol=from_symbol, to_symbol=to_symbol)
     deleted_trigger = await db_triggers.remove(from_symbol=from_symbol, to_symbol=to_symbol)
     if not deleted_trigger:
         raise HTTPException(
@@ -116,59 +164,94 @@ async def remove_trigger(
         )
     cached_trigger_key = f"{from_symbol}-{to_symbol}"
 
+    # keep the subscription while the pair has shadow triggers
+    if cached_trigger_key not in shadow.symbols:
+        await ws_client.unsubscribe(from_symbol=from_symbol, to_symbol=to_symbol)
+
     # remove trigger from cache
-    await cache.delete(cached_trigger_key)
-    await cache.delete(f"EVENTS-{cached_trigger_key}")
+    await cache.bulk_delete(
+        names=[cached_trigger_key, f"EVENTS-{cached_trigger_key}", f"NOTIFIED-{cached_trigger_key}"]
+    )
     return GetSingleTriggerSchema.from_orm(deleted_trigger)
 
 
-async def restart_triggers(
+async def add_triggers(
+    data: list[AddTriggerRequestSchema],
     db_triggers: KucoinTriggersManager,
     ws_client: WSClient,
-    api_client: APIClient,
+    prices: PriceSnapshot,
     cache: Cache,
-) -> None:
-    # 1. get triggers from db
-    LOGGER.debug("[TASK] Restarting triggers...")
-    all_triggers = await db_triggers.get_list()
-    await cache.reset_cache()
-    for trigger in all_triggers:
-        cached_trigger_key = f"{trigger.from_symbol}-{trigger.to_symbol}"
-
-        LOGGER.debug(f"[TASK] Restarting triggers... {cached_trigger_key}")
-        price_usdt = await api_client.get_price_in_usdt(from_symbol=trigger.from_symbol)
+) -> list[GetSingleTriggerSchema]:
+    new_triggers = await db_triggers.bulk_create(
+        triggers=[
+            {**trigger.dict(), "from_symbol": trigger.from_symbol.upper(), "to_symbol": trigger.to_symbol.upper()}
+            for trigger in data
+        ]
+    )
+    if not new_triggers:
+        return []
 
-        # 2. add triggers to cache
+    cached_triggers, response = {}, []
+    for trigger in new_triggers:
+        price_usdt = await prices.get_price_in_usdt(from_symbol=trigger.from_symbol)
         cached_trigger_data = CachedTriggerSchema(
             price_usdt=price_usdt,
             min_value_usdt=trigger.min_value_usdt,
             max_value_usdt=trigger.max_value_usdt,
             transactions_max_count=trigger.transactions_max_count,
             period_seconds=trigger.period_seconds,
+            cooldown_seconds=trigger.cooldown_seconds,
             side=trigger.side,
-            is_notified=False,
         )
-        await cache.add(name=cached_trigger_key, obj=cached_trigger_data.dict())
+        cached_triggers[f"{trigger.from_symbol}-{trigger.to_symbol}"] = cached_trigger_data.dict()
+        response.append(GetSingleTriggerSchema(**SingleTriggerSchema.from_orm(trigger).dict(), price_usdt=price_usdt))
+    await cache.bulk_add(objects=cached_triggers)
 
-        # 3. add subscriptions for each trigger
-        await ws_client.subscribe(from_symbol=trigger.from_symbol, to_symbol=trigger.to_symbol)
-    LOGGER.debug("[TASK] Restarting triggers... Finished!")
+    await ws_client.subscribe_many(pairs=[(trigger.from_symbol, trigger.to_symbol) for trigger in new_triggers])
+    return response
+
+
+async def remove_triggers(
+    data: list[TriggerPairSchema],
+    db_triggers: KucoinTriggersManager,
+    ws_client: WSClient,
+    cache: Cache,
+    shadow: ShadowEvaluator,
+) -> list[GetSingleTriggerSchema]:
+    pairs = [(pair.from_symbol, pair.to_symbol) for pair in data]
+    removed_triggers = await db_triggers.bulk_remove(pairs=pairs)
+    if not removed_triggers:
+        return []
+
+    removed_pairs = [(trigger.from_symbol, trigger.to_symbol) for trigger in removed_triggers]
+    # keep subscriptions of pairs with shadow triggers
+    unwatched_pairs = [pair for pair in removed_pairs if "-".join(pair) not in shadow.symbols]
+    if unwatched_pairs:
+        await ws_client.subscribe_many(pairs=unwatched_pairs, subscription=False)
+
+    # remove triggers, their events and notified flags from cache
+    cached_trigger_keys = [f"{from_symbol}-{to_symbol}" for from_symbol, to_symbol in removed_pairs]
+    await cache.bulk_delete(
+        names=[f"{prefix}{key}" for key in cached_trigger_keys for prefix in ("", "EVENTS-", "NOTIFIED-")]
+    )
+    return [GetSingleTriggerSchema.from_orm(trigger) for trigger in removed_triggers]
 
 
 async def remove_all_triggers(
     db_triggers: KucoinTriggersManager,
     ws_client: WSClient,
     cache: Cache,
+    shadow: ShadowEvaluator,
 ) -> list[GetSingleTriggerSchema]:
-    removed_triggers = []
     all_triggers = await db_triggers.get_list()
-    for trigger in all_triggers:
-        removed_trigger = await remove_trigger(
-            from_symbol=trigger.from_symbol,
-            to_symbol=trigger.to_symbol,
-            db_triggers=db_triggers,
-            ws_client=ws_client,
-            cache=cache,
-        )
-        removed_triggers.append(removed_trigger)
-    return [GetSingleTriggerSchema.from_orm(trigger) for trigger in removed_triggers]
+    all_pairs = [
+        TriggerPairSchema(from_symbol=trigger.from_symbol, to_symbol=trigger.to_symbol) for trigger in all_triggers
+    ]
+    removed_triggers = await remove_triggers(
+        data=all_pairs,
+        db_triggers=db_triggers,
+        ws_client=ws_client,
+        cache=cache,
+        shadow=shadow,
+    )
+    return removed_triggers
@@ -13,11 +13,14 @@ class AMQPClient:
     url: str
     channel: AbstractChannel | None
     connection: AbstractConnection | None
+    fencing_token: int | None
 
     def __init__(self, url: str):
         self.url = url
         self.channel = None
         self.connection = None
+        # set while the node is the leader, published messages carry it
+        self.fencing_token = None
 
     async def connect(self):
         """Create AMQP connection"""
@@ -34,6 +37,8 @@ class AMQPClient:
     async def publish(self, queue_name: str, data: dict):
         """Publish message to exchange"""
         # 1. prepare message
+        if self.fencing_token is not None:
+            data = {**data, "fencing_token": self.fencing_token}
         message_body = orjson.dumps(data, default=default_decimal_serializer)
         # 2. create message
         message: AbstractMessage = Message(
@@ -60,6 +65,11 @@ class AMQPClient:
         except ChannelInvalidStateError:
             await self.close_connection()
 
+    async def get_message_count(self, queue_name: str) -> int:
+        """Count of messages ready in queue, not counting ones delivered and not acked yet"""
+        queue = await self.channel.declare_queue(name=queue_name, durable=True)
+        return queue.declaration_result.message_count
+
     async def close_connection(self):
         """Close connection."""
         if self.connection:
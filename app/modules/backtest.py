@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from app.utils.enums import TradeSide
+
+
+# trades of the backtested symbols, set once in each worker process
+_worker_trades: dict[str, dict[str, np.ndarray]] = {}
+
+
+def get_windowed_counts(event_times: np.ndarray, period_ns: int) -> np.ndarray:
+    """
+    Count of events in [time - period, time] at each event of sorted event times, as the running event count
+    minus events before the window.
+    """
+    events_before = np.searchsorted(event_times, event_times - period_ns, side="left")
+    return np.arange(1, len(event_times) + 1) - events_before
+
+
+def find_alerts(
+    trades: dict[str, np.ndarray],
+    min_value_usdt: float,
+    max_value_usdt: float,
+    transactions_max_count: int,
+    period_seconds: int,
+    side: TradeSide,
+    cooldown_seconds: int,
+    quote_price_usdt: float = 1.0,
+) -> np.ndarray:
+    """Alert times in ns by `check_if_triggering` and `process_triggered_data` rules, one alert per cooldown"""
+    times, prices, sizes, sides = trades["time"], trades["price"], trades["size"], trades["side"]
+    values_usdt = prices * sizes * quote_price_usdt
+    is_event = (min_value_usdt < values_usdt) & (values_usdt < max_value_usdt)
+    if side == TradeSide.BUY:
+        is_event &= sides > 0
+    elif side == TradeSide.SELL:
+        is_event &= sides < 0
+
+    event_times = times[is_event]
+    counts = get_windowed_counts(event_times=event_times, period_ns=period_seconds * 1_000_000_000)
+    alert_times = event_times[counts == transactions_max_count]
+    return apply_cooldown(alert_times=alert_times, cooldown_ns=cooldown_seconds * 1_000_000_000)
+
+
+def apply_cooldown(alert_times: np.ndarray, cooldown_ns: int) -> np.ndarray:
+    """Keep alerts sent after the previous alert cooldown expired, jumping over muted ones by bisect"""
+    indexes = []
+    index = 0
+    while index < len(alert_times):
+        indexes.append(index)
+        index = int(np.searchsorted(alert_times, alert_times[index] + cooldown_ns, side="left"))
+    return alert_times[indexes]
+
+
+def set_worker_trades(trades_by_symbol: dict[str, dict[str, np.ndarray]]) -> None:
+    global _worker_trades
+    _worker_trades = trades_by_symbol
+
+
+def run_config(config: dict, quote_prices_usdt: dict[str, float]) -> dict:
+    alerts = {}
+    for symbol, trades in _worker_trades.items():
+        alert_times = find_alerts(trades=trades, quote_price_usdt=quote_prices_usdt.get(symbol, 1.0), **config)
+        if len(alert_times):
+            alerts[symbol] = (alert_times // 1_000_000_000).tolist()
+    return {**config, "alerts_count": sum(len(times) for times in alerts.values()), "alerts": alerts}
+
+
+def make_grid(**params: list) -> list[dict]:
+    """All combinations of the given parameter values"""
+    return [dict(zip(params, values)) for values in itertools.product(*params.values())]
+
+
+async def run_grid(
+    trades_by_symbol: dict[str, dict[str, np.ndarray]],
+    configs: list[dict],
+    quote_prices_usdt: dict[str, float],
+    max_workers: int,
+) -> list[dict]:
+    """Backtest each config on a process pool, trades are sent to each worker once"""
+    loop = asyncio.get_running_loop()
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=set_worker_trades,
+        initargs=(trades_by_symbol,),
+    )
+    try:
+        return await asyncio.gather(
+            *[loop.run_in_executor(executor, run_config, config, quote_prices_usdt) for config in configs]
+        )
+    finally:
+        # not waited, so a cancelled request doesn't block the event loop until every queued config is done,
+        # queued configs are dropped and workers exit after the running ones
+        executor.shutdown(wait=False, cancel_futures=True)
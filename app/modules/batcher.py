@@ -0,0 +1,78 @@
+import asyncio
+
+import asyncpg
+from loguru import logger as LOGGER
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.db.session import Database
+
+
+class CopyBatcher:
+    """
+    Buffers rows in memory and writes them to a table with COPY in batches.
+
+    `put` never waits for the database: rows are flushed every `flush_interval_ms` or as soon as
+    `max_rows` are buffered, rows above `max_buffered_rows` are dropped while the database is slow or down.
+    """
+
+    db: Database
+    table_name: str
+    columns: tuple[str, ...]
+    max_rows: int
+    flush_interval_sec: float
+    max_buffered_rows: int
+    dropped_count: int
+
+    def __init__(
+        self,
+        db: Database,
+        table_name: str,
+        columns: tuple[str, ...],
+        max_rows: int = 1000,
+        flush_interval_ms: int = 500,
+        max_buffered_rows: int = 100_000,
+    ):
+        self.db = db
+        self.table_name = table_name
+        self.columns = columns
+        self.max_rows = max_rows
+        self.flush_interval_sec = flush_interval_ms / 1000
+        self.max_buffered_rows = max_buffered_rows
+        self.dropped_count = 0
+        self._rows: list[tuple] = []
+        self._is_full = asyncio.Event()
+
+    def put(self, row: dict) -> None:
+        if len(self._rows) >= self.max_buffered_rows:
+            if not self.dropped_count % self.max_rows:
+                LOGGER.warning(f"[BATCHER] {self.table_name}: buffer is full, dropping rows")
+            self.dropped_count += 1
+            return
+        self._rows.append(tuple(row.get(column) for column in self.columns))
+        if len(self._rows) >= self.max_rows:
+            self._is_full.set()
+
+    async def flush(self) -> None:
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        self._is_full.clear()
+        try:
+            async with self.db.raw_connection() as connection:
+                await connection.copy_records_to_table(self.table_name, records=rows, columns=self.columns)
+        except (OSError, asyncpg.PostgresError, SQLAlchemyError) as e:
+            self.dropped_count += len(rows)
+            LOGGER.error(f"[BATCHER] {self.table_name}: {len(rows)} rows dropped, flush failed: {e}")
+
+    async def run(self) -> None:
+        """Flush buffered rows periodically, remaining rows are flushed on cancel"""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._is_full.wait(), timeout=self.flush_interval_sec)
+                except asyncio.TimeoutError:
+                    pass
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
@@ -0,0 +1,214 @@
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from dataclasses import asdict, dataclass
+
+from loguru import logger as LOGGER
+
+from app.modules.bot import TGBot
+from app.modules.ws_server import WSServer
+from app.utils.enums import BookAlertKind, DashboardTopicKind, TradeSide
+
+
+# full resum of band depth once in a while to drop accumulated float error
+RESUM_EVERY_DELTAS = 10_000
+
+
+@dataclass
+class BookAlert:
+    symbol: str
+    kind: BookAlertKind
+    side: TradeSide | None
+    price: float | None
+    notional: float
+    imbalance: float
+    time: float
+
+
+class BookDetectorState:
+    """
+    Bid/ask notional within `band_pct` of mid for a single order book.
+
+    Depth is updated on every level change, band edges moves are applied by summing
+    only the levels between the old and the new edge, so the book is never re-summed on delta.
+    """
+
+    symbol: str
+    bid_bound: float
+    ask_bound: float
+    bid_depth: float
+    ask_depth: float
+    is_imbalanced: bool
+
+    def __init__(self, symbol: str, detector: "BookDetector"):
+        self.symbol = symbol
+        self.detector = detector
+        self.bid_bound = 0.0
+        self.ask_bound = 0.0
+        self.bid_depth = 0.0
+        self.ask_depth = 0.0
+        self.is_imbalanced = False
+        self.deltas_count = 0
+
+    @property
+    def imbalance(self) -> float:
+        total = self.bid_depth + self.ask_depth
+        if not total:
+            return 0.0
+        return (self.bid_depth - self.ask_depth) / total
+
+    @staticmethod
+    def sum_notional(prices: list[float], sizes: list[float], start: int, end: int) -> float:
+        return sum(prices[index] * sizes[index] for index in range(start, end))
+
+    def get_bounds(self, book) -> tuple[float, float] | None:
+        if not book.bids.prices or not book.asks.prices:
+            return None
+        mid = (book.bids.prices[-1] + book.asks.prices[0]) / 2
+        band = self.detector.band_pct / 100
+        return mid * (1 - band), mid * (1 + band)
+
+    def reset(self, book) -> None:
+        """Full depth calculation, called on snapshot load"""
+        bounds = self.get_bounds(book)
+        if bounds is None:
+            self.bid_bound = self.ask_bound = self.bid_depth = self.ask_depth = 0.0
+            return
+        self.bid_bound, self.ask_bound = bounds
+        bids, asks = book.bids, book.asks
+        self.bid_depth = self.sum_notional(
+            bids.prices, bids.sizes, bisect_left(bids.prices, self.bid_bound), len(bids.prices)
+        )
+        self.ask_depth = self.sum_notional(asks.prices, asks.sizes, 0, bisect_right(asks.prices, self.ask_bound))
+        self.deltas_count = 0
+
+    def on_level_change(self, is_bid: bool, price: float, old_size: float, new_size: float) -> None:
+        in_band = price >= self.bid_bound if is_bid else price <= self.ask_bound
+        if not in_band:
+            return
+        notional_change = (new_size - old_size) * price
+        if is_bid:
+            self.bid_depth += notional_change
+        else:
+            self.ask_depth += notional_change
+
+        wall_notional = self.detector.wall_notional
+        old_notional, new_notional = old_size * price, new_size * price
+        side = TradeSide.BUY if is_bid else TradeSide.SELL
+        if old_notional < wall_notional <= new_notional:
+            self.detector.emit(self, kind=BookAlertKind.WALL_ADDED, side=side, price=price, notional=new_notional)
+        elif new_notional < wall_notional <= old_notional:
+            self.detector.emit(self, kind=BookAlertKind.WALL_REMOVED, side=side, price=price, notional=old_notional)
+
+    def on_delta(self, book) -> None:
+        """Move band edges after the mid price change and check imbalance"""
+        self.deltas_count += 1
+        bounds = self.get_bounds(book)
+        if bounds is None:
+            return
+        if self.deltas_count >= RESUM_EVERY_DELTAS:
+            self.reset(book)
+        else:
+            self.move_bounds(book=book, bid_bound=bounds[0], ask_bound=bounds[1])
+
+        imbalance = self.imbalance
+        threshold = self.detector.imbalance_threshold
+        if not self.is_imbalanced and abs(imbalance) >= threshold:
+            self.is_imbalanced = True
+            side = TradeSide.BUY if imbalance > 0 else TradeSide.SELL
+            self.detector.emit(self, kind=BookAlertKind.IMBALANCE, side=side, price=None, notional=0.0)
+        elif self.is_imbalanced and abs(imbalance) < threshold * 0.8:
+            # hysteresis, so the alert is not repeated while imbalance hovers around the threshold
+            self.is_imbalanced = False
+
+    def move_bounds(self, book, bid_bound: float, ask_bound: float) -> None:
+        bids, asks = book.bids, book.asks
+        if bid_bound < self.bid_bound:
+            start, end = bisect_left(bids.prices, bid_bound), bisect_left(bids.prices, self.bid_bound)
+            self.bid_depth += self.sum_notional(bids.prices, bids.sizes, start, end)
+        elif bid_bound > self.bid_bound:
+            start, end = bisect_left(bids.prices, self.bid_bound), bisect_left(bids.prices, bid_bound)
+            self.bid_depth -= self.sum_notional(bids.prices, bids.sizes, start, end)
+
+        if ask_bound > self.ask_bound:
+            start, end = bisect_right(asks.prices, self.ask_bound), bisect_right(asks.prices, ask_bound)
+            self.ask_depth += self.sum_notional(asks.prices, asks.sizes, start, end)
+        elif ask_bound < self.ask_bound:
+            start, end = bisect_right(asks.prices, ask_bound), bisect_right(asks.prices, self.ask_bound)
+            self.ask_depth -= self.sum_notional(asks.prices, asks.sizes, start, end)
+
+        self.bid_bound, self.ask_bound = bid_bound, ask_bound
+
+
+class BookDetector:
+    """Detects order book imbalance and walls appearing or being pulled, alerts are sent via the bot"""
+
+    band_pct: float
+    imbalance_threshold: float
+    wall_notional: float
+    cooldown_sec: int
+    alerts: asyncio.Queue
+
+    def __init__(
+        self,
+        band_pct: float,
+        imbalance_threshold: float,
+        wall_notional: float,
+        cooldown_sec: int,
+        max_queued_alerts: int = 1000,
+    ):
+        self.band_pct = band_pct
+        self.imbalance_threshold = imbalance_threshold
+        self.wall_notional = wall_notional
+        self.cooldown_sec = cooldown_sec
+        self.alerts = asyncio.Queue(maxsize=max_queued_alerts)
+
+    def create_state(self, symbol: str) -> BookDetectorState:
+        return BookDetectorState(symbol=symbol, detector=self)
+
+    def emit(
+        self,
+        state: BookDetectorState,
+        kind: BookAlertKind,
+        side: TradeSide | None,
+        price: float | None,
+        notional: float,
+    ) -> None:
+        alert = BookAlert(
+            symbol=state.symbol,
+            kind=kind,
+            side=side,
+            price=price,
+            notional=notional,
+            imbalance=state.imbalance,
+            time=time.time(),
+        )
+        try:
+            self.alerts.put_nowait(alert)
+        except asyncio.QueueFull:
+            LOGGER.warning(f"[BOOK DETECTOR] Alerts queue is full, dropping {alert}")
+
+    async def process_alerts(self, bot: TGBot | None, ws_server: WSServer) -> None:
+        """Send alerts via the bot and to dashboard, the same alert kind for a symbol is sent once per cooldown"""
+        last_sent_at: dict[tuple[str, BookAlertKind], float] = {}
+        while True:
+            alert: BookAlert = await self.alerts.get()
+            key = (alert.symbol, alert.kind)
+            if alert.time - last_sent_at.get(key, 0) < self.cooldown_sec:
+                continue
+            last_sent_at[key] = alert.time
+            LOGGER.debug(f"[BOOK DETECTOR] {alert}")
+            ws_server.publish(kind=DashboardTopicKind.BOOK, symbol=alert.symbol, data=asdict(alert))
+            if bot is None:
+                continue
+            text = (
+                f"📚<b>{alert.symbol}</b> {alert.kind}\n"
+                f"side: <b>{alert.side}</b>\n"
+                f"price: <b>{alert.price if alert.price is not None else '-'}</b>\n"
+                f"notional: <b>{round(alert.notional, 2)}</b>\n"
+                f"imbalance: <b>{round(alert.imbalance, 3)}</b>"
+            )
+            try:
+                await bot.send_notification(text=text)
+            except Exception as e:
+                LOGGER.error(f"[BOOK DETECTOR] Notification failed: {e}")
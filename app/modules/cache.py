@@ -1,3 +1,4 @@
+from collections.abc import AsyncIterator
 from datetime import datetime, timedelta
 
 import orjson
@@ -44,11 +45,20 @@ class Cache:
         await self.redis.set(name="CONNECTION_ID", value=connection_id)
         LOGGER.debug(f"[REDIS] SET CONNECTION ID: {connection_id}")
 
-    async def add_for_now(self, name: str, time: datetime) -> int:
+    async def add_for_now(self, name: str, time: datetime, retention_seconds: int | None = None) -> int:
         now = datetime.now()
         now_string = now.isoformat()
         timestamp = time.timestamp()
-        result = await self.redis.zadd(name=name, mapping={now_string: timestamp}, nx=True)
+        if retention_seconds is None:
+            result = await self.redis.zadd(name=name, mapping={now_string: timestamp}, nx=True)
+            return result
+
+        # events older than retention are trimmed on write, so the table never has to be reset
+        trim_before = (now - timedelta(seconds=retention_seconds)).timestamp()
+        pipeline = self.redis.pipeline(transaction=False)
+        pipeline.zadd(name=name, mapping={now_string: timestamp}, nx=True)
+        pipeline.zremrangebyscore(name=name, min="-inf", max=f"({trim_before}")
+        result, _ = await pipeline.execute()
         return result
 
     async def get_count_for_period(self, name: str, period_seconds: int) -> int:
@@ -62,6 +72,17 @@ class Cache:
         count = await self.redis.zcard(name=name)
         return count
 
+    async def get_counts(self, periods: dict[str, int]) -> dict[str, tuple[int, int]]:
+        """Total and for-period counts of many events tables in a single pipeline round trip"""
+        now = datetime.now()
+        pipeline = self.redis.pipeline(transaction=False)
+        for name, period_seconds in periods.items():
+            min_val = now - timedelta(seconds=period_seconds)
+            pipeline.zcard(name=name)
+            pipeline.zcount(name=name, min=min_val.timestamp(), max=now.timestamp())
+        results = await pipeline.execute()
+        return {name: (results[index * 2], results[index * 2 + 1]) for index, name in enumerate(periods)}
+
     async def get_items_for_period(self, name: str, period_seconds: int) -> list[str]:
         now = datetime.now()
         min_val = now - timedelta(seconds=period_seconds)
@@ -73,6 +94,10 @@ class Cache:
         await self.redis.set(name=name, value=json_obj)
         return True
 
+    async def bulk_add(self, objects: dict[str, dict]) -> bool:
+        await self.redis.mset({name: orjson.dumps(obj) for name, obj in objects.items()})
+        return True
+
     async def get(self, name: str) -> dict | None:
         json_obj = await self.redis.get(name=name)
         if json_obj is None:
@@ -83,17 +108,68 @@ class Cache:
         await self.redis.delete(name)
         return True
 
-    async def get_collections_by_pattern(self, pattern: str):
-        keys = await self.redis.keys(pattern)
-        return keys
+    async def get_many(self, names: list[str]) -> list[dict | None]:
+        if not names:
+            return []
+        json_objs = await self.redis.mget(names)
+        return [orjson.loads(json_obj) if json_obj is not None else None for json_obj in json_objs]
+
+    async def scan_by_pattern(self, pattern: str) -> list[str]:
+        """Keys matching the pattern, iterated with SCAN so redis is never blocked"""
+        return [key.decode() if isinstance(key, bytes) else key async for key in self.redis.scan_iter(match=pattern)]
 
     async def bulk_delete(self, names: list[str]) -> bool:
+        if not names:
+            return True
         pipeline = self.redis.pipeline()
         for name in names:
             pipeline.delete(name)
         await pipeline.execute()
         return True
 
-    async def reset_cache(self):
-        cache_events_to_reset = await self.get_collections_by_pattern(pattern="EVENTS-*")
-        await self.bulk_delete(cache_events_to_reset)
+    async def save_state(self, objects: dict[str, dict], ttl_seconds: int) -> None:
+        """Save in-process state snapshots in one pipeline, they expire if nobody restores them"""
+        pipeline = self.redis.pipeline(transaction=True)
+        for name, obj in objects.items():
+            pipeline.set(name=name, value=orjson.dumps(obj), ex=ttl_seconds)
+        await pipeline.execute()
+
+    async def heartbeat(self, name: str, member: str, ttl_ms: int) -> list[str]:
+        """Refresh the member in the set of alive ones, drop expired members and return the alive ones"""
+        now_ms = datetime.now().timestamp() * 1000
+        pipeline = self.redis.pipeline(transaction=True)
+        pipeline.zadd(name=name, mapping={member: now_ms})
+        pipeline.zremrangebyscore(name=name, min="-inf", max=f"({now_ms - ttl_ms}")
+        pipeline.zrange(name=name, start=0, end=-1)
+        _, _, members = await pipeline.execute()
+        return [member.decode() if isinstance(member, bytes) else member for member in members]
+
+    async def publish_many(self, channel: str, messages: list[str]) -> None:
+        pipeline = self.redis.pipeline(transaction=False)
+        for message in messages:
+            pipeline.publish(channel, message)
+        await pipeline.execute()
+
+    async def subscribe(self, channel: str) -> AsyncIterator[bytes]:
+        async with self.redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+
+    async def remove_member(self, name: str, member: str) -> None:
+        await self.redis.zrem(name, member)
+
+    async def is_notified(self, name: str) -> bool:
+        return bool(await self.redis.exists(f"NOTIFIED-{name}"))
+
+    async def set_notified(self, name: str, cooldown_seconds: int) -> bool:
+        """Mute notifications of the trigger for the cooldown, returns False if it is muted already"""
+        result = await self.redis.set(name=f"NOTIFIED-{name}", value=1, nx=True, ex=cooldown_seconds)
+        return bool(result)
+
+    async def reset_notified(self, names: list[str]) -> None:
+        """Re-arm notifications of the given triggers before their cooldown expires"""
+        if not names:
+            return
+        await self.redis.delete(*[f"NOTIFIED-{name}" for name in names])
@@ -0,0 +1,246 @@
+import asyncio
+import fcntl
+import os
+import re
+import time
+from pathlib import Path
+from typing import TextIO
+
+import numpy as np
+import orjson
+from fastapi import HTTPException, status
+from loguru import logger as LOGGER
+
+from app.modules.clients.kucoin_api import APIClient
+from app.utils.enums import CandleType, RequestPriority
+
+
+CANDLE_DTYPE = np.dtype(
+    [
+        ("time", "<i8"),
+        ("open", "<f8"),
+        ("close", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("volume", "<f8"),
+        ("turnover", "<f8"),
+    ]
+)
+
+CANDLE_TYPE_SECONDS = {
+    CandleType.GET_1_MIN: 60,
+    CandleType.GET_3_MIN: 3 * 60,
+    CandleType.GET_5_MIN: 5 * 60,
+    CandleType.GET_15_MIN: 15 * 60,
+    CandleType.GET_30_MIN: 30 * 60,
+    CandleType.GET_1_HOUR: 60 * 60,
+    CandleType.GET_2_HOURS: 2 * 60 * 60,
+    CandleType.GET_4_HOURS: 4 * 60 * 60,
+    CandleType.GET_6_HOURS: 6 * 60 * 60,
+    CandleType.GET_8_HOURS: 8 * 60 * 60,
+    CandleType.GET_12_HOURS: 12 * 60 * 60,
+    CandleType.GET_1_DAY: 24 * 60 * 60,
+    CandleType.GET_1_WEEK: 7 * 24 * 60 * 60,
+}
+# weekly candles start on monday, epoch starts on thursday
+CANDLE_TYPE_OFFSETS = {
+    CandleType.GET_1_WEEK: 4 * 24 * 60 * 60,
+}
+# kucoin returns at most this count of candles per request
+KLINES_PER_REQUEST = 1500
+# symbols are a part of files paths
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9]+$")
+
+
+def align_time(ts: int, candle_type: CandleType) -> int:
+    interval = CANDLE_TYPE_SECONDS[candle_type]
+    offset = CANDLE_TYPE_OFFSETS.get(candle_type, 0)
+    return (ts - offset) // interval * interval + offset
+
+
+def rows_to_candles(rows: list[list[str]]) -> np.ndarray:
+    candles = np.empty(len(rows), dtype=CANDLE_DTYPE)
+    for index, row in enumerate(rows):
+        candles[index] = tuple(row[: len(CANDLE_DTYPE)])
+    return candles
+
+
+def candles_to_columns(candles: np.ndarray) -> dict[str, list]:
+    return {name: candles[name].tolist() for name in CANDLE_DTYPE.names}
+
+
+class CandleStore:
+    """
+    Append-only columnar candles storage, one file per symbol and candle type.
+
+    Files contain fixed-width records sorted by time and are read via memory mapping.
+    Synced range of each file is kept in a sidecar json, so empty candles are not requested twice.
+    """
+
+    base_dir: Path
+    api_client: APIClient
+    concurrency: int
+
+    def __init__(self, api_client: APIClient, base_dir: str, concurrency: int = 4):
+        self.api_client = api_client
+        self.base_dir = Path(base_dir)
+        self.concurrency = concurrency
+        self._locks: dict[Path, asyncio.Lock] = {}
+
+    def get_path(self, symbol: str, candle_type: CandleType) -> Path:
+        if not all(SYMBOL_PATTERN.match(part) for part in symbol.split("-")):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid symbol: {symbol}")
+        return self.base_dir / symbol / f"{candle_type}.bin"
+
+    @staticmethod
+    def get_meta_path(path: Path) -> Path:
+        return path.with_suffix(".json")
+
+    def read(self, symbol: str, candle_type: CandleType) -> np.ndarray:
+        path = self.get_path(symbol=symbol, candle_type=candle_type)
+        if not path.exists() or path.stat().st_size < CANDLE_DTYPE.itemsize:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        count = path.stat().st_size // CANDLE_DTYPE.itemsize
+        return np.memmap(path, dtype=CANDLE_DTYPE, mode="r", shape=(count,))
+
+    @staticmethod
+    def lock_file(path: Path) -> TextIO:
+        """Exclusive lock of the candles file shared by all processes, released when the returned file is closed"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = path.with_suffix(".lock").open("a")
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def read_synced_range(self, path: Path) -> tuple[int, int] | None:
+        meta_path = self.get_meta_path(path)
+        if not meta_path.exists():
+            return None
+        meta = orjson.loads(meta_path.read_bytes())
+        return meta["synced_from"], meta["synced_to"]
+
+    def write(self, path: Path, candles: np.ndarray, prepend: bool, synced_range: tuple[int, int]) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if prepend and path.exists():
+            # rare case: history before the first stored candle, rewrite file atomically
+            stored = np.fromfile(path, dtype=CANDLE_DTYPE)
+            tmp_path = path.with_suffix(".tmp")
+            np.concatenate([candles, stored]).tofile(tmp_path)
+            os.replace(tmp_path, path)
+        else:
+            with path.open("ab") as file:
+                file.write(candles.tobytes())
+        synced_from, synced_to = synced_range
+        self.get_meta_path(path).write_bytes(orjson.dumps({"synced_from": synced_from, "synced_to": synced_to}))
+
+    async def fetch(
+        self,
+        from_symbol: str,
+        to_symbol: str,
+        candle_type: CandleType,
+        start_ts: int,
+        end_ts: int,
+    ) -> np.ndarray:
+        """Fetch candles with start time in [start_ts, end_ts] using concurrent chunked requests"""
+        interval = CANDLE_TYPE_SECONDS[candle_type]
+        chunk_seconds = KLINES_PER_REQUEST * interval
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_chunk(chunk_start: int) -> list[list[str]]:
+            async with semaphore:
+                return await self.api_client.get_klines_rows(
+                    from_symbol=from_symbol,
+                    to_symbol=to_symbol,
+                    candle_type=candle_type,
+                    start_ts=chunk_start,
+                    # both ends are inclusive, so the chunk ends one candle before the next one starts
+                    end_ts=min(chunk_start + chunk_seconds - interval, end_ts + interval),
+                    priority=RequestPriority.BULK,
+                )
+
+        chunks = await asyncio.gather(
+            *[fetch_chunk(chunk_start) for chunk_start in range(start_ts, end_ts + 1, chunk_seconds)]
+        )
+        candles = rows_to_candles([row for chunk in chunks for row in chunk])
+        candles = candles[(candles["time"] >= start_ts) & (candles["time"] <= end_ts)]
+        _, unique_indexes = np.unique(candles["time"], return_index=True)
+        return candles[unique_indexes]
+
+    async def sync(self, from_symbol: str, to_symbol: str, candle_type: CandleType, start_ts: int, end_ts: int) -> None:
+        """Download closed candles missing for the given range"""
+        interval = CANDLE_TYPE_SECONDS[candle_type]
+        last_closed_ts = align_time(int(time.time()), candle_type=candle_type) - interval
+        start_ts = align_time(start_ts, candle_type=candle_type)
+        end_ts = min(align_time(end_ts, candle_type=candle_type), last_closed_ts)
+        if start_ts > end_ts:
+            return
+
+        path = self.get_path(symbol=f"{from_symbol}-{to_symbol}", candle_type=candle_type)
+        lock = self._locks.setdefault(path, asyncio.Lock())
+        async with lock:
+            # api workers sync the same files, synced range is read under the lock as another one may have extended it
+            lock_file = await asyncio.to_thread(self.lock_file, path)
+            try:
+                await self.sync_gaps(
+                    path=path,
+                    from_symbol=from_symbol,
+                    to_symbol=to_symbol,
+                    candle_type=candle_type,
+                    start_ts=start_ts,
+                    end_ts=end_ts,
+                )
+            finally:
+                lock_file.close()
+
+    async def sync_gaps(
+        self,
+        path: Path,
+        from_symbol: str,
+        to_symbol: str,
+        candle_type: CandleType,
+        start_ts: int,
+        end_ts: int,
+    ) -> None:
+        interval = CANDLE_TYPE_SECONDS[candle_type]
+        synced_range = self.read_synced_range(path)
+        if synced_range is None:
+            gaps = [(start_ts, end_ts, False)]
+            synced_range = (start_ts, end_ts)
+        else:
+            synced_from, synced_to = synced_range
+            gaps = []
+            if start_ts < synced_from:
+                gaps.append((start_ts, synced_from - interval, True))
+            if end_ts > synced_to:
+                gaps.append((synced_to + interval, end_ts, False))
+
+        for gap_start, gap_end, prepend in gaps:
+            LOGGER.debug(f"[CANDLES] Syncing {path}: {gap_start} - {gap_end}")
+            candles = await self.fetch(
+                from_symbol=from_symbol,
+                to_symbol=to_symbol,
+                candle_type=candle_type,
+                start_ts=gap_start,
+                end_ts=gap_end,
+            )
+            synced_range = (min(gap_start, synced_range[0]), max(gap_end, synced_range[1]))
+            await asyncio.to_thread(self.write, path, candles, prepend, synced_range)
+
+    async def query(
+        self,
+        from_symbol: str,
+        to_symbol: str,
+        candle_type: CandleType,
+        start_ts: int,
+        end_ts: int,
+    ) -> np.ndarray:
+        await self.sync(
+            from_symbol=from_symbol,
+            to_symbol=to_symbol,
+            candle_type=candle_type,
+            start_ts=start_ts,
+            end_ts=end_ts,
+        )
+        candles = self.read(symbol=f"{from_symbol}-{to_symbol}", candle_type=candle_type)
+        left = np.searchsorted(candles["time"], start_ts, side="left")
+        right = np.searchsorted(candles["time"], end_ts, side="right")
+        return candles[left:right]
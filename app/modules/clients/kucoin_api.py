@@ -1,16 +1,22 @@
+import asyncio
 import datetime
 import json
+import random
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable
 
 from fastapi import HTTPException, status
-from httpx import AsyncClient, Response
+from httpx import AsyncClient, Response, TransportError
 from loguru import logger as LOGGER
 
+from app.modules.clients.rate_limiter import RateLimiter
 from app.utils.enums import (
     CandleType,
     ExampleSymbols,
     OrdersCount,
     OrderType,
     RequestMethod,
+    RequestPriority,
     TradeSide,
     TradeStatus,
     TradeType,
@@ -23,12 +29,25 @@ class APIClient:
     api_secret: str
     api_passphrase: str
     api_url: str
+    rate_limiter: RateLimiter
+    max_retries: int
+    retry_backoff_sec: float
 
-    def __init__(self, api_key: str, api_secret: str, api_passphrase: str):
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        api_passphrase: str,
+        max_retries: int = 3,
+        retry_backoff_sec: float = 0.5,
+    ):
         self.api_key = api_key
         self.api_secret = api_secret
         self.api_passphrase = api_passphrase
         self.api_url = "https://api.kucoin.com"
+        self.rate_limiter = RateLimiter()
+        self.max_retries = max_retries
+        self.retry_backoff_sec = retry_backoff_sec
 
     def build_headers(self, method: RequestMethod, endpoint: str, v2: bool) -> dict:
         api_passphrase = self.api_passphrase
@@ -66,25 +85,66 @@ class APIClient:
         json: dict | None = None,
         params: dict | None = None,
         v2: bool = False,
+        priority: RequestPriority = RequestPriority.USER,
     ) -> Response:
-        headers = self.build_headers(method=method, endpoint=endpoint, v2=v2)
         url = self.api_url + endpoint
-        LOGGER.debug(f"[API CLIENT] request_id: {request_id} | {method} | url: {url}")
-        async with AsyncClient() as client:
-            response = await client.request(
-                method=method,
-                url=url,
-                json=json,
-                params=params,
-                timeout=600,
-                headers=headers,
+        attempt = 0
+        while True:
+            pool = await self.rate_limiter.acquire(endpoint=endpoint, priority=priority)
+            # sign every attempt, KuCoin rejects stale timestamps
+            headers = self.build_headers(method=method, endpoint=endpoint, v2=v2)
+            LOGGER.debug(f"[API CLIENT] request_id: {request_id} | {method} | url: {url} | attempt: {attempt}")
+            try:
+                async with AsyncClient() as client:
+                    response = await client.request(
+                        method=method,
+                        url=url,
+                        json=json,
+                        params=params,
+                        timeout=600,
+                        headers=headers,
+                    )
+            except TransportError as e:
+                if attempt >= self.max_retries:
+                    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+                LOGGER.warning(f"request_id {request_id} transport error: {e}")
+                await self.backoff(attempt=attempt)
+                attempt += 1
+                continue
+
+            pool.update(headers=response.headers)
+            if response.status_code == status.HTTP_200_OK:
+                LOGGER.debug(f"[API CLIENT] response: {response.json()}")
+                return response
+
+            is_retryable = (
+                response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+                or response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            if response.status_code != status.HTTP_200_OK:
-                LOGGER.error(f"request_id {request_id} failed | status code: {response.status_code}")
-                LOGGER.error(f"Response: {response.json()}")
-                raise HTTPException(status_code=response.status_code, detail=response.json())
-            LOGGER.debug(f"[API CLIENT] response: {response.json()}")
-            return response
+            if is_retryable and attempt < self.max_retries:
+                LOGGER.warning(f"request_id {request_id} failed | status code: {response.status_code}, retrying")
+                if response.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                    # next acquire waits for the pool window to reset
+                    pool.exhaust(retry_after_sec=self.retry_backoff_sec * 2**attempt)
+                else:
+                    await self.backoff(attempt=attempt)
+                attempt += 1
+                continue
+
+            LOGGER.error(f"request_id {request_id} failed | status code: {response.status_code}")
+            LOGGER.error(f"Response: {response.text}")
+            raise HTTPException(status_code=response.status_code, detail=self.get_error_detail(response=response))
+
+    async def backoff(self, attempt: int) -> None:
+        delay = self.retry_backoff_sec * 2**attempt
+        await asyncio.sleep(delay + random.uniform(0, delay))
+
+    @staticmethod
+    def get_error_detail(response: Response) -> dict | str:
+        try:
+            return response.json()
+        except ValueError:
+            return response.text
 
     async def get_accounts(self):
         request_id = gen_request_id()
@@ -101,6 +161,7 @@ class APIClient:
         trade_type: TradeType | None = TradeType.MARGIN_ISOLATED_TRADE,
         current_page: int = 1,
         page_size: int = 50,
+        priority: RequestPriority = RequestPriority.USER,
     ):
         request_id = gen_request_id()
         endpoint = "/api/v1/orders"
@@ -119,9 +180,119 @@ class APIClient:
             endpoint=endpoint,
             request_id=request_id,
             v2=False,
+            priority=priority,
+        )
+        return response
+
+    async def get_fills(
+        self,
+        symbol: str | None = None,
+        side: TradeSide | None = None,
+        type: OrderType | None = None,
+        trade_type: TradeType | None = TradeType.TRADE,
+        current_page: int = 1,
+        page_size: int = 50,
+        priority: RequestPriority = RequestPriority.USER,
+    ):
+        request_id = gen_request_id()
+        endpoint = "/api/v1/fills"
+        params = {
+            "currentPage": current_page,
+            "pageSize": page_size,
+            "symbol": symbol,
+            "side": side,
+            "type": type,
+            "tradeType": trade_type,
+        }
+        response = await self.send_request(
+            method=RequestMethod.GET,
+            params=params,
+            endpoint=endpoint,
+            request_id=request_id,
+            v2=False,
+            priority=priority,
         )
         return response
 
+    @staticmethod
+    async def iter_pages(
+        get_page: Callable[[int], Awaitable[Response]],
+        concurrency: int = 5,
+    ) -> AsyncIterator[dict]:
+        """
+        Yield items of a paginated endpoint in page order.
+
+        The first page tells the total pages count, the rest are fetched concurrently,
+        keeping at most `concurrency` pages in flight, so memory stays bounded too.
+        """
+        first_page = (await get_page(1)).json()["data"]
+        for item in first_page["items"]:
+            yield item
+
+        async def fetch_items(page: int) -> list[dict]:
+            response = await get_page(page)
+            return response.json()["data"]["items"]
+
+        total_page = first_page["totalPage"]
+        next_page = 2
+        in_flight: deque[asyncio.Task] = deque()
+        try:
+            while in_flight or next_page <= total_page:
+                while len(in_flight) < concurrency and next_page <= total_page:
+                    in_flight.append(asyncio.create_task(fetch_items(page=next_page)))
+                    next_page += 1
+                for item in await in_flight.popleft():
+                    yield item
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def iter_orders(
+        self,
+        status: TradeStatus | None = None,
+        symbol: str | None = None,
+        side: TradeSide | None = None,
+        type: OrderType | None = None,
+        trade_type: TradeType | None = TradeType.MARGIN_ISOLATED_TRADE,
+        page_size: int = 500,
+        concurrency: int = 5,
+    ) -> AsyncIterator[dict]:
+        async def get_page(page: int) -> Response:
+            return await self.get_orders(
+                status=status,
+                symbol=symbol,
+                side=side,
+                type=type,
+                trade_type=trade_type,
+                current_page=page,
+                page_size=page_size,
+                priority=RequestPriority.BULK,
+            )
+
+        return self.iter_pages(get_page=get_page, concurrency=concurrency)
+
+    def iter_fills(
+        self,
+        symbol: str | None = None,
+        side: TradeSide | None = None,
+        type: OrderType | None = None,
+        trade_type: TradeType | None = TradeType.TRADE,
+        page_size: int = 500,
+        concurrency: int = 5,
+    ) -> AsyncIterator[dict]:
+        async def get_page(page: int) -> Response:
+            return await self.get_fills(
+                symbol=symbol,
+                side=side,
+                type=type,
+                trade_type=trade_type,
+                current_page=page,
+                page_size=page_size,
+                priority=RequestPriority.BULK,
+            )
+
+        return self.iter_pages(get_page=get_page, concurrency=concurrency)
+
     async def get_markets(self):
         request_id = gen_request_id()
         endpoint = "/api/v1/markets"
@@ -163,7 +334,7 @@ class APIClient:
         )
         return response
 
-    async def get_all_tickers(self):
+    async def get_all_tickers(self, priority: RequestPriority = RequestPriority.USER):
         request_id = gen_request_id()
         endpoint = "/api/v1/market/allTickers"
         response = await self.send_request(
@@ -171,10 +342,11 @@ class APIClient:
             endpoint=endpoint,
             request_id=request_id,
             v2=True,
+            priority=priority,
         )
         return response
 
-    async def get_ticker(self, from_symbol: str, to_symbol: str):
+    async def get_ticker(self, from_symbol: str, to_symbol: str, priority: RequestPriority = RequestPriority.USER):
         request_id = gen_request_id()
         endpoint = "/api/v1/market/orderbook/level1"
         params = {
@@ -186,11 +358,12 @@ class APIClient:
             request_id=request_id,
             params=params,
             v2=True,
+            priority=priority,
         )
         return response
 
-    async def get_price_in_usdt(self, from_symbol: str) -> str:
-        ticker = await self.get_ticker(from_symbol=from_symbol, to_symbol=ExampleSymbols.USDT)
+    async def get_price_in_usdt(self, from_symbol: str, priority: RequestPriority = RequestPriority.USER) -> str:
+        ticker = await self.get_ticker(from_symbol=from_symbol, to_symbol=ExampleSymbols.USDT, priority=priority)
         ticker_json = ticker.json()
         price = ticker_json["data"]["price"]
         return price
@@ -247,18 +420,18 @@ class APIClient:
             item["time"] = datetime.datetime.fromtimestamp(counted_time_value)
         return history_data
 
-    async def get_klines(
+    async def get_klines_rows(
         self,
         from_symbol: str,
         to_symbol: str,
         candle_type: CandleType,
-        from_time: datetime.datetime | None = None,
-        to_time: datetime.datetime | None = None,
-    ):
+        start_ts: int = 0,
+        end_ts: int = 0,
+        priority: RequestPriority = RequestPriority.USER,
+    ) -> list[list[str]]:
+        """Raw candles rows `[time, open, close, high, low, volume, turnover]`, newest first, at most 1500"""
         request_id = gen_request_id()
         endpoint = "/api/v1/market/candles"
-        start_ts = int(from_time.timestamp()) if from_time else 0
-        end_ts = int(to_time.timestamp()) if to_time else 0
         params = {
             "symbol": f"{from_symbol}-{to_symbol}",
             "type": candle_type,
@@ -271,11 +444,27 @@ class APIClient:
             request_id=request_id,
             params=params,
             v2=True,
+            priority=priority,
+        )
+        return json.loads(response.content)["data"]
+
+    async def get_klines(
+        self,
+        from_symbol: str,
+        to_symbol: str,
+        candle_type: CandleType,
+        from_time: datetime.datetime | None = None,
+        to_time: datetime.datetime | None = None,
+    ):
+        rows = await self.get_klines_rows(
+            from_symbol=from_symbol,
+            to_symbol=to_symbol,
+            candle_type=candle_type,
+            start_ts=int(from_time.timestamp()) if from_time else 0,
+            end_ts=int(to_time.timestamp()) if to_time else 0,
         )
-        content = response.content
-        history_data = json.loads(content)
         result = []
-        for item in history_data["data"]:
+        for item in rows:
             result.append(
                 {
                     "time": datetime.datetime.fromtimestamp(int(item[0])),
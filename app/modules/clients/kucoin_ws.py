@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 import httpx
@@ -9,12 +10,17 @@ from app.utils.enums import ExampleSymbols
 from app.utils.helpers import gen_request_id
 
 
+# kucoin allows up to 100 symbols in a single topic
+MAX_TOPIC_SYMBOLS = 100
+
+
 class WSClient:
     ws_api_url: str
     ws_api_token_url: str
     token: str | None
     uri: str | None
     websocket: WebSocketClientProtocol | None
+    subscribed: set[str]
 
     def __init__(self):
         self.ws_api_url = "wss://ws-api-spot.kucoin.com"
@@ -22,6 +28,13 @@ class WSClient:
         self.token = None
         self.uri = None
         self.websocket = None
+        # symbols with match topic subscribed on the current connection
+        self.subscribed = set()
+
+    @property
+    def is_connected(self) -> bool:
+        # subscriptions are skipped while not connected, ingest subscribes them on the next reconcile
+        return self.websocket is not None
 
     def set_ws_token(self) -> None:
         response = httpx.post(url=self.ws_api_token_url)
@@ -37,36 +50,43 @@ class WSClient:
         if not connection_id:
             connection_id = gen_request_id()
         if not self.uri:
-            self.set_ws_uri(connection_id=connection_id)
+            # token request is blocking, keep the loop free for the other startup probes
+            await asyncio.to_thread(self.set_ws_uri, connection_id=connection_id)
         self.websocket = await websockets.connect(uri=self.uri)
+        # subscriptions don't survive the connection
+        self.subscribed = set()
 
     @staticmethod
-    def get_subscription_message(from_symbol: str, to_symbol: str, subscription: bool = True) -> str:
+    def get_topic_message(topic: str, subscription: bool = True) -> str:
         connection_id = gen_request_id()
         request_type = "subscribe" if subscription else "unsubscribe"
         subscription_message = {
             "id": connection_id,
             "type": request_type,
-            "topic": f"/market/match:{from_symbol}-{to_symbol}",
+            "topic": topic,
             "privateChannel": False,
             "response": True,
         }
         return json.dumps(obj=subscription_message)
 
+    def get_subscription_message(self, from_symbol: str, to_symbol: str, subscription: bool = True) -> str:
+        return self.get_topic_message(topic=f"/market/match:{from_symbol}-{to_symbol}", subscription=subscription)
+
     async def subscribe(self, from_symbol: str = ExampleSymbols.GENS, to_symbol: str = ExampleSymbols.USDT) -> None:
-        if not self.websocket:
-            await self.connect()
+        if not self.is_connected:
+            return
 
         subscription_message = self.get_subscription_message(
             from_symbol=from_symbol,
             to_symbol=to_symbol,
         )
         await self.websocket.send(message=subscription_message)
+        self.subscribed.add(f"{from_symbol}-{to_symbol}")
         LOGGER.debug(f"[WS CLIENT] SUBSCRIPTION COMPLETED FOR PAIR: {from_symbol}-{to_symbol}")
 
     async def unsubscribe(self, from_symbol: str = ExampleSymbols.GENS, to_symbol: str = ExampleSymbols.USDT) -> None:
-        if not self.websocket:
-            await self.connect()
+        if not self.is_connected:
+            return
 
         subscription_message = self.get_subscription_message(
             from_symbol=from_symbol,
@@ -74,8 +94,38 @@ class WSClient:
             subscription=False,
         )
         await self.websocket.send(message=subscription_message)
+        self.subscribed.discard(f"{from_symbol}-{to_symbol}")
         LOGGER.debug(f"[WS CLIENT] SUBSCRIPTION CANCELLED FOR PAIR: {from_symbol}-{to_symbol}")
 
+    async def subscribe_many(self, pairs: list[tuple[str, str]], subscription: bool = True) -> None:
+        """(Un)subscribe match topics of many pairs, batched into frames of up to 100 symbols"""
+        if not self.is_connected:
+            return
+
+        symbols = [f"{from_symbol}-{to_symbol}" for from_symbol, to_symbol in pairs]
+        for start in range(0, len(symbols), MAX_TOPIC_SYMBOLS):
+            end = start + MAX_TOPIC_SYMBOLS
+            topic = "/market/match:" + ",".join(symbols[start:end])
+            await self.websocket.send(message=self.get_topic_message(topic=topic, subscription=subscription))
+        if subscription:
+            self.subscribed.update(symbols)
+        else:
+            self.subscribed.difference_update(symbols)
+        action = "COMPLETED" if subscription else "CANCELLED"
+        LOGGER.debug(f"[WS CLIENT] SUBSCRIPTION {action} FOR {len(symbols)} PAIRS")
+
+    async def subscribe_topic(self, topic: str) -> None:
+        if not self.is_connected:
+            return
+        await self.websocket.send(message=self.get_topic_message(topic=topic))
+        LOGGER.debug(f"[WS CLIENT] SUBSCRIPTION COMPLETED FOR TOPIC: {topic}")
+
+    async def unsubscribe_topic(self, topic: str) -> None:
+        if not self.is_connected:
+            return
+        await self.websocket.send(message=self.get_topic_message(topic=topic, subscription=False))
+        LOGGER.debug(f"[WS CLIENT] SUBSCRIPTION CANCELLED FOR TOPIC: {topic}")
+
     async def start(self, connection_id: str):
         if not self.websocket:
             await self.connect(connection_id=connection_id)
@@ -85,3 +135,5 @@ class WSClient:
             return
         LOGGER.warning("[WS CLIENT] Closing...")
         await self.websocket.close()
+        self.websocket = None
+        self.subscribed = set()
@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+
+from fastapi import HTTPException, status
+from httpx import Headers
+from loguru import logger as LOGGER
+
+from app.utils.enums import RateLimitPool, RequestPriority
+
+
+# quota per 30 seconds for each KuCoin resource pool (VIP 0)
+POOL_LIMITS = {
+    RateLimitPool.PUBLIC: 2000,
+    RateLimitPool.SPOT: 4000,
+    RateLimitPool.MANAGEMENT: 2000,
+}
+POOL_WINDOW_SEC = 30
+
+# endpoint -> (resource pool, request weight)
+ENDPOINT_WEIGHTS = {
+    "/api/v1/accounts": (RateLimitPool.MANAGEMENT, 5),
+    "/api/v1/orders": (RateLimitPool.SPOT, 2),
+    "/api/v1/fills": (RateLimitPool.SPOT, 10),
+    "/api/v1/markets": (RateLimitPool.PUBLIC, 3),
+    "/api/v2/symbols": (RateLimitPool.PUBLIC, 4),
+    "/api/v1/market/stats": (RateLimitPool.PUBLIC, 15),
+    "/api/v1/market/allTickers": (RateLimitPool.PUBLIC, 15),
+    "/api/v1/market/orderbook/level1": (RateLimitPool.PUBLIC, 2),
+    "/api/v1/market/orderbook/level2_20": (RateLimitPool.PUBLIC, 2),
+    "/api/v1/market/orderbook/level2_100": (RateLimitPool.PUBLIC, 4),
+    "/api/v3/market/orderbook/level2": (RateLimitPool.SPOT, 3),
+    "/api/v1/market/histories": (RateLimitPool.PUBLIC, 3),
+    "/api/v1/market/candles": (RateLimitPool.PUBLIC, 3),
+    "/api/v1/currencies": (RateLimitPool.PUBLIC, 3),
+    "/api/v1/bullet-public": (RateLimitPool.PUBLIC, 10),
+}
+DEFAULT_ENDPOINT_WEIGHT = (RateLimitPool.PUBLIC, 5)
+
+# how many requests of each priority may wait for quota before new ones are shed
+MAX_WAITING = {
+    RequestPriority.PRICES: 1000,
+    RequestPriority.USER: 100,
+    RequestPriority.BULK: 50,
+}
+
+
+class QuotaPool:
+    name: RateLimitPool
+    limit: int
+    remaining: int
+    reset_at: float
+
+    def __init__(self, name: RateLimitPool, limit: int):
+        self.name = name
+        self.limit = limit
+        self.remaining = limit
+        self.reset_at = time.monotonic() + POOL_WINDOW_SEC
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._waiting_count: Counter = Counter()
+        self._counter = itertools.count()
+        self._wakeup_task: asyncio.Task | None = None
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + POOL_WINDOW_SEC
+
+    async def acquire(self, weight: int, priority: RequestPriority) -> None:
+        self.refill()
+        if not self._waiters and self.remaining >= weight:
+            self.remaining -= weight
+            return
+
+        if self._waiting_count[priority] >= MAX_WAITING[priority]:
+            LOGGER.warning(f"[RATE LIMITER] {self.name}: shedding request with priority {priority.name}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"KuCoin {self.name} quota is exhausted, try again later",
+                headers={"Retry-After": str(max(int(self.reset_at - time.monotonic()), 1))},
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), weight, future))
+        self._waiting_count[priority] += 1
+        if self._wakeup_task is None:
+            self._wakeup_task = asyncio.create_task(self.release_waiters(), name=f"rate_limiter_{self.name}")
+        await future
+
+    async def release_waiters(self) -> None:
+        """Hand out quota to queued requests by priority, then FIFO, sleeping until the window resets"""
+        try:
+            while self._waiters:
+                self.refill()
+                while self._waiters:
+                    priority, _, weight, future = self._waiters[0]
+                    if not future.done() and self.remaining < weight:
+                        break
+                    heapq.heappop(self._waiters)
+                    self._waiting_count[priority] -= 1
+                    if future.done():
+                        # waiter was cancelled
+                        continue
+                    self.remaining -= weight
+                    future.set_result(None)
+                if self._waiters:
+                    await asyncio.sleep(max(self.reset_at - time.monotonic(), 0.05))
+        finally:
+            self._wakeup_task = None
+
+    def update(self, headers: Headers) -> None:
+        """Sync local quota with `gw-ratelimit-*` response headers"""
+        try:
+            limit = int(headers["gw-ratelimit-limit"])
+            remaining = int(headers["gw-ratelimit-remaining"])
+            reset_ms = int(headers["gw-ratelimit-reset"])
+        except (KeyError, ValueError):
+            return
+        self.limit = limit
+        # requests still in flight are already deducted locally, so never raise the counter here
+        self.remaining = min(self.remaining, remaining)
+        self.reset_at = time.monotonic() + reset_ms / 1000
+
+    def exhaust(self, retry_after_sec: float) -> None:
+        self.remaining = 0
+        self.reset_at = max(self.reset_at, time.monotonic() + retry_after_sec)
+
+
+class RateLimiter:
+    pools: dict[RateLimitPool, QuotaPool]
+
+    def __init__(self):
+        self.pools = {name: QuotaPool(name=name, limit=limit) for name, limit in POOL_LIMITS.items()}
+
+    @staticmethod
+    def get_endpoint_weight(endpoint: str) -> tuple[RateLimitPool, int]:
+        return ENDPOINT_WEIGHTS.get(endpoint, DEFAULT_ENDPOINT_WEIGHT)
+
+    async def acquire(self, endpoint: str, priority: RequestPriority) -> QuotaPool:
+        pool_name, weight = self.get_endpoint_weight(endpoint)
+        pool = self.pools[pool_name]
+        await pool.acquire(weight=weight, priority=priority)
+        return pool
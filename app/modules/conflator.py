@@ -0,0 +1,55 @@
+import asyncio
+
+from loguru import logger as LOGGER
+
+from app.modules.ws_server import WILDCARD_SYMBOL, WSServer
+from app.utils.enums import DashboardTopicKind
+
+
+class StateConflator:
+    """
+    Keeps the latest dashboard state per symbol: last trade, trigger window count and status, last alert.
+
+    Updates only change the state in memory, symbols changed since the last frame are flushed
+    at `rate_hz`, so outbound traffic does not depend on how many trades there are.
+    Subscribers of `state:*` get one batched frame with all changed symbols.
+    """
+
+    ws_server: WSServer
+    interval_sec: float
+    states: dict[str, dict]
+
+    def __init__(self, ws_server: WSServer, rate_hz: float = 4):
+        self.ws_server = ws_server
+        self.interval_sec = 1 / rate_hz
+        self.states = {}
+        self._changed_symbols: set[str] = set()
+
+    def update(self, symbol: str, **fields) -> None:
+        self.states.setdefault(symbol, {}).update(fields)
+        self._changed_symbols.add(symbol)
+
+    def remove(self, symbol: str) -> None:
+        self.states.pop(symbol, None)
+        self._changed_symbols.discard(symbol)
+
+    def restore(self, states: dict[str, dict]) -> None:
+        """Restore states saved before restart, fields updated since the start are kept"""
+        for symbol, state in states.items():
+            self.states[symbol] = {**state, **self.states.get(symbol, {})}
+            self._changed_symbols.add(symbol)
+
+    def flush(self) -> None:
+        changed_symbols, self._changed_symbols = self._changed_symbols, set()
+        changed_states = {symbol: self.states[symbol] for symbol in changed_symbols if symbol in self.states}
+        if not changed_states:
+            return
+        self.ws_server.publish(kind=DashboardTopicKind.STATE, symbol=WILDCARD_SYMBOL, data=changed_states)
+        for symbol, state in changed_states.items():
+            self.ws_server.publish(kind=DashboardTopicKind.STATE, symbol=symbol, data=state, include_wildcard=False)
+
+    async def run(self) -> None:
+        LOGGER.debug(f"[CONFLATOR] Flushing dashboard state every {self.interval_sec:.3f}s")
+        while True:
+            await asyncio.sleep(self.interval_sec)
+            self.flush()
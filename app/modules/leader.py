@@ -0,0 +1,154 @@
+import asyncio
+import time
+from typing import Callable, Coroutine
+
+from loguru import logger as LOGGER
+from redis.exceptions import RedisError
+
+from app.modules.cache import Cache
+from app.utils.helpers import gen_request_id
+
+
+# singleton roles are elected separately, so roles split between processes all run somewhere
+SINGLETONS_ELECTION = "singletons"
+
+
+def get_election_name(role: str) -> str:
+    return f"{SINGLETONS_ELECTION}-{role}"
+
+
+# lease is taken only if nobody holds it, every new lease gets the next fencing token
+ACQUIRE_SCRIPT = """
+if redis.call("SET", KEYS[1], ARGV[1], "NX", "PX", ARGV[2]) then
+    return redis.call("INCR", KEYS[2])
+end
+return false
+"""
+RENEW_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def get_token_key(name: str) -> str:
+    return f"LEADER-{name}-TOKEN"
+
+
+async def is_valid_token(cache: Cache, name: str, token: int | None) -> bool:
+    """Work without a token comes from a node running without election"""
+    if token is None:
+        return True
+    current_token = await cache.redis.get(get_token_key(name=name))
+    return current_token is None or token >= int(current_token)
+
+
+class LeaderElection:
+    """
+    Lease based leader election on redis.
+
+    The leader renews its lease several times per lease period, followers try to take it at the same rate,
+    so failover takes at most one lease period. Each new leader gets a greater fencing token,
+    work published by the leader carries it and is rejected once a newer leader is elected.
+    """
+
+    cache: Cache
+    name: str
+    node_id: str
+    lease_ms: int
+    renew_interval_sec: float
+    token: int | None
+
+    def __init__(self, cache: Cache, name: str, lease_ms: int = 5000):
+        self.cache = cache
+        self.name = name
+        self.node_id = gen_request_id()
+        self.lease_ms = lease_ms
+        self.renew_interval_sec = lease_ms / 1000 / 3
+        self.token = None
+        self._lease_key = f"LEADER-{name}"
+        self._token_key = get_token_key(name=name)
+        self._acquire = cache.redis.register_script(ACQUIRE_SCRIPT)
+        self._renew = cache.redis.register_script(RENEW_SCRIPT)
+        self._release = cache.redis.register_script(RELEASE_SCRIPT)
+        self._expires_at = 0.0
+
+    @property
+    def is_leader(self) -> bool:
+        return self.token is not None
+
+    async def acquire(self) -> bool:
+        requested_at = time.monotonic()
+        token = await self._acquire(keys=[self._lease_key, self._token_key], args=[self.node_id, self.lease_ms])
+        if token is None:
+            return False
+        self.token = int(token)
+        self._expires_at = requested_at + self.lease_ms / 1000
+        return True
+
+    async def renew(self) -> bool:
+        requested_at = time.monotonic()
+        if not await self._renew(keys=[self._lease_key], args=[self.node_id, self.lease_ms]):
+            return False
+        # lease is counted from the request, so the local lease never outlives the one in redis
+        self._expires_at = requested_at + self.lease_ms / 1000
+        return True
+
+    async def release(self) -> None:
+        await self._release(keys=[self._lease_key], args=[self.node_id])
+        self.token = None
+
+    async def keep_leadership(self) -> bool:
+        try:
+            return await self.renew()
+        except RedisError as e:
+            LOGGER.error(f"[LEADER] {self.name}: lease renewal failed: {e}")
+            # leadership is kept until the lease taken before expires
+            return time.monotonic() < self._expires_at
+
+    async def run(self, lead: Callable[[], Coroutine], on_change: Callable[[bool], None] | None = None) -> None:
+        """Run `lead` while this node holds the lease, it is cancelled as soon as the lease is lost"""
+        lead_task = None
+        try:
+            while True:
+                if not self.is_leader:
+                    try:
+                        is_elected = await self.acquire()
+                    except RedisError as e:
+                        LOGGER.error(f"[LEADER] {self.name}: lease acquisition failed: {e}")
+                        is_elected = False
+                    if is_elected:
+                        LOGGER.warning(f"[LEADER] {self.name}: elected with fencing token {self.token}")
+                        lead_task = asyncio.create_task(lead(), name=f"lead_{self.name}")
+                        if on_change:
+                            on_change(True)
+                elif not await self.keep_leadership():
+                    LOGGER.warning(f"[LEADER] {self.name}: lease lost, stepping down")
+                    self.token = None
+                    await self.stop_leading(lead_task=lead_task)
+                    lead_task = None
+                    if on_change:
+                        on_change(False)
+                await asyncio.sleep(self.renew_interval_sec)
+        finally:
+            await self.stop_leading(lead_task=lead_task)
+            if self.is_leader:
+                # release on shutdown, so the next leader is elected without waiting for the lease to expire
+                try:
+                    await self.release()
+                except RedisError as e:
+                    LOGGER.error(f"[LEADER] {self.name}: lease release failed: {e}")
+
+    @staticmethod
+    async def stop_leading(lead_task: asyncio.Task | None) -> None:
+        if lead_task is None:
+            return
+        lead_task.cancel()
+        await asyncio.gather(lead_task, return_exceptions=True)
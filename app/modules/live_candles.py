@@ -0,0 +1,112 @@
+import numpy as np
+
+from app.utils.enums import LiveCandleInterval
+
+
+LIVE_INTERVAL_SECONDS = {
+    LiveCandleInterval.GET_1_SEC: 1,
+    LiveCandleInterval.GET_1_MIN: 60,
+    LiveCandleInterval.GET_5_MIN: 5 * 60,
+}
+# bars kept per symbol: 10 minutes of 1s, 12 hours of 1min, 1 day of 5min
+LIVE_INTERVAL_CAPACITY = {
+    LiveCandleInterval.GET_1_SEC: 600,
+    LiveCandleInterval.GET_1_MIN: 720,
+    LiveCandleInterval.GET_5_MIN: 288,
+}
+BAR_FIELDS = ("open", "high", "low", "close", "volume", "turnover", "count")
+
+
+class CandleRing:
+    """Preallocated ring of OHLCV bars for one symbol and interval, the last bar is still open"""
+
+    interval: int
+    capacity: int
+    head: int
+    size: int
+
+    def __init__(self, interval: int, capacity: int):
+        self.interval = interval
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.bars = {
+            field: np.zeros(capacity, dtype=np.int64 if field == "count" else np.float64) for field in BAR_FIELDS
+        }
+        self.head = -1
+        self.size = 0
+
+    def get_bar(self, index: int) -> dict:
+        bar = {field: values[index].item() for field, values in self.bars.items()}
+        bar["time"] = self.times[index].item()
+        return bar
+
+    def add(self, ts: float, price: float, size: float) -> dict | None:
+        """Add trade to its bar, return the previous bar if it was closed by this trade"""
+        bar_time = int(ts) // self.interval * self.interval
+        bars = self.bars
+        if self.head >= 0 and bar_time == self.times[self.head]:
+            index = self.head
+            bars["high"][index] = max(bars["high"][index], price)
+            bars["low"][index] = min(bars["low"][index], price)
+            bars["close"][index] = price
+            bars["volume"][index] += size
+            bars["turnover"][index] += price * size
+            bars["count"][index] += 1
+            return None
+        if self.head >= 0 and bar_time < self.times[self.head]:
+            # late trade for already closed bar
+            return None
+
+        closed_bar = self.get_bar(self.head) if self.head >= 0 else None
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        index = self.head
+        self.times[index] = bar_time
+        bars["open"][index] = bars["high"][index] = bars["low"][index] = bars["close"][index] = price
+        bars["volume"][index] = size
+        bars["turnover"][index] = price * size
+        bars["count"][index] = 1
+        return closed_bar
+
+    def get_columns(self, limit: int) -> dict[str, list]:
+        count = min(limit, self.size)
+        indexes = (self.head - np.arange(count)[::-1]) % self.capacity
+        columns = {"time": self.times[indexes].tolist()}
+        columns.update({field: values[indexes].tolist() for field, values in self.bars.items()})
+        return columns
+
+
+class LiveCandlesBuilder:
+    """Aggregates matches from the websocket stream into live bars for each symbol"""
+
+    rings: dict[str, dict[LiveCandleInterval, CandleRing]]
+
+    def __init__(self):
+        self.rings = {}
+
+    def get_rings(self, symbol: str) -> dict[LiveCandleInterval, CandleRing]:
+        rings = self.rings.get(symbol)
+        if rings is None:
+            rings = {
+                interval: CandleRing(interval=seconds, capacity=LIVE_INTERVAL_CAPACITY[interval])
+                for interval, seconds in LIVE_INTERVAL_SECONDS.items()
+            }
+            self.rings[symbol] = rings
+        return rings
+
+    def add_trade(self, symbol: str, ts: float, price: float, size: float) -> list[dict]:
+        closed_bars = []
+        for interval, ring in self.get_rings(symbol=symbol).items():
+            closed_bar = ring.add(ts=ts, price=price, size=size)
+            if closed_bar is not None:
+                closed_bars.append({"symbol": symbol, "interval": interval, "bar": closed_bar})
+        return closed_bars
+
+    def get_columns(self, symbol: str, interval: LiveCandleInterval, limit: int) -> dict[str, list]:
+        rings = self.rings.get(symbol)
+        if rings is None:
+            return {field: [] for field in ("time", *BAR_FIELDS)}
+        return rings[interval].get_columns(limit=limit)
+
+    def remove(self, symbol: str) -> None:
+        self.rings.pop(symbol, None)
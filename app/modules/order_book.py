@@ -0,0 +1,260 @@
+import asyncio
+import itertools
+import math
+import time
+from bisect import bisect_left
+
+from fastapi import HTTPException, status
+from loguru import logger as LOGGER
+
+from app.modules.book_detector import BookDetector, BookDetectorState
+from app.modules.clients.kucoin_api import APIClient
+from app.modules.clients.kucoin_ws import WSClient
+from app.utils.enums import OrdersCount
+
+
+LEVEL2_TOPIC = "/market/level2"
+# deltas buffered while the snapshot is loading, older ones are dropped and lead to a resync
+MAX_BUFFERED_DELTAS = 10_000
+
+
+class BookSide:
+    """Price levels of one book side, kept in parallel arrays sorted by price ascending"""
+
+    prices: list[float]
+    sizes: list[float]
+
+    def __init__(self):
+        self.prices = []
+        self.sizes = []
+
+    def load(self, levels: list[list[str]]) -> None:
+        sorted_levels = sorted((float(price), float(size)) for price, size in levels)
+        self.prices = [price for price, _ in sorted_levels]
+        self.sizes = [size for _, size in sorted_levels]
+
+    def set(self, price: float, size: float) -> float:
+        """Set size for the price level, zero size removes the level. Returns the previous size"""
+        index = bisect_left(self.prices, price)
+        if index < len(self.prices) and self.prices[index] == price:
+            old_size = self.sizes[index]
+            if size:
+                self.sizes[index] = size
+            else:
+                del self.prices[index]
+                del self.sizes[index]
+            return old_size
+        if size:
+            self.prices.insert(index, price)
+            self.sizes.insert(index, size)
+        return 0.0
+
+    def get_levels(self, depth: int | None, step: float | None, descending: bool) -> list[list[float]]:
+        indexes = range(len(self.prices) - 1, -1, -1) if descending else range(len(self.prices))
+        if not step:
+            return [[self.prices[index], self.sizes[index]] for index in itertools.islice(indexes, depth)]
+
+        # bids are rounded down and asks are rounded up to the step
+        round_price = math.floor if descending else math.ceil
+        levels = []
+        for index in indexes:
+            price = round(round_price(self.prices[index] / step) * step, 12)
+            if levels and levels[-1][0] == price:
+                levels[-1][1] += self.sizes[index]
+                continue
+            if depth and len(levels) == depth:
+                break
+            levels.append([price, self.sizes[index]])
+        return levels
+
+
+class OrderBook:
+    symbol: str
+    sequence: int
+    bids: BookSide
+    asks: BookSide
+    updated_at: int
+    synced: asyncio.Event
+    detector_state: BookDetectorState | None
+
+    def __init__(self, symbol: str, detector_state: BookDetectorState | None = None):
+        self.symbol = symbol
+        self.sequence = 0
+        self.bids = BookSide()
+        self.asks = BookSide()
+        self.updated_at = 0
+        self.synced = asyncio.Event()
+        self.detector_state = detector_state
+        self._buffer: list[dict] = []
+
+    def load_snapshot(self, data: dict) -> None:
+        self.sequence = int(data["sequence"])
+        self.bids.load(data["bids"])
+        self.asks.load(data["asks"])
+        self.updated_at = int(data["time"])
+        if self.detector_state:
+            self.detector_state.reset(book=self)
+        buffered_deltas, self._buffer = self._buffer, []
+        # mark as synced before replaying, so deltas are applied and not buffered again
+        self.synced.set()
+        for delta in buffered_deltas:
+            if not self.apply_delta(delta):
+                self.reset()
+                raise ValueError(f"Order book {self.symbol}: buffered deltas do not continue the snapshot")
+
+    def reset(self) -> None:
+        self.synced.clear()
+        self.sequence = 0
+        self._buffer = []
+
+    def apply_delta(self, data: dict) -> bool:
+        """Apply level2 changes by sequence, returns False if there is a gap and book must be resynced"""
+        if not self.synced.is_set():
+            # snapshot is not loaded yet
+            if len(self._buffer) >= MAX_BUFFERED_DELTAS:
+                self._buffer = []
+            self._buffer.append(data)
+            return True
+        if int(data["sequenceEnd"]) <= self.sequence:
+            return True
+        if int(data["sequenceStart"]) > self.sequence + 1:
+            return False
+
+        changes = data["changes"]
+        detector_state = self.detector_state
+        for side, levels in ((self.asks, changes["asks"]), (self.bids, changes["bids"])):
+            for price, size, sequence in levels:
+                if int(sequence) <= self.sequence or price == "0":
+                    # already in snapshot or sequence-only change
+                    continue
+                price, size = float(price), float(size)
+                old_size = side.set(price=price, size=size)
+                if detector_state:
+                    detector_state.on_level_change(
+                        is_bid=side is self.bids, price=price, old_size=old_size, new_size=size
+                    )
+        self.sequence = int(data["sequenceEnd"])
+        self.updated_at = int(data["time"])
+        if detector_state:
+            detector_state.on_delta(book=self)
+        return True
+
+    def to_dict(self, depth: int | None = None, step: float | None = None) -> dict:
+        return {
+            "symbol": self.symbol,
+            "sequence": str(self.sequence),
+            "time": self.updated_at,
+            "bids": self.bids.get_levels(depth=depth, step=step, descending=True),
+            "asks": self.asks.get_levels(depth=depth, step=step, descending=False),
+        }
+
+
+class OrderBookManager:
+    """Keeps level2 order books in memory: REST snapshot plus websocket deltas applied by sequence"""
+
+    api_client: APIClient
+    ws_client: WSClient
+    books: dict[str, OrderBook]
+    sync_timeout_sec: float
+    detector: BookDetector | None
+
+    def __init__(
+        self,
+        api_client: APIClient,
+        ws_client: WSClient,
+        detector: BookDetector | None = None,
+        sync_timeout_sec: float = 10,
+    ):
+        self.api_client = api_client
+        self.ws_client = ws_client
+        self.detector = detector
+        self.books = {}
+        self.sync_timeout_sec = sync_timeout_sec
+        self._sync_tasks: dict[str, asyncio.Task] = {}
+
+    async def track(self, symbol: str) -> OrderBook:
+        """Start mirroring order book for symbol if it is not mirrored yet, don't wait for sync"""
+        book = self.books.get(symbol)
+        if book is None:
+            detector_state = self.detector.create_state(symbol=symbol) if self.detector else None
+            book = OrderBook(symbol=symbol, detector_state=detector_state)
+            self.books[symbol] = book
+            # subscribe first, deltas received before the snapshot are buffered
+            await self.ws_client.subscribe_topic(topic=f"{LEVEL2_TOPIC}:{symbol}")
+        if not book.synced.is_set():
+            self.start_sync(book=book)
+        return book
+
+    async def get_snapshot(self, symbol: str, count: OrdersCount | None = None) -> OrderBook:
+        """
+        Order book loaded from a single REST snapshot, it is not kept nor updated.
+
+        With `count` the public partial book is requested, full depth one needs auth and is rate limited harder.
+        """
+        from_symbol, to_symbol = symbol.split("-")
+        if count:
+            response = await self.api_client.get_order_book(from_symbol=from_symbol, to_symbol=to_symbol, count=count)
+        else:
+            response = await self.api_client.get_order_book_full(from_symbol=from_symbol, to_symbol=to_symbol)
+        data = response.json().get("data")
+        if not data:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Order book for {symbol} is not found")
+        book = OrderBook(symbol=symbol)
+        book.load_snapshot(data=data)
+        return book
+
+    async def watch(self, symbol: str, count: OrdersCount | None = None) -> OrderBook:
+        """
+        Return synced order book for a symbol mirrored by ingest, others are served from a REST snapshot.
+
+        Requests never start mirroring, so books, subscriptions and snapshot requests are bounded by triggers.
+        """
+        book = self.books.get(symbol)
+        if book is None or not self.ws_client.is_connected:
+            # not tracked, or ingest runs in another process and there are no deltas to keep the mirror up to date
+            return await self.get_snapshot(symbol=symbol, count=count)
+        try:
+            await asyncio.wait_for(book.synced.wait(), timeout=self.sync_timeout_sec)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Order book for {symbol} is not synced yet",
+            )
+        return book
+
+    async def unwatch(self, symbol: str) -> None:
+        book = self.books.pop(symbol, None)
+        if book is None:
+            return
+        sync_task = self._sync_tasks.pop(symbol, None)
+        if sync_task:
+            sync_task.cancel()
+        await self.ws_client.unsubscribe_topic(topic=f"{LEVEL2_TOPIC}:{symbol}")
+
+    def start_sync(self, book: OrderBook) -> None:
+        if book.symbol in self._sync_tasks:
+            return
+        self._sync_tasks[book.symbol] = asyncio.create_task(self.sync(book=book), name=f"sync_book_{book.symbol}")
+
+    async def sync(self, book: OrderBook) -> None:
+        try:
+            from_symbol, to_symbol = book.symbol.split("-")
+            started_at = time.monotonic()
+            response = await self.api_client.get_order_book_full(from_symbol=from_symbol, to_symbol=to_symbol)
+            book.load_snapshot(data=response.json()["data"])
+            LOGGER.debug(f"[ORDER BOOK] {book.symbol} synced in {time.monotonic() - started_at:.3f}s")
+        except (HTTPException, ValueError) as e:
+            LOGGER.error(f"[ORDER BOOK] {book.symbol} sync failed: {e}")
+            book.reset()
+        finally:
+            self._sync_tasks.pop(book.symbol, None)
+
+    def process_delta(self, data: dict) -> None:
+        book = self.books.get(data["symbol"])
+        if book is None:
+            return
+        if not book.apply_delta(data=data):
+            LOGGER.warning(f"[ORDER BOOK] {book.symbol} sequence gap, resyncing")
+            book.reset()
+            book.apply_delta(data=data)
+            self.start_sync(book=book)
@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+
+from loguru import logger as LOGGER
+from redis.exceptions import RedisError
+
+from app.modules.cache import Cache
+from app.utils.helpers import gen_request_id
+
+
+INGEST_NODES_KEY = "NODES-INGEST"
+
+
+def get_weight(node_id: str, symbol: str) -> int:
+    # python hash is salted per process, nodes must agree on weights
+    return int.from_bytes(hashlib.blake2b(f"{node_id}/{symbol}".encode(), digest_size=8).digest(), "big")
+
+
+class SymbolOwnership:
+    """
+    Splits symbols between alive ingest nodes with rendezvous hashing.
+
+    Nodes heartbeat into a redis sorted set, a node missing heartbeats for `ttl_ms` is dropped.
+    Each symbol is owned by the node with the highest weight for it, so a joining or leaving node
+    moves only its own share of symbols and the rest keep their owners.
+    """
+
+    cache: Cache
+    node_id: str
+    ttl_ms: int
+    heartbeat_interval_sec: float
+    nodes: list[str]
+    version: int
+
+    def __init__(self, cache: Cache, ttl_ms: int = 6000):
+        self.cache = cache
+        self.node_id = gen_request_id()
+        self.ttl_ms = ttl_ms
+        self.heartbeat_interval_sec = ttl_ms / 1000 / 3
+        self.nodes = [self.node_id]
+        # incremented on membership change, ownership is reconciled on it
+        self.version = 0
+
+    def get_owner(self, symbol: str) -> str:
+        return max(self.nodes, key=lambda node_id: get_weight(node_id=node_id, symbol=symbol))
+
+    def owns(self, symbol: str) -> bool:
+        return self.get_owner(symbol=symbol) == self.node_id
+
+    def filter(self, symbols: set[str]) -> set[str]:
+        return {symbol for symbol in symbols if self.owns(symbol=symbol)}
+
+    async def heartbeat(self) -> None:
+        nodes = sorted(await self.cache.heartbeat(name=INGEST_NODES_KEY, member=self.node_id, ttl_ms=self.ttl_ms))
+        if nodes == self.nodes:
+            return
+        LOGGER.warning(f"[OWNERSHIP] Ingest nodes changed: {len(self.nodes)} -> {len(nodes)}")
+        self.nodes = nodes
+        self.version += 1
+
+    async def leave(self) -> None:
+        """Leave on shutdown, so other nodes take the symbols over without waiting for the node to expire"""
+        await self.cache.remove_member(name=INGEST_NODES_KEY, member=self.node_id)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.heartbeat()
+            except RedisError as e:
+                # nodes are kept as they are, the node is dropped by others if it can't heartbeat
+                LOGGER.error(f"[OWNERSHIP] Heartbeat failed: {e}")
+            await asyncio.sleep(self.heartbeat_interval_sec)
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from loguru import logger as LOGGER
+
+from app.modules.clients.kucoin_api import APIClient
+from app.utils.enums import ExampleSymbols, RequestPriority
+
+
+class PriceSnapshot:
+    """
+    Last prices for all the market pairs, refreshed from a single `allTickers` request.
+
+    Ingest refreshes it periodically, processes without ingest refresh it on read once it is older than `max_age`.
+    """
+
+    api_client: APIClient
+    symbols_index: dict[str, int]
+    prices: list[str | None]
+    updated_at: datetime | None
+    max_age: timedelta
+
+    def __init__(self, api_client: APIClient, max_age_sec: int = 90):
+        self.api_client = api_client
+        self.symbols_index = {}
+        self.prices = []
+        self.updated_at = None
+        # a bit longer than the ingest refresh period, so ingest doesn't refresh on read
+        self.max_age = timedelta(seconds=max_age_sec)
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return self.updated_at is None or datetime.utcnow() - self.updated_at > self.max_age
+
+    async def refresh_if_stale(self) -> None:
+        if not self.is_stale:
+            return
+        # concurrent readers wait for a single refresh
+        async with self._refresh_lock:
+            if not self.is_stale:
+                return
+            try:
+                await self.refresh()
+            except HTTPException as e:
+                LOGGER.warning(f"[PRICES] Snapshot is not refreshed: {e.detail}")
+
+    async def refresh(self) -> int:
+        response = await self.api_client.get_all_tickers(priority=RequestPriority.PRICES)
+        tickers = response.json()["data"]["ticker"]
+
+        symbols_index = {}
+        prices = []
+        for ticker in tickers:
+            symbols_index[ticker["symbol"]] = len(prices)
+            prices.append(ticker["last"])
+
+        # swap both containers at once, so readers never see a half-built snapshot
+        self.symbols_index, self.prices = symbols_index, prices
+        self.updated_at = datetime.utcnow()
+        LOGGER.debug(f"[PRICES] Snapshot refreshed: {len(prices)} symbols")
+        return len(prices)
+
+    def get(self, symbol: str) -> str | None:
+        index = self.symbols_index.get(symbol)
+        if index is None:
+            return None
+        return self.prices[index]
+
+    async def get_price_in_usdt(self, from_symbol: str) -> str:
+        await self.refresh_if_stale()
+        price = self.get(f"{from_symbol}-{ExampleSymbols.USDT}")
+        if price is None:
+            # pair was listed after the last refresh or has no trades yet
+            LOGGER.warning(f"[PRICES] {from_symbol} is missing in snapshot, requesting ticker")
+            price = await self.api_client.get_price_in_usdt(from_symbol=from_symbol, priority=RequestPriority.PRICES)
+        return price
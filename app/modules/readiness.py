@@ -0,0 +1,44 @@
+import time
+
+from loguru import logger as LOGGER
+
+from app.utils.enums import StartupPhase
+
+
+class Readiness:
+    """Startup phases with seconds it took to reach each of them, reported by the healthcheck"""
+
+    started_at: float
+    ready_phase: StartupPhase
+    phases: dict[StartupPhase, float]
+    components: dict[str, bool]
+    is_draining: bool
+
+    def __init__(self, ready_phase: StartupPhase = StartupPhase.TRIGGERS_RESTORED):
+        self.started_at = time.monotonic()
+        self.ready_phase = ready_phase
+        self.phases = {}
+        self.components = {}
+        self.is_draining = False
+
+    @property
+    def is_ready(self) -> bool:
+        return self.ready_phase in self.phases and not self.is_draining
+
+    def mark(self, phase: StartupPhase) -> None:
+        """Record the phase once, called on hot paths so repeated marks cost a dict lookup"""
+        if phase in self.phases:
+            return
+        self.phases[phase] = round(time.monotonic() - self.started_at, 3)
+        LOGGER.info(f"[READINESS] {phase} in {self.phases[phase]}s")
+
+    def set_component(self, name: str, is_available: bool) -> None:
+        self.components[name] = is_available
+
+    def to_dict(self) -> dict:
+        return {
+            "ready": self.is_ready,
+            "draining": self.is_draining,
+            "phases": self.phases,
+            "components": self.components,
+        }
@@ -0,0 +1,207 @@
+import asyncio
+import time
+
+from loguru import logger as LOGGER
+
+from app.db.crud_shadow_triggers import KucoinShadowTriggersManager
+from app.db.crud_triggers import KucoinTriggersManager
+from app.db.models import KucoinTrigger
+from app.modules.cache import Cache
+from app.modules.clients.kucoin_ws import WSClient
+from app.modules.ownership import SymbolOwnership
+from app.modules.prices import PriceSnapshot
+from app.modules.shadow import ShadowEvaluator
+from app.utils.schemas import CachedTriggerSchema
+
+
+# cached trigger fields compared with the database, price is refreshed by `update_prices`
+TRIGGER_PARAMS = (
+    "min_value_usdt",
+    "max_value_usdt",
+    "transactions_max_count",
+    "period_seconds",
+    "side",
+    "cooldown_seconds",
+)
+HANDOVER_KEY_PREFIX = "HANDOVER-SHADOW-"
+
+
+class TriggersReconciler:
+    """
+    Brings websocket subscriptions and cached triggers in line with triggers in database.
+
+    Desired state is diffed against the current one and only the difference is applied,
+    so collected events and cooldowns of unchanged triggers are kept.
+    With `ownership` only symbols owned by this node are subscribed, shadow windows of symbols
+    moved to another node are handed over to it via redis.
+    """
+
+    db_triggers: KucoinTriggersManager
+    db_shadow_triggers: KucoinShadowTriggersManager
+    ws_client: WSClient
+    prices: PriceSnapshot
+    cache: Cache
+    shadow: ShadowEvaluator
+    concurrency: int
+    ownership: SymbolOwnership | None
+    handover_ttl_sec: int
+    known_symbols: set[str] | None
+    owned_symbols: set[str] | None
+    pending_handovers: dict[str, float]
+
+    def __init__(
+        self,
+        db_triggers: KucoinTriggersManager,
+        db_shadow_triggers: KucoinShadowTriggersManager,
+        ws_client: WSClient,
+        prices: PriceSnapshot,
+        cache: Cache,
+        shadow: ShadowEvaluator,
+        concurrency: int = 10,
+        ownership: SymbolOwnership | None = None,
+        handover_ttl_sec: int = 600,
+    ):
+        self.db_triggers = db_triggers
+        self.db_shadow_triggers = db_shadow_triggers
+        self.ws_client = ws_client
+        self.prices = prices
+        self.cache = cache
+        self.shadow = shadow
+        self.concurrency = concurrency
+        self.ownership = ownership
+        self.handover_ttl_sec = handover_ttl_sec
+        # symbols cached and owned by the last run, None until the first run
+        self.known_symbols = None
+        self.owned_symbols = None
+        # symbols taken over -> deadline to wait for their state from the previous owner
+        self.pending_handovers = {}
+
+    @property
+    def version(self) -> tuple[int, int]:
+        """Changes when triggers or ingest nodes change"""
+        return self.db_triggers.version, self.ownership.version if self.ownership else 0
+
+    async def sync_shadow_triggers(self) -> bool:
+        """Apply shadow triggers added or removed via api of other processes, returns True if any changed"""
+        return self.shadow.sync(triggers=await self.db_shadow_triggers.get_list())
+
+    async def reconcile(self) -> None:
+        LOGGER.debug("[RECONCILER] Reconciling triggers...")
+        all_triggers = await self.db_triggers.get_list()
+        triggers = {f"{trigger.from_symbol}-{trigger.to_symbol}": trigger for trigger in all_triggers}
+        symbols = set(triggers) | self.shadow.symbols
+        if self.ownership:
+            symbols = self.ownership.filter(symbols=symbols)
+            await self.hand_over(symbols=symbols)
+        await self.reconcile_subscriptions(symbols=symbols)
+        await self.reconcile_cache(
+            triggers={symbol: trigger for symbol, trigger in triggers.items() if symbol in symbols},
+            all_symbols=set(triggers),
+        )
+        await self.take_over()
+        LOGGER.debug("[RECONCILER] Reconciling triggers... Finished!")
+
+    async def hand_over(self, symbols: set[str]) -> None:
+        """Save shadow state of symbols moved to other nodes and wait for the state of symbols moved here"""
+        owned_symbols = self.owned_symbols or set()
+        released_symbols = (owned_symbols - symbols) & self.shadow.symbols
+        if released_symbols:
+            states = {
+                f"{HANDOVER_KEY_PREFIX}{symbol}": self.shadow.dump(symbols={symbol}) for symbol in released_symbols
+            }
+            await self.cache.save_state(objects=states, ttl_seconds=self.handover_ttl_sec)
+            self.shadow.release(symbols=released_symbols)
+        # the previous owner may learn about the change later, state is waited for a few heartbeats
+        deadline = time.monotonic() + (self.ownership.heartbeat_interval_sec * 3)
+        self.pending_handovers = {
+            symbol: symbol_deadline for symbol, symbol_deadline in self.pending_handovers.items() if symbol in symbols
+        }
+        for symbol in (symbols - owned_symbols) & self.shadow.symbols:
+            self.pending_handovers[symbol] = deadline
+        self.owned_symbols = symbols
+        LOGGER.debug(f"[RECONCILER] Handed over: {len(released_symbols)}, taking over: {len(self.pending_handovers)}")
+
+    async def take_over(self) -> None:
+        """Merge shadow state handed over by previous owners, called until it arrives or the wait times out"""
+        if not self.pending_handovers:
+            return
+        symbols = list(self.pending_handovers)
+        names = [f"{HANDOVER_KEY_PREFIX}{symbol}" for symbol in symbols]
+        states = await self.cache.get_many(names=names)
+        now = time.monotonic()
+        taken_names = []
+        for symbol, name, state in zip(symbols, names, states):
+            if state is not None:
+                self.shadow.take_over(state=state)
+                taken_names.append(name)
+            if state is not None or now > self.pending_handovers[symbol]:
+                del self.pending_handovers[symbol]
+        await self.cache.bulk_delete(names=taken_names)
+
+    async def release_all(self) -> None:
+        """Hand over every owned symbol on shutdown, nodes left take them over"""
+        await self.ownership.leave()
+        await self.hand_over(symbols=set())
+
+    async def reconcile_subscriptions(self, symbols: set[str]) -> None:
+        to_subscribe = symbols - self.ws_client.subscribed
+        to_unsubscribe = self.ws_client.subscribed - symbols
+        if to_subscribe:
+            await self.ws_client.subscribe_many(pairs=[tuple(symbol.split("-")) for symbol in sorted(to_subscribe)])
+        if to_unsubscribe:
+            await self.ws_client.subscribe_many(
+                pairs=[tuple(symbol.split("-")) for symbol in sorted(to_unsubscribe)],
+                subscription=False,
+            )
+        LOGGER.debug(f"[RECONCILER] Subscribed: {len(to_subscribe)}, unsubscribed: {len(to_unsubscribe)}")
+
+    async def get_known_symbols(self) -> set[str]:
+        if self.known_symbols is not None:
+            return self.known_symbols
+        # first run, triggers removed while the app was down are found by their events tables
+        keys = await self.cache.scan_by_pattern(pattern="EVENTS-*")
+        return {key.removeprefix("EVENTS-") for key in keys}
+
+    async def reconcile_cache(self, triggers: dict[str, KucoinTrigger], all_symbols: set[str]) -> None:
+        """Cache given triggers, triggers removed from database are removed by any node"""
+        symbols = list(triggers)
+        cached_triggers = await self.cache.get_many(names=symbols)
+        changed_symbols = [
+            symbol
+            for symbol, cached_trigger in zip(symbols, cached_triggers)
+            if cached_trigger is None
+            or any(cached_trigger.get(name) != getattr(triggers[symbol], name) for name in TRIGGER_PARAMS)
+        ]
+        if changed_symbols and self.prices.updated_at is None:
+            await self.prices.refresh()
+
+        # prices missing in the snapshot are requested concurrently, bounded not to drain the rate limit
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def get_price(from_symbol: str) -> str:
+            async with semaphore:
+                return await self.prices.get_price_in_usdt(from_symbol=from_symbol)
+
+        prices = await asyncio.gather(*[get_price(triggers[symbol].from_symbol) for symbol in changed_symbols])
+        objects = {}
+        for symbol, price_usdt in zip(changed_symbols, prices):
+            trigger = triggers[symbol]
+            cached_trigger_data = CachedTriggerSchema(
+                price_usdt=price_usdt,
+                min_value_usdt=trigger.min_value_usdt,
+                max_value_usdt=trigger.max_value_usdt,
+                transactions_max_count=trigger.transactions_max_count,
+                period_seconds=trigger.period_seconds,
+                cooldown_seconds=trigger.cooldown_seconds,
+                side=trigger.side,
+            )
+            objects[symbol] = cached_trigger_data.dict()
+        if objects:
+            await self.cache.bulk_add(objects=objects)
+
+        stale_symbols = (await self.get_known_symbols()) - all_symbols
+        await self.cache.bulk_delete(
+            names=[f"{prefix}{symbol}" for symbol in stale_symbols for prefix in ("", "EVENTS-", "NOTIFIED-")]
+        )
+        self.known_symbols = set(triggers)
+        LOGGER.debug(f"[RECONCILER] Cached triggers updated: {len(objects)}, removed: {len(stale_symbols)}")
@@ -1,31 +1,28 @@
 from loguru import logger as LOGGER
 from rocketry import Rocketry
-from rocketry.conditions.api import hourly
+from rocketry.conditions.api import daily
 
-from app.db.crud_triggers import KucoinTriggersManager
-from app.managers.triggers_manager import restart_triggers
+from app.db.crud_events import KucoinEventsManager
 from app.modules.cache import Cache
-from app.modules.clients.kucoin_api import APIClient
-from app.modules.clients.kucoin_ws import WSClient
 
 
 class Scheduler:
     scheduler: Rocketry
-    db_triggers: KucoinTriggersManager
-    ws_client: WSClient
-    api_client: APIClient
+    db_events: KucoinEventsManager
     cache: Cache
 
-    def __init__(self, cache: Cache, db_triggers: KucoinTriggersManager, ws_client: WSClient, api_client: APIClient):
+    def __init__(
+        self,
+        cache: Cache,
+        db_events: KucoinEventsManager,
+    ):
         self.scheduler = Rocketry(
             config={
                 "task_execution": "async",
                 "silence_task_logging": False,
             }
         )
-        self.db_triggers = db_triggers
-        self.ws_client = ws_client
-        self.api_client = api_client
+        self.db_events = db_events
         self.cache = cache
 
     async def start(self):
@@ -40,18 +37,13 @@ class Scheduler:
         if self.scheduler.session is not None:
             await self.scheduler.session.shut_down()
 
-    async def restart_triggers_task(self):
-        await restart_triggers(
-            db_triggers=self.db_triggers,
-            ws_client=self.ws_client,
-            api_client=self.api_client,
-            cache=self.cache,
-        )
+    async def ensure_events_partitions_task(self):
+        await self.db_events.ensure_partitions()
 
     async def add_tasks(self):
-        # task to reset is_notified to False for each trigger in cache
+        # task to create events table partitions ahead of time
         self.scheduler.task(
-            start_cond=hourly.at("00:00"),
-            name="restart_triggers",
-            func=self.restart_triggers_task,
+            start_cond=daily.at("00:05"),
+            name="ensure_events_partitions",
+            func=self.ensure_events_partitions_task,
         )
@@ -0,0 +1,298 @@
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime, timezone
+
+from loguru import logger as LOGGER
+
+from app.db.models import KucoinShadowTrigger
+from app.modules.batcher import CopyBatcher
+from app.modules.prices import PriceSnapshot
+from app.utils.enums import ExampleSymbols, TradeSide
+
+
+class FenwickTree:
+    """Counts per bucket with prefix sums, both updated in O(log n)"""
+
+    tree: list[int]
+
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def update(self, index: int, delta: int) -> None:
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, index: int) -> int:
+        """Sum of buckets up to the index inclusive"""
+        total = 0
+        index += 1
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+
+class ShadowWindow:
+    """
+    Trades of one symbol within one period, shared by all shadow triggers with the same period and side.
+
+    Boundaries of the triggers value ranges split values into buckets: bucket `2 * i + 1` holds values equal
+    to boundary `i`, bucket `2 * i` the values between boundaries `i - 1` and `i`. Trades are counted per bucket
+    in a Fenwick tree, so the count for a value range is two prefix sums, and value ranges containing each
+    bucket are indexed once, so a trade only looks at the ranges it falls into. Triggers with the same value
+    range share that count and are looked up by their `transactions_max_count`.
+    """
+
+    period_ns: int
+    times: deque[int]
+    values: deque[float]
+    buckets: deque[int]
+    thresholds: dict[tuple[float, float], dict[int, list[KucoinShadowTrigger]]]
+    boundaries: list[float]
+    bucket_ranges: list[list[tuple[int, int, dict[int, list[KucoinShadowTrigger]]]]]
+    counts: FenwickTree
+
+    def __init__(self, period_seconds: int):
+        self.period_ns = period_seconds * 1_000_000_000
+        self.times = deque()
+        self.values = deque()
+        self.thresholds = {}
+        self.reindex()
+
+    def add_trigger(self, trigger: KucoinShadowTrigger) -> None:
+        value_range = (trigger.min_value_usdt, trigger.max_value_usdt)
+        is_new_range = value_range not in self.thresholds
+        self.thresholds.setdefault(value_range, {}).setdefault(trigger.transactions_max_count, []).append(trigger)
+        if is_new_range:
+            self.reindex()
+
+    def remove_trigger(self, trigger_id: int) -> None:
+        ranges_count = len(self.thresholds)
+        for value_range, counts in list(self.thresholds.items()):
+            for count, triggers in list(counts.items()):
+                counts[count] = [trigger for trigger in triggers if trigger.id != trigger_id]
+                if not counts[count]:
+                    del counts[count]
+            if not counts:
+                del self.thresholds[value_range]
+        if len(self.thresholds) != ranges_count:
+            self.reindex()
+
+    def get_bucket(self, value: float) -> int:
+        index = bisect_left(self.boundaries, value)
+        if index < len(self.boundaries) and self.boundaries[index] == value:
+            return 2 * index + 1
+        return 2 * index
+
+    def reindex(self) -> None:
+        """Rebuild buckets for the current value ranges and recount trades, run on value ranges change"""
+        self.boundaries = sorted({boundary for value_range in self.thresholds for boundary in value_range})
+        self.bucket_ranges = [[] for _ in range(2 * len(self.boundaries) + 1)]
+        for (min_value_usdt, max_value_usdt), counts in self.thresholds.items():
+            # ranges exclude their boundaries, count is the sum of buckets after min bucket up to max one
+            min_bucket, max_bucket = self.get_bucket(min_value_usdt), self.get_bucket(max_value_usdt) - 1
+            for bucket in range(min_bucket + 1, max_bucket + 1):
+                self.bucket_ranges[bucket].append((min_bucket, max_bucket, counts))
+        self.counts = FenwickTree(size=len(self.bucket_ranges))
+        self.buckets = deque(self.get_bucket(value) for value in self.values)
+        for bucket in self.buckets:
+            self.counts.update(index=bucket, delta=1)
+
+    def restore(self, times: list[int], values: list[float]) -> None:
+        self.times = deque(times)
+        self.values = deque(values)
+        self.reindex()
+
+    def merge(self, times: list[int], values: list[float]) -> None:
+        """Prepend trades handed over by the previous owner, the ones seen by both nodes are taken from this one"""
+        first_time = self.times[0] if self.times else None
+        older = [
+            (time_ns, value) for time_ns, value in zip(times, values) if first_time is None or time_ns < first_time
+        ]
+        if not older:
+            return
+        self.times.extendleft(time_ns for time_ns, _ in reversed(older))
+        self.values.extendleft(value for _, value in reversed(older))
+        self.reindex()
+
+    def evict(self, time_ns: int) -> None:
+        window_start = time_ns - self.period_ns
+        while self.times and self.times[0] < window_start:
+            self.times.popleft()
+            self.values.popleft()
+            self.counts.update(index=self.buckets.popleft(), delta=-1)
+
+    def add(self, time_ns: int, value_usdt: float) -> list[tuple[KucoinShadowTrigger, int]]:
+        """Add trade and return triggers for which this trade is the `transactions_max_count` event"""
+        self.evict(time_ns=time_ns)
+        bucket = self.get_bucket(value_usdt)
+        self.times.append(time_ns)
+        self.values.append(value_usdt)
+        self.buckets.append(bucket)
+        self.counts.update(index=bucket, delta=1)
+
+        fired = []
+        # only ranges containing the trade value got a new event
+        for min_bucket, max_bucket, counts in self.bucket_ranges[bucket]:
+            count = self.counts.prefix_sum(index=max_bucket) - self.counts.prefix_sum(index=min_bucket)
+            fired.extend((trigger, count) for trigger in counts.get(count, ()))
+        return fired
+
+
+class ShadowEvaluator:
+    """Evaluates shadow triggers on the live trades stream, would-be alerts are written to the stats table"""
+
+    prices: PriceSnapshot
+    alerts: CopyBatcher
+    windows: dict[str, dict[tuple[int, TradeSide], ShadowWindow]]
+    triggers: dict[int, KucoinShadowTrigger]
+
+    def __init__(self, prices: PriceSnapshot, alerts: CopyBatcher):
+        self.prices = prices
+        self.alerts = alerts
+        self.windows = {}
+        self.triggers = {}
+        # trigger id -> time in ns until which its alerts are muted
+        self._muted_until: dict[int, int] = {}
+
+    @property
+    def symbols(self) -> set[str]:
+        return set(self.windows)
+
+    def load(self, triggers: list[KucoinShadowTrigger], state: dict | None = None) -> None:
+        """Load triggers and restore windows saved before restart, with no await in between"""
+        self.windows = {}
+        self.triggers = {}
+        self._muted_until = {}
+        for trigger in triggers:
+            self.add(trigger=trigger)
+        if state:
+            self.restore(state=state, trigger_ids={trigger.id for trigger in triggers})
+        LOGGER.debug(f"[SHADOW] Loaded {len(triggers)} shadow triggers for {len(self.windows)} symbols")
+
+    def dump(self, symbols: set[str] | None = None) -> dict:
+        """Windows and cooldowns of all symbols or of the given ones"""
+        windows = [
+            {
+                "symbol": symbol,
+                "period_seconds": period_seconds,
+                "side": side,
+                "times": list(window.times),
+                "values": list(window.values),
+            }
+            for symbol, symbol_windows in self.windows.items()
+            if symbols is None or symbol in symbols
+            for (period_seconds, side), window in symbol_windows.items()
+            if window.times
+        ]
+        trigger_ids = None if symbols is None else self.get_trigger_ids(symbols=symbols)
+        muted_until = {
+            str(id_): until for id_, until in self._muted_until.items() if trigger_ids is None or id_ in trigger_ids
+        }
+        return {"windows": windows, "muted_until": muted_until}
+
+    def get_trigger_ids(self, symbols: set[str]) -> set[int]:
+        return {
+            trigger.id
+            for symbol in symbols
+            for window in self.windows.get(symbol, {}).values()
+            for counts in window.thresholds.values()
+            for triggers in counts.values()
+            for trigger in triggers
+        }
+
+    def release(self, symbols: set[str]) -> None:
+        """Forget trades and cooldowns of symbols handed over to another node, triggers are kept"""
+        for symbol in symbols:
+            for window in self.windows.get(symbol, {}).values():
+                window.restore(times=[], values=[])
+        for trigger_id in self.get_trigger_ids(symbols=symbols):
+            self._muted_until.pop(trigger_id, None)
+
+    def take_over(self, state: dict) -> None:
+        """Merge windows and cooldowns handed over by the previous owner of symbols"""
+        for window_state in state["windows"]:
+            window = self.windows.get(window_state["symbol"], {}).get(
+                (window_state["period_seconds"], window_state["side"])
+            )
+            if window is not None:
+                window.merge(times=window_state["times"], values=window_state["values"])
+        for id_, until in state["muted_until"].items():
+            self._muted_until[int(id_)] = max(until, self._muted_until.get(int(id_), 0))
+
+    def restore(self, state: dict, trigger_ids: set[int]) -> None:
+        restored_count = 0
+        for window_state in state["windows"]:
+            symbol_windows = self.windows.get(window_state["symbol"], {})
+            window = symbol_windows.get((window_state["period_seconds"], window_state["side"]))
+            if window is None:
+                continue
+            window.restore(times=window_state["times"], values=window_state["values"])
+            restored_count += 1
+        self._muted_until = {int(id_): until for id_, until in state["muted_until"].items() if int(id_) in trigger_ids}
+        LOGGER.debug(f"[SHADOW] Restored {restored_count} windows")
+
+    def sync(self, triggers: list[KucoinShadowTrigger]) -> bool:
+        """Add and remove triggers to match the given ones, windows of kept triggers are untouched"""
+        new_triggers = {trigger.id: trigger for trigger in triggers}
+        removed_ids = set(self.triggers) - set(new_triggers)
+        added_ids = set(new_triggers) - set(self.triggers)
+        for trigger_id in removed_ids:
+            self.remove(trigger=self.triggers[trigger_id])
+        for trigger_id in added_ids:
+            self.add(trigger=new_triggers[trigger_id])
+        if removed_ids or added_ids:
+            LOGGER.debug(f"[SHADOW] Synced triggers, added: {len(added_ids)}, removed: {len(removed_ids)}")
+        return bool(removed_ids or added_ids)
+
+    def add(self, trigger: KucoinShadowTrigger) -> None:
+        if trigger.id in self.triggers:
+            return
+        self.triggers[trigger.id] = trigger
+        symbol = f"{trigger.from_symbol}-{trigger.to_symbol}"
+        symbol_windows = self.windows.setdefault(symbol, {})
+        window = symbol_windows.get((trigger.period_seconds, trigger.side))
+        if window is None:
+            window = symbol_windows[(trigger.period_seconds, trigger.side)] = ShadowWindow(trigger.period_seconds)
+        window.add_trigger(trigger=trigger)
+
+    def remove(self, trigger: KucoinShadowTrigger) -> None:
+        self.triggers.pop(trigger.id, None)
+        symbol = f"{trigger.from_symbol}-{trigger.to_symbol}"
+        symbol_windows = self.windows.get(symbol, {})
+        window = symbol_windows.get((trigger.period_seconds, trigger.side))
+        if window is None:
+            return
+        window.remove_trigger(trigger_id=trigger.id)
+        if not window.thresholds:
+            del symbol_windows[(trigger.period_seconds, trigger.side)]
+        if not symbol_windows:
+            self.windows.pop(symbol, None)
+        self._muted_until.pop(trigger.id, None)
+
+    def process_trade(self, symbol: str, time_ns: int, side: TradeSide, size: float) -> None:
+        symbol_windows = self.windows.get(symbol)
+        if not symbol_windows:
+            return
+        price_usdt = self.prices.get(f"{symbol.split('-')[0]}-{ExampleSymbols.USDT}")
+        if price_usdt is None:
+            return
+        value_usdt = float(price_usdt) * size
+        for (_, trigger_side), window in symbol_windows.items():
+            if trigger_side not in (side, TradeSide.BOTH):
+                continue
+            for trigger, count in window.add(time_ns=time_ns, value_usdt=value_usdt):
+                # one alert per trigger cooldown, as for live triggers
+                if time_ns < self._muted_until.get(trigger.id, 0):
+                    continue
+                self._muted_until[trigger.id] = time_ns + trigger.cooldown_seconds * 1_000_000_000
+                self.alerts.put(
+                    {
+                        "shadow_trigger_id": trigger.id,
+                        "time": datetime.fromtimestamp(time_ns / 1_000_000_000, tz=timezone.utc),
+                        "symbol": symbol,
+                        "transactions_count": count,
+                    }
+                )
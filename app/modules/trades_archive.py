@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+from loguru import logger as LOGGER
+
+from app.utils.enums import TradeSide
+
+
+# one file per column in each symbol day directory, rows are appended in time order
+TRADE_COLUMNS = {
+    "time": np.dtype("<i8"),  # nanoseconds
+    "price": np.dtype("<f8"),
+    "size": np.dtype("<f8"),
+    "side": np.dtype("i1"),  # 1 for buy, -1 for sell
+}
+DAY_NS = 24 * 60 * 60 * 1_000_000_000
+AGGREGATE_FIELDS = ("time", "count", "volume", "buy_volume", "sell_volume", "turnover", "vwap", "high", "low")
+
+
+class TradeArchive:
+    """
+    Columnar on-disk archive of trades, one directory per symbol and UTC day.
+
+    Trades are buffered in memory and appended to column files by a background task,
+    queries memory map the column files and aggregate only the requested time range.
+    """
+
+    base_dir: Path
+    flush_interval_sec: float
+    max_buffered_trades: int
+
+    def __init__(self, base_dir: str, flush_interval_sec: float = 1, max_buffered_trades: int = 1_000_000):
+        self.base_dir = Path(base_dir)
+        self.flush_interval_sec = flush_interval_sec
+        self.max_buffered_trades = max_buffered_trades
+        self._buffers: dict[str, list[tuple[int, float, float, int]]] = {}
+        self._buffered_count = 0
+
+    def get_day_dir(self, symbol: str, day: int) -> Path:
+        day_date = datetime.fromtimestamp(day * DAY_NS / 1_000_000_000, tz=timezone.utc).date()
+        return self.base_dir / symbol / day_date.isoformat()
+
+    def add_trade(self, symbol: str, time_ns: int, price: float, size: float, side: TradeSide) -> None:
+        if self._buffered_count >= self.max_buffered_trades:
+            LOGGER.warning(f"[TRADES ARCHIVE] Buffer is full, dropping trade for {symbol}")
+            return
+        self._buffers.setdefault(symbol, []).append((time_ns, price, size, 1 if side == TradeSide.BUY else -1))
+        self._buffered_count += 1
+
+    @staticmethod
+    def get_rows_count(paths: dict[str, Path]) -> int:
+        return min(
+            path.stat().st_size // TRADE_COLUMNS[name].itemsize if path.exists() else 0 for name, path in paths.items()
+        )
+
+    def align_day(self, day_dir: Path) -> None:
+        """Truncate columns to the complete rows, so a failed append doesn't shift rows written after it"""
+        paths = {name: day_dir / f"{name}.bin" for name in TRADE_COLUMNS}
+        count = self.get_rows_count(paths=paths)
+        for name, path in paths.items():
+            size = count * TRADE_COLUMNS[name].itemsize
+            if path.exists() and path.stat().st_size != size:
+                LOGGER.warning(f"[TRADES ARCHIVE] Truncating {path} to {count} rows")
+                with path.open("r+b") as file:
+                    file.truncate(size)
+
+    def write(self, symbol: str, trades: list[tuple[int, float, float, int]]) -> None:
+        columns = {
+            name: np.array([trade[index] for trade in trades], dtype=dtype)
+            for index, (name, dtype) in enumerate(TRADE_COLUMNS.items())
+        }
+        days = columns["time"] // DAY_NS
+        # trades come in time order, so each day is a contiguous slice
+        day_starts = np.flatnonzero(np.diff(days, prepend=days[0] - 1))
+        day_ends = np.append(day_starts[1:], len(days))
+        for start, end in zip(day_starts, day_ends):
+            day_dir = self.get_day_dir(symbol=symbol, day=int(days[start]))
+            day_dir.mkdir(parents=True, exist_ok=True)
+            self.align_day(day_dir=day_dir)
+            for name, values in columns.items():
+                with (day_dir / f"{name}.bin").open("ab") as file:
+                    file.write(values[start:end].tobytes())
+
+    async def flush(self) -> None:
+        buffers, self._buffers = self._buffers, {}
+        self._buffered_count = 0
+        for symbol, trades in buffers.items():
+            try:
+                await asyncio.to_thread(self.write, symbol, trades)
+            except OSError as e:
+                LOGGER.error(f"[TRADES ARCHIVE] {len(trades)} trades of {symbol} are not written: {e}")
+
+    async def run(self) -> None:
+        """Write buffered trades periodically, remaining trades are written on cancel"""
+        try:
+            while True:
+                await asyncio.sleep(self.flush_interval_sec)
+                await self.flush()
+        except asyncio.CancelledError:
+            await self.flush()
+            raise
+
+    def read_day(self, day_dir: Path) -> dict[str, np.ndarray]:
+        paths = {name: day_dir / f"{name}.bin" for name in TRADE_COLUMNS}
+        # columns may differ in length after an interrupted write, read only complete rows
+        count = self.get_rows_count(paths=paths)
+        if not count:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in TRADE_COLUMNS.items()}
+        return {name: np.memmap(paths[name], dtype=TRADE_COLUMNS[name], mode="r", shape=(count,)) for name in paths}
+
+    def query(self, symbol: str, start_ns: int, end_ns: int) -> dict[str, np.ndarray]:
+        """Trades with time in [start_ns, end_ns), only the selected rows are copied from memory mapped files"""
+        parts = []
+        for day in range(start_ns // DAY_NS, (end_ns - 1) // DAY_NS + 1):
+            day_columns = self.read_day(day_dir=self.get_day_dir(symbol=symbol, day=day))
+            left = np.searchsorted(day_columns["time"], start_ns, side="left")
+            right = np.searchsorted(day_columns["time"], end_ns, side="left")
+            if left < right:
+                parts.append({name: np.array(values[left:right]) for name, values in day_columns.items()})
+        if not parts:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in TRADE_COLUMNS.items()}
+        return {name: np.concatenate([part[name] for part in parts]) for name in TRADE_COLUMNS}
+
+    def aggregate(self, symbol: str, start_ns: int, end_ns: int, bucket_sec: int) -> dict[str, list]:
+        """Per bucket trades count, volumes, turnover, vwap and price range, empty buckets are skipped"""
+        trades = self.query(symbol=symbol, start_ns=start_ns, end_ns=end_ns)
+        times, prices, sizes, sides = trades["time"], trades["price"], trades["size"], trades["side"]
+        if not len(times):
+            return {field: [] for field in AGGREGATE_FIELDS}
+
+        bucket_ns = bucket_sec * 1_000_000_000
+        buckets = (times - start_ns) // bucket_ns
+        bucket_starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+        bucket_ids = np.cumsum(np.diff(buckets, prepend=buckets[0]) > 0)
+        volume = np.bincount(bucket_ids, weights=sizes)
+        buy_volume = np.bincount(bucket_ids, weights=sizes * (sides > 0))
+        turnover = np.bincount(bucket_ids, weights=prices * sizes)
+        return {
+            "time": ((start_ns + buckets[bucket_starts] * bucket_ns) // 1_000_000_000).tolist(),
+            "count": np.bincount(bucket_ids).tolist(),
+            "volume": volume.tolist(),
+            "buy_volume": buy_volume.tolist(),
+            "sell_volume": (volume - buy_volume).tolist(),
+            "turnover": turnover.tolist(),
+            "vwap": (turnover / volume).tolist(),
+            "high": np.maximum.reduceat(prices, bucket_starts).tolist(),
+            "low": np.minimum.reduceat(prices, bucket_starts).tolist(),
+        }
@@ -1,26 +1,232 @@
+import asyncio
+
+import orjson
 import websockets.exceptions
-from fastapi import WebSocket
+from fastapi import WebSocket, WebSocketDisconnect, status
+from loguru import logger as LOGGER
+from redis.exceptions import RedisError
+
+from app.modules.cache import Cache
+from app.utils.enums import DashboardTopicKind
+from app.utils.helpers import default_decimal_serializer
+
+
+# topic symbol to receive the kind of messages for all symbols, e.g. "alerts:*"
+WILDCARD_SYMBOL = "*"
+# frames published by ingest and consumer processes, fanned out by every api process to its clients
+DASHBOARD_CHANNEL = "DASHBOARD"
+
+
+class DashboardClient:
+    """Dashboard connection with a bounded outbound queue drained by its own writer task"""
+
+    websocket: WebSocket
+    queue: asyncio.Queue
+    dropped_count: int
+    writer_task: asyncio.Task | None
+    topics: set[str]
+
+    def __init__(self, websocket: WebSocket, max_queued_messages: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queued_messages)
+        self.dropped_count = 0
+        self.writer_task = None
+        self.topics = set()
+
+    def send(self, message: str) -> bool:
+        """Queue message without waiting, the oldest message is dropped if the client is behind"""
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(message)
+            self.dropped_count += 1
+            return False
+
+    async def write(self) -> None:
+        while True:
+            message = await self.queue.get()
+            await self.websocket.send_text(message)
+            # client caught up, only drops since it last did count towards closing it
+            if self.queue.empty():
+                self.dropped_count = 0
 
 
 class WSServer:
-    active_connections: list[WebSocket]
+    """
+    Pushes messages to dashboard clients.
+
+    Clients subscribe to `kind:symbol` topics, publishing looks up only the topic and its `kind:*` wildcard
+    in the topic -> clients index. Each message is serialized once and queued to every subscriber,
+    clients are written by their own tasks, so a slow client never delays the others.
+    Clients dropping more than `max_dropped_messages` without draining their queue in between are closed.
+
+    Dashboards connect to api processes, so with the relay enabled published messages are sent to redis
+    instead of local clients and every api process delivers them from the channel to its own clients.
+    """
+
+    connections: dict[WebSocket, DashboardClient]
+    subscribers: dict[str, set[DashboardClient]]
+    max_queued_messages: int
+    max_dropped_messages: int
+    outbox: asyncio.Queue | None
+
+    def __init__(self, max_queued_messages: int = 1000, max_dropped_messages: int = 5000):
+        self.connections = {}
+        self.subscribers = {}
+        self.max_queued_messages = max_queued_messages
+        self.max_dropped_messages = max_dropped_messages
+        # frames waiting to be sent to redis, set while the relay is enabled
+        self.outbox = None
 
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+    @property
+    def active_connections(self) -> list[WebSocket]:
+        return list(self.connections)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket) -> DashboardClient:
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = DashboardClient(websocket=websocket, max_queued_messages=self.max_queued_messages)
+        client.writer_task = asyncio.create_task(self.run_writer(client=client), name="dashboard_client_writer")
+        self.connections[websocket] = client
+        return client
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+    def disconnect(self, websocket: WebSocket) -> None:
+        client = self.connections.pop(websocket, None)
+        if client is None:
+            return
+        self.unsubscribe(client=client, topics=list(client.topics))
+        if client.writer_task and client.writer_task is not asyncio.current_task():
+            client.writer_task.cancel()
 
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+    @staticmethod
+    def parse_topic(topic: str) -> str | None:
+        """Normalized `kind:symbol` topic or None if it is not valid"""
+        kind, _, symbol = topic.partition(":")
+        if kind not in DashboardTopicKind.__members__.values() or not symbol:
+            return None
+        return f"{kind}:{symbol.upper()}"
+
+    def subscribe(self, client: DashboardClient, topics: list[str]) -> None:
+        for topic in topics:
+            self.subscribers.setdefault(topic, set()).add(client)
+            client.topics.add(topic)
+
+    def unsubscribe(self, client: DashboardClient, topics: list[str]) -> None:
+        for topic in topics:
+            topic_subscribers = self.subscribers.get(topic)
+            if topic_subscribers is not None:
+                topic_subscribers.discard(client)
+                if not topic_subscribers:
+                    del self.subscribers[topic]
+            client.topics.discard(topic)
+
+    def handle_message(self, websocket: WebSocket, message: str) -> bool:
+        """
+        Process `{"action": "subscribe" | "unsubscribe", "topics": ["trades:BTC-USDT", "alerts:*"]}` message,
+        returns False if it is not a subscription message.
+        """
+        client = self.connections.get(websocket)
+        try:
+            request = orjson.loads(message)
+            action, topics = request["action"], request["topics"]
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            return False
+        if client is None or action not in ("subscribe", "unsubscribe") or not isinstance(topics, list):
+            return False
+
+        parsed_topics = [self.parse_topic(str(topic)) for topic in topics]
+        if None in parsed_topics:
+            invalid_topics = [topic for topic, parsed_topic in zip(topics, parsed_topics) if parsed_topic is None]
+            client.send(orjson.dumps({"type": "error", "data": {"invalid_topics": invalid_topics}}).decode())
+            return True
+        if action == "subscribe":
+            self.subscribe(client=client, topics=parsed_topics)
+        else:
+            self.unsubscribe(client=client, topics=parsed_topics)
+        client.send(orjson.dumps({"type": "subscriptions", "data": sorted(client.topics)}).decode())
+        return True
+
+    async def run_writer(self, client: DashboardClient) -> None:
+        try:
+            await client.write()
+        except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed, RuntimeError):
+            self.disconnect(websocket=client.websocket)
+
+    def send_personal_message(self, message: str, websocket: WebSocket) -> None:
+        client = self.connections.get(websocket)
+        if client:
+            client.send(message)
+
+    def send_to(self, clients: list[DashboardClient], message: str) -> None:
+        """Queue already serialized message to clients, never waits for sockets"""
+        for client in clients:
+            if client.send(message) or client.dropped_count < self.max_dropped_messages:
+                continue
+            LOGGER.warning(f"[WS SERVER] Closing slow client, {client.dropped_count} messages dropped")
+            self.disconnect(websocket=client.websocket)
+            asyncio.create_task(client.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER))
+
+    def broadcast(self, message: str) -> None:
+        self.send_to(clients=list(self.connections.values()), message=message)
+
+    def get_clients(self, kind: str, symbol: str, include_wildcard: bool) -> list[DashboardClient]:
+        """Subscribers of `kind:symbol` and `kind:*` topics"""
+        topic_subscribers = self.subscribers.get(f"{kind}:{symbol}")
+        wildcard_subscribers = self.subscribers.get(f"{kind}:{WILDCARD_SYMBOL}") if include_wildcard else None
+        if not topic_subscribers and not wildcard_subscribers:
+            return []
+        if topic_subscribers and wildcard_subscribers and topic_subscribers is not wildcard_subscribers:
+            return list(topic_subscribers | wildcard_subscribers)
+        return list(topic_subscribers or wildcard_subscribers)
+
+    def publish(self, kind: DashboardTopicKind, symbol: str, data: dict | list, include_wildcard: bool = True) -> None:
+        """Send message to subscribers of `kind:symbol` and `kind:*` topics, through redis if the relay is enabled"""
+        clients = self.get_clients(kind=kind, symbol=symbol, include_wildcard=include_wildcard)
+        if not clients and self.outbox is None:
+            return
+        message = orjson.dumps(
+            {"type": kind, "symbol": symbol, "data": data},
+            default=default_decimal_serializer,
+        ).decode()
+        if self.outbox is None:
+            self.send_to(clients=clients, message=message)
+            return
+        # routing header is prepended, so api processes don't parse the message again
+        frame = f"{kind} {symbol} {int(include_wildcard)} {message}"
+        if self.outbox.full():
+            self.outbox.get_nowait()
+        self.outbox.put_nowait(frame)
+
+    def deliver(self, frame: bytes) -> None:
+        """Send frame received from redis to subscribers of its topics"""
+        kind, symbol, include_wildcard, message = frame.decode().split(" ", 3)
+        clients = self.get_clients(kind=kind, symbol=symbol, include_wildcard=include_wildcard == "1")
+        if clients:
+            self.send_to(clients=clients, message=message)
+
+    def enable_relay(self, max_queued_frames: int = 10000) -> None:
+        self.outbox = asyncio.Queue(maxsize=max_queued_frames)
+
+    async def run_relay(self, cache: Cache) -> None:
+        """Send published frames to redis, frames queued while redis is sent are sent in one pipeline"""
+        while True:
+            frames = [await self.outbox.get()]
+            while not self.outbox.empty():
+                frames.append(self.outbox.get_nowait())
+            try:
+                await cache.publish_many(channel=DASHBOARD_CHANNEL, messages=frames)
+            except RedisError as e:
+                # dashboard messages are live only, they are not retried
+                LOGGER.error(f"[WS SERVER] {len(frames)} messages are not relayed: {e}")
+                await asyncio.sleep(1)
 
-    async def broadcast(self, message: str):
-        for websocket_connection in self.active_connections:
+    async def run_listener(self, cache: Cache) -> None:
+        """Deliver frames published by other processes to local clients"""
+        while True:
             try:
-                await websocket_connection.send_text(message)
-            except websockets.exceptions.ConnectionClosedError:
-                self.disconnect(websocket=websocket_connection)
+                async for frame in cache.subscribe(channel=DASHBOARD_CHANNEL):
+                    self.deliver(frame=frame)
+            except RedisError as e:
+                LOGGER.error(f"[WS SERVER] Dashboard channel is lost, resubscribing: {e}")
+                await asyncio.sleep(1)
@@ -1,12 +1,36 @@
-from fastapi import APIRouter, Depends, status
+from typing import AsyncIterator
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from loguru import logger as LOGGER
 
 from app.modules.clients.kucoin_api import APIClient
 from app.utils.dependencies import get_api_client
+from app.utils.enums import OrderType, TradeSide, TradeStatus, TradeType
 
 
 accounts_router = APIRouter(prefix="/accounts")
 
 
+async def to_ndjson(first_item: dict | None, items: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    if first_item is None:
+        return
+    yield orjson.dumps(first_item) + b"\n"
+    try:
+        async for item in items:
+            yield orjson.dumps(item) + b"\n"
+    except HTTPException as e:
+        # response status is already sent, just stop the stream
+        LOGGER.error(f"[ACCOUNTS] Stream interrupted: {e.status_code} {e.detail}")
+
+
+async def stream_ndjson(items: AsyncIterator[dict]) -> StreamingResponse:
+    """First page is fetched before the response starts, so its errors are returned with their status"""
+    first_item = await anext(items, None)
+    return StreamingResponse(content=to_ndjson(first_item=first_item, items=items), media_type="application/x-ndjson")
+
+
 @accounts_router.get("/list", status_code=status.HTTP_200_OK)
 async def get_accounts(
     client: APIClient = Depends(get_api_client),
@@ -27,3 +51,45 @@ async def get_orders(
     """
     response = await client.get_orders()
     return response.json()
+
+
+@accounts_router.get("/orders/stream", status_code=status.HTTP_200_OK)
+async def stream_orders(
+    order_status: TradeStatus | None = None,
+    symbol: str | None = None,
+    side: TradeSide | None = None,
+    order_type: OrderType | None = None,
+    trade_type: TradeType = TradeType.MARGIN_ISOLATED_TRADE,
+    client: APIClient = Depends(get_api_client),
+):
+    """
+    Request via this endpoint to get all pages of your order list as NDJSON stream, one order per line.
+    """
+    orders = client.iter_orders(
+        status=order_status,
+        symbol=symbol.upper() if symbol else None,
+        side=side,
+        type=order_type,
+        trade_type=trade_type,
+    )
+    return await stream_ndjson(items=orders)
+
+
+@accounts_router.get("/fills/stream", status_code=status.HTTP_200_OK)
+async def stream_fills(
+    symbol: str | None = None,
+    side: TradeSide | None = None,
+    order_type: OrderType | None = None,
+    trade_type: TradeType = TradeType.TRADE,
+    client: APIClient = Depends(get_api_client),
+):
+    """
+    Request via this endpoint to get all pages of your trade history as NDJSON stream, one fill per line.
+    """
+    fills = client.iter_fills(
+        symbol=symbol.upper() if symbol else None,
+        side=side,
+        type=order_type,
+        trade_type=trade_type,
+    )
+    return await stream_ndjson(items=fills)
@@ -57,8 +57,10 @@ async def websocket_endpoint(websocket: WebSocket, client_id: int, ws_server: WS
     try:
         while True:
             data = await websocket.receive_text()
-            await ws_server.send_personal_message(f"You wrote: {data}", websocket)
-            await ws_server.broadcast(f"Client #{client_id} says: {data}")
+            if ws_server.handle_message(websocket=websocket, message=data):
+                continue
+            ws_server.send_personal_message(f"You wrote: {data}", websocket)
+            ws_server.broadcast(f"Client #{client_id} says: {data}")
     except WebSocketDisconnect:
         ws_server.disconnect(websocket)
-        await ws_server.broadcast(f"Client #{client_id} left the chat")
+        ws_server.broadcast(f"Client #{client_id} left the chat")
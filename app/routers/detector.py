@@ -1,34 +1,69 @@
-from fastapi import APIRouter, Depends, status
+from datetime import datetime, timedelta, timezone
 
+from fastapi import APIRouter, Depends, Query, Request, status
+from fastapi.responses import ORJSONResponse
+
+from app.db.crud_events import KucoinEventsManager
+from app.db.crud_shadow_triggers import KucoinShadowTriggersManager
 from app.db.crud_triggers import KucoinTriggersManager
-from app.managers import triggers_manager
+from app.managers import backtest_manager, shadow_manager, triggers_manager
 from app.modules.cache import Cache
-from app.modules.clients.kucoin_api import APIClient
 from app.modules.clients.kucoin_ws import WSClient
-from app.utils.dependencies import get_api_client, get_cache, get_db_triggers, get_ws_client
-from app.utils.enums import ExampleSymbols
+from app.modules.prices import PriceSnapshot
+from app.modules.shadow import ShadowEvaluator
+from app.modules.trades_archive import TradeArchive
+from app.utils.dependencies import (
+    get_cache,
+    get_db_events,
+    get_db_shadow_triggers,
+    get_db_triggers,
+    get_prices,
+    get_shadow,
+    get_trades_archive,
+    get_ws_client,
+)
+from app.utils.enums import EventKind, ExampleSymbols, TradeSide
 from app.utils.schemas import (
     AddTriggerRequestSchema,
+    BacktestRequestSchema,
+    BacktestResultSchema,
+    EventSchema,
     GetSingleTriggerSchema,
+    ShadowTriggerSchema,
     SingleTriggerSchema,
     TriggerExistsResponseSchema,
+    TriggerPairSchema,
 )
 
 
 detector_router = APIRouter(prefix="/detector")
 
 
-@detector_router.get("/triggers/all", status_code=status.HTTP_200_OK, response_model=list[GetSingleTriggerSchema])
+@detector_router.get(
+    "/triggers/all",
+    status_code=status.HTTP_200_OK,
+    response_model=list[GetSingleTriggerSchema],
+    response_class=ORJSONResponse,
+)
 async def get_all_triggers(
+    offset: int = Query(default=0, ge=0),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    symbol_prefix: str | None = None,
+    side: TradeSide | None = None,
     db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
     cache: Cache = Depends(get_cache),
 ):
     """
     Request via this endpoint to get list of active triggers.
+    Use `offset` and `limit` to paginate, `symbol_prefix` and `side` to filter triggers.
     """
     response = await triggers_manager.get_all(
         db_triggers=db_triggers,
         cache=cache,
+        offset=offset,
+        limit=limit,
+        symbol_prefix=symbol_prefix.upper() if symbol_prefix else None,
+        side=side,
     )
     return response
 
@@ -74,7 +109,7 @@ async def add_trigger(
     data: AddTriggerRequestSchema,
     db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
     ws_client: WSClient = Depends(get_ws_client),
-    api_client: APIClient = Depends(get_api_client),
+    prices: PriceSnapshot = Depends(get_prices),
     cache: Cache = Depends(get_cache),
 ):
     """
@@ -84,7 +119,7 @@ async def add_trigger(
         data=data,
         db_triggers=db_triggers,
         ws_client=ws_client,
-        api_client=api_client,
+        prices=prices,
         cache=cache,
     )
     return response
@@ -94,25 +129,16 @@ async def add_trigger(
 async def update_trigger(
     data: AddTriggerRequestSchema,
     db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
-    ws_client: WSClient = Depends(get_ws_client),
-    api_client: APIClient = Depends(get_api_client),
+    prices: PriceSnapshot = Depends(get_prices),
     cache: Cache = Depends(get_cache),
 ):
     """
     Request via this endpoint to update trigger params for given symbols pair.
     """
-    await triggers_manager.remove_trigger(
-        from_symbol=data.from_symbol,
-        to_symbol=data.to_symbol,
-        db_triggers=db_triggers,
-        ws_client=ws_client,
-        cache=cache,
-    )
-    response = await triggers_manager.add_trigger(
+    response = await triggers_manager.update_trigger(
         data=data,
         db_triggers=db_triggers,
-        ws_client=ws_client,
-        api_client=api_client,
+        prices=prices,
         cache=cache,
     )
     return response
@@ -125,6 +151,7 @@ async def remove_trigger(
     db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
     ws_client: WSClient = Depends(get_ws_client),
     cache: Cache = Depends(get_cache),
+    shadow: ShadowEvaluator = Depends(get_shadow),
 ):
     """
     Request via this endpoint to remove trigger for given symbols pair.
@@ -135,6 +162,7 @@ async def remove_trigger(
         db_triggers=db_triggers,
         ws_client=ws_client,
         cache=cache,
+        shadow=shadow,
     )
     return response
 
@@ -144,6 +172,7 @@ async def remove_all_triggers(
     db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
     ws_client: WSClient = Depends(get_ws_client),
     cache: Cache = Depends(get_cache),
+    shadow: ShadowEvaluator = Depends(get_shadow),
 ):
     """
     Request via this endpoint to remove all existing triggers.
@@ -152,5 +181,156 @@ async def remove_all_triggers(
         db_triggers=db_triggers,
         ws_client=ws_client,
         cache=cache,
+        shadow=shadow,
+    )
+    return response
+
+
+@detector_router.post("/triggers/bulk", status_code=status.HTTP_201_CREATED, response_model=list[SingleTriggerSchema])
+async def add_triggers(
+    data: list[AddTriggerRequestSchema],
+    db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
+    ws_client: WSClient = Depends(get_ws_client),
+    prices: PriceSnapshot = Depends(get_prices),
+    cache: Cache = Depends(get_cache),
+):
+    """
+    Request via this endpoint to add triggers for many symbols pairs at once.
+    Pairs that already have a trigger are skipped.
+    """
+    response = await triggers_manager.add_triggers(
+        data=data,
+        db_triggers=db_triggers,
+        ws_client=ws_client,
+        prices=prices,
+        cache=cache,
+    )
+    return response
+
+
+@detector_router.delete("/triggers/bulk", status_code=status.HTTP_200_OK, response_model=list[SingleTriggerSchema])
+async def remove_triggers(
+    data: list[TriggerPairSchema],
+    db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
+    ws_client: WSClient = Depends(get_ws_client),
+    cache: Cache = Depends(get_cache),
+    shadow: ShadowEvaluator = Depends(get_shadow),
+):
+    """
+    Request via this endpoint to remove triggers for many symbols pairs at once.
+    """
+    pairs = [TriggerPairSchema(from_symbol=pair.from_symbol.upper(), to_symbol=pair.to_symbol.upper()) for pair in data]
+    response = await triggers_manager.remove_triggers(
+        data=pairs,
+        db_triggers=db_triggers,
+        ws_client=ws_client,
+        cache=cache,
+        shadow=shadow,
+    )
+    return response
+
+
+@detector_router.get(
+    "/history",
+    status_code=status.HTTP_200_OK,
+    response_model=list[EventSchema],
+    response_class=ORJSONResponse,
+)
+async def get_history(
+    start_at: datetime | None = None,
+    end_at: datetime | None = None,
+    from_symbol: str | None = None,
+    to_symbol: str = ExampleSymbols.USDT,
+    kind: EventKind | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db_events: KucoinEventsManager = Depends(get_db_events),
+):
+    """
+    Request via this endpoint to get history of triggering trades and fired alerts, newest first.
+    Last 24 hours are returned by default.
+    """
+    end_at = end_at or datetime.now(tz=timezone.utc)
+    start_at = start_at or end_at - timedelta(days=1)
+    response = await db_events.get_list(
+        start_at=start_at,
+        end_at=end_at,
+        symbol=f"{from_symbol.upper()}-{to_symbol.upper()}" if from_symbol else None,
+        kind=kind,
+        limit=limit,
+    )
+    return response
+
+
+@detector_router.post("/backtest", status_code=status.HTTP_200_OK, response_model=list[BacktestResultSchema])
+async def backtest_triggers(
+    request: Request,
+    data: BacktestRequestSchema,
+    trades_archive: TradeArchive = Depends(get_trades_archive),
+    prices: PriceSnapshot = Depends(get_prices),
+):
+    """
+    Request via this endpoint to replay archived trades through the trigger rules for every combination
+    of the given trigger params and get alerts each combination would have sent.
+    """
+    response = await backtest_manager.run_backtest(
+        data=data,
+        trades_archive=trades_archive,
+        prices=prices,
+        max_workers=request.app.config.BACKTEST_WORKERS,
+    )
+    return response
+
+
+@detector_router.get("/shadow_triggers", status_code=status.HTTP_200_OK, response_model=list[ShadowTriggerSchema])
+async def get_shadow_triggers(
+    since: datetime | None = None,
+    db_shadow_triggers: KucoinShadowTriggersManager = Depends(get_db_shadow_triggers),
+):
+    """
+    Request via this endpoint to get shadow triggers with count of alerts they would have sent.
+    Set `since` to count only alerts after the given time.
+    """
+    response = await shadow_manager.get_all(db_shadow_triggers=db_shadow_triggers, since=since)
+    return response
+
+
+@detector_router.post("/shadow_triggers", status_code=status.HTTP_201_CREATED, response_model=ShadowTriggerSchema)
+async def add_shadow_trigger(
+    data: AddTriggerRequestSchema,
+    db_shadow_triggers: KucoinShadowTriggersManager = Depends(get_db_shadow_triggers),
+    shadow: ShadowEvaluator = Depends(get_shadow),
+    ws_client: WSClient = Depends(get_ws_client),
+):
+    """
+    Request via this endpoint to trial trigger params on the live stream.
+    Shadow triggers don't send notifications, their alerts are only recorded.
+    Any number of shadow triggers can be added for the same pair.
+    """
+    response = await shadow_manager.add_shadow_trigger(
+        data=data,
+        db_shadow_triggers=db_shadow_triggers,
+        shadow=shadow,
+        ws_client=ws_client,
+    )
+    return response
+
+
+@detector_router.delete("/shadow_triggers", status_code=status.HTTP_200_OK, response_model=ShadowTriggerSchema)
+async def remove_shadow_trigger(
+    trigger_id: int,
+    db_shadow_triggers: KucoinShadowTriggersManager = Depends(get_db_shadow_triggers),
+    db_triggers: KucoinTriggersManager = Depends(get_db_triggers),
+    shadow: ShadowEvaluator = Depends(get_shadow),
+    ws_client: WSClient = Depends(get_ws_client),
+):
+    """
+    Request via this endpoint to remove shadow trigger, its recorded alerts are removed as well.
+    """
+    response = await shadow_manager.remove_shadow_trigger(
+        trigger_id=trigger_id,
+        db_shadow_triggers=db_shadow_triggers,
+        db_triggers=db_triggers,
+        shadow=shadow,
+        ws_client=ws_client,
     )
     return response
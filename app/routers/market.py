@@ -1,10 +1,15 @@
+import asyncio
 from datetime import datetime, timedelta
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Query, status
 
+from app.modules.candles import CandleStore, candles_to_columns
 from app.modules.clients.kucoin_api import APIClient
-from app.utils.dependencies import get_api_client
-from app.utils.enums import CandleType, ExampleSymbols, OrdersCount
+from app.modules.live_candles import LiveCandlesBuilder
+from app.modules.order_book import OrderBookManager
+from app.modules.trades_archive import TradeArchive
+from app.utils.dependencies import get_api_client, get_candles, get_live_candles, get_order_books, get_trades_archive
+from app.utils.enums import CandleType, ExampleSymbols, LiveCandleInterval, OrdersCount
 
 
 market_router = APIRouter(prefix="/market")
@@ -93,23 +98,29 @@ async def get_order_book_part(
     from_symbol: str = ExampleSymbols.GENS,
     to_symbol: str = ExampleSymbols.USDT,
     count: OrdersCount = OrdersCount.GET_20,
-    client: APIClient = Depends(get_api_client),
+    step: float | None = Query(default=None, gt=0),
+    order_books: OrderBookManager = Depends(get_order_books),
 ):
     """
     Request via this endpoint to get a list of open orders for a symbol.
 
     Level-2 order book includes all bids and asks (aggregated by price).
     This level returns only one size for each active price (as if there was only a single order for that price).
+
+    Books of triggers symbols are served from the local mirror, others from a REST snapshot,
+    set `step` to aggregate price levels by the given price step.
     """
-    response = await client.get_order_book(from_symbol=from_symbol.upper(), to_symbol=to_symbol.upper(), count=count)
-    return response.json()
+    book = await order_books.watch(symbol=f"{from_symbol.upper()}-{to_symbol.upper()}", count=count)
+    return {"code": "200000", "data": book.to_dict(depth=int(count), step=step)}
 
 
 @market_router.get("/order_book/full", status_code=status.HTTP_200_OK, deprecated=True)
 async def get_order_book_full(
     from_symbol: str = ExampleSymbols.GENS,
     to_symbol: str = ExampleSymbols.USDT,
-    client: APIClient = Depends(get_api_client),
+    depth: int | None = Query(default=None, gt=0),
+    step: float | None = Query(default=None, gt=0),
+    order_books: OrderBookManager = Depends(get_order_books),
 ):
     """
     Request via this endpoint to get the order book of the specified symbol.
@@ -117,13 +128,14 @@ async def get_order_book_full(
     Level 2 order book includes all bids and asks (aggregated by price).
     This level returns only one aggregated size for each price (as if there was only one single order for that price).
 
-    This API will return data with full depth.
+    This API will return data with full depth, or top `depth` levels when given.
 
-    It is generally used by professional traders because it uses more server resources and traffic,
-    and we have strict access frequency control.
+    Books of triggers symbols are served from the local mirror, which is synced with one full depth snapshot
+    from KuCoin and kept up to date with websocket changes, others are served from a REST snapshot.
+    Set `step` to aggregate price levels by the given price step.
     """
-    response = await client.get_order_book_full(from_symbol=from_symbol.upper(), to_symbol=to_symbol.upper())
-    return response.json()
+    book = await order_books.watch(symbol=f"{from_symbol.upper()}-{to_symbol.upper()}")
+    return {"code": "200000", "data": book.to_dict(depth=depth, step=step)}
 
 
 @market_router.get("/histories", status_code=status.HTTP_200_OK)
@@ -139,6 +151,29 @@ async def get_trade_histories(
     return response
 
 
+@market_router.get("/histories/archive", status_code=status.HTTP_200_OK)
+async def get_archived_trades(
+    from_time: datetime,
+    to_time: datetime,
+    from_symbol: str = ExampleSymbols.GENS,
+    to_symbol: str = ExampleSymbols.USDT,
+    bucket_seconds: int = Query(default=60, ge=1),
+    trades_archive: TradeArchive = Depends(get_trades_archive),
+):
+    """
+    Request via this endpoint to get aggregated archived trades of the specified symbol.
+    Only symbols with active triggers are archived.
+    Data are returned as a dict of column arrays per `bucket_seconds` bucket, empty buckets are skipped.
+    """
+    return await asyncio.to_thread(
+        trades_archive.aggregate,
+        symbol=f"{from_symbol.upper()}-{to_symbol.upper()}",
+        start_ns=int(from_time.timestamp() * 1_000_000_000),
+        end_ns=int(to_time.timestamp() * 1_000_000_000),
+        bucket_sec=bucket_seconds,
+    )
+
+
 @market_router.get("/candles", status_code=status.HTTP_200_OK)
 async def get_klines(
     from_time: datetime = (datetime.utcnow() - timedelta(hours=2)),
@@ -146,17 +181,41 @@ async def get_klines(
     from_symbol: str = ExampleSymbols.GENS,
     to_symbol: str = ExampleSymbols.USDT,
     candle_type: CandleType = CandleType.GET_3_MIN,
-    client: APIClient = Depends(get_api_client),
+    columnar: bool = False,
+    candle_store: CandleStore = Depends(get_candles),
 ):
     """
     Request via this endpoint to get the kline of the specified symbol.
     Data are returned in grouped buckets based on requested type.
+
+    Closed candles are served from the local store, missing ranges are synced from KuCoin first.
+    Set `columnar` to get a dict of column arrays instead of a list of candles.
     """
-    response = await client.get_klines(
+    candles = await candle_store.query(
         from_symbol=from_symbol.upper(),
         to_symbol=to_symbol.upper(),
         candle_type=candle_type,
-        from_time=from_time,
-        to_time=to_time,
+        start_ts=int(from_time.timestamp()),
+        end_ts=int(to_time.timestamp()),
     )
-    return response
+    columns = candles_to_columns(candles=candles)
+    if columnar:
+        return columns
+    columns["time"] = [datetime.fromtimestamp(ts) for ts in columns["time"]]
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+@market_router.get("/candles/live", status_code=status.HTTP_200_OK)
+async def get_live_klines(
+    from_symbol: str = ExampleSymbols.GENS,
+    to_symbol: str = ExampleSymbols.USDT,
+    interval: LiveCandleInterval = LiveCandleInterval.GET_1_MIN,
+    limit: int = Query(default=100, ge=1, le=1000),
+    live_candles: LiveCandlesBuilder = Depends(get_live_candles),
+):
+    """
+    Request via this endpoint to get live candles of the specified symbol, aggregated from the trades stream.
+    Only symbols with active triggers are available, the last candle is still open.
+    Data are returned as a dict of column arrays, oldest candle first.
+    """
+    return live_candles.get_columns(symbol=f"{from_symbol.upper()}-{to_symbol.upper()}", interval=interval, limit=limit)
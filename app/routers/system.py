@@ -1,15 +1,20 @@
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, status
+
+from app.modules.readiness import Readiness
+from app.utils.dependencies import get_readiness
 
 
 system_router = APIRouter(prefix="/system")
 
 
 @system_router.get("/healthcheck", status_code=status.HTTP_200_OK)
-async def healthcheck():
+async def healthcheck(readiness: Readiness = Depends(get_readiness)):
     """
     Healthcheck endpoint.
 
     ### Response
-    * {"msg": "ok"}
+    * {"msg": "ok", "ready": true, "phases": {"probes_done": 0.412, ...}, "components": {"db": true, ...}}
+
+    Phases are seconds since the process start, `first_evaluation` is the time to the first trade checked by triggers.
     """
-    return {"msg": "ok"}
+    return {"msg": "ok", **readiness.to_dict()}
@@ -1,9 +1,18 @@
 from fastapi import Request, WebSocket
 
+from app.db.crud_events import KucoinEventsManager
+from app.db.crud_shadow_triggers import KucoinShadowTriggersManager
 from app.db.crud_triggers import KucoinTriggersManager
 from app.modules.cache import Cache
+from app.modules.candles import CandleStore
 from app.modules.clients.kucoin_api import APIClient
 from app.modules.clients.kucoin_ws import WSClient
+from app.modules.live_candles import LiveCandlesBuilder
+from app.modules.order_book import OrderBookManager
+from app.modules.prices import PriceSnapshot
+from app.modules.readiness import Readiness
+from app.modules.shadow import ShadowEvaluator
+from app.modules.trades_archive import TradeArchive
 from app.modules.ws_server import WSServer
 
 
@@ -11,6 +20,26 @@ def get_api_client(request: Request) -> APIClient:
     return request.app.api_client
 
 
+def get_candles(request: Request) -> CandleStore:
+    return request.app.candles
+
+
+def get_live_candles(request: Request) -> LiveCandlesBuilder:
+    return request.app.live_candles
+
+
+def get_order_books(request: Request) -> OrderBookManager:
+    return request.app.order_books
+
+
+def get_trades_archive(request: Request) -> TradeArchive:
+    return request.app.trades_archive
+
+
+def get_prices(request: Request) -> PriceSnapshot:
+    return request.app.prices
+
+
 def get_ws_client(request: Request) -> WSClient:
     return request.app.ws_client
 
@@ -25,3 +54,19 @@ def get_cache(request: Request) -> Cache:
 
 def get_db_triggers(request: Request) -> KucoinTriggersManager:
     return request.app.db_triggers
+
+
+def get_db_events(request: Request) -> KucoinEventsManager:
+    return request.app.db_events
+
+
+def get_db_shadow_triggers(request: Request) -> KucoinShadowTriggersManager:
+    return request.app.db_shadow_triggers
+
+
+def get_shadow(request: Request) -> ShadowEvaluator:
+    return request.app.shadow
+
+
+def get_readiness(request: Request) -> Readiness:
+    return request.app.readiness
@@ -71,3 +71,55 @@ class OrderType(StrEnum):
     MARKET = "market"
     LIMIT_STOP = "limit_stop"
     MARKET_STOP = "market_stop"
+
+
+class RequestPriority(IntEnum):
+    PRICES = 0
+    USER = 1
+    BULK = 2
+
+
+class RateLimitPool(StrEnum):
+    PUBLIC = "public"
+    SPOT = "spot"
+    MANAGEMENT = "management"
+
+
+class LiveCandleInterval(StrEnum):
+    GET_1_SEC = "1s"
+    GET_1_MIN = "1min"
+    GET_5_MIN = "5min"
+
+
+class BookAlertKind(StrEnum):
+    IMBALANCE = "imbalance"
+    WALL_ADDED = "wall_added"
+    WALL_REMOVED = "wall_removed"
+
+
+class EventKind(StrEnum):
+    TRADE = "trade"
+    ALERT = "alert"
+
+
+class DashboardTopicKind(StrEnum):
+    TRADES = "trades"
+    ALERTS = "alerts"
+    CANDLES = "candles"
+    BOOK = "book"
+    STATE = "state"
+
+
+class StartupPhase(StrEnum):
+    PROBES_DONE = "probes_done"
+    WS_CONNECTED = "ws_connected"
+    TRIGGERS_RESTORED = "triggers_restored"
+    FIRST_EVALUATION = "first_evaluation"
+
+
+class AppRole(StrEnum):
+    API = "api"
+    INGEST = "ingest"
+    CONSUMER = "consumer"
+    SCHEDULER = "scheduler"
+    BOT = "bot"
@@ -2,9 +2,10 @@ import decimal
 from datetime import datetime
 
 import orjson
-from pydantic import BaseModel
+from pydantic import BaseModel, PositiveInt
 
-from app.utils.enums import ExampleSymbols, TradeSide, TradeStatus, TradeType, TriggerPeriods
+from app.db.models import DEFAULT_COOLDOWN_SECONDS
+from app.utils.enums import EventKind, ExampleSymbols, TradeSide, TradeStatus, TradeType, TriggerPeriods
 
 
 class TimestampMixin(BaseModel):
@@ -71,6 +72,12 @@ class AddTriggerRequestSchema(BaseModel):
 
     side: TradeSide = TradeSide.BOTH
     period_seconds: TriggerPeriods = TriggerPeriods.SET_3_MINUTES
+    cooldown_seconds: PositiveInt = DEFAULT_COOLDOWN_SECONDS
+
+
+class TriggerPairSchema(BaseModel):
+    from_symbol: str = ExampleSymbols.PEPE
+    to_symbol: str = ExampleSymbols.USDT
 
 
 class CachedTriggerSchema(TimestampMixin):
@@ -80,7 +87,7 @@ class CachedTriggerSchema(TimestampMixin):
     transactions_max_count: int
     period_seconds: TriggerPeriods
     side: TradeSide
-    is_notified: bool = False
+    cooldown_seconds: int = DEFAULT_COOLDOWN_SECONDS
 
 
 class SingleTriggerSchema(TimestampMixin):
@@ -94,6 +101,7 @@ class SingleTriggerSchema(TimestampMixin):
 
     side: TradeSide | None
     period_seconds: TriggerPeriods
+    cooldown_seconds: int
     started_at: datetime
 
     class Config:
@@ -106,5 +114,49 @@ class GetSingleTriggerSchema(SingleTriggerSchema):
     current_count: int | None
 
 
+class ShadowTriggerSchema(SingleTriggerSchema):
+    id: int
+    alerts_count: int = 0
+    last_alert_at: datetime | None = None
+
+
 class TriggerExistsResponseSchema(BaseModel):
     exists: bool
+
+
+class EventSchema(TimestampMixin):
+    time: datetime
+    kind: EventKind
+    symbol: str
+    side: TradeSide | None
+    size: float | None
+    value_usdt: float | None
+    transactions_count: int | None
+
+    class Config:
+        orm_mode = True
+
+
+class BacktestRequestSchema(BaseModel):
+    pairs: list[TriggerPairSchema]
+    from_time: datetime
+    to_time: datetime
+
+    # every combination of the given values is backtested
+    min_value_usdt: list[float] = [0.0]
+    max_value_usdt: list[float] = [100.0]
+    transactions_max_count: list[int] = [10]
+    period_seconds: list[TriggerPeriods] = [TriggerPeriods.SET_3_MINUTES]
+    side: list[TradeSide] = [TradeSide.BOTH]
+    cooldown_seconds: list[PositiveInt] = [DEFAULT_COOLDOWN_SECONDS]
+
+
+class BacktestResultSchema(BaseModel):
+    min_value_usdt: float
+    max_value_usdt: float
+    transactions_max_count: int
+    period_seconds: TriggerPeriods
+    side: TradeSide
+    cooldown_seconds: int
+    alerts_count: int
+    alerts: dict[str, list[int]]  # symbol -> alerts unix times
@@ -1,36 +1,55 @@
 import asyncio
 import decimal
+import time
 from decimal import Decimal
 
+import orjson
 import websockets.exceptions
 from loguru import logger as LOGGER
 
 from app.db.crud_triggers import KucoinTriggersManager
 from app.modules.amqp import AMQPClient
+from app.modules.batcher import CopyBatcher
 from app.modules.bot import TGBot
 from app.modules.cache import Cache
-from app.modules.clients.kucoin_api import APIClient
 from app.modules.clients.kucoin_ws import WSClient
-from app.utils.enums import TradeSide
+from app.modules.conflator import StateConflator
+from app.modules.leader import get_election_name, is_valid_token
+from app.modules.live_candles import LiveCandlesBuilder
+from app.modules.order_book import LEVEL2_TOPIC, OrderBookManager
+from app.modules.ownership import SymbolOwnership
+from app.modules.prices import PriceSnapshot
+from app.modules.readiness import Readiness
+from app.modules.reconciler import TriggersReconciler
+from app.modules.shadow import ShadowEvaluator
+from app.modules.trades_archive import TradeArchive
+from app.modules.ws_server import WSServer
+from app.utils.enums import AppRole, DashboardTopicKind, EventKind, StartupPhase, TradeSide
 from app.utils.schemas import CachedTriggerSchema, KucoinWSMessage, ParsedWSMessage
 
 
 TRIGGERING_MESSAGES_QUEUE = "triggering_messages"
+# triggering events are kept for an hour, so `all transactions count` is a rolling hourly count
+EVENTS_RETENTION_SEC = 60 * 60
 
 
 async def update_prices(
     cache: Cache,
-    api_client: APIClient,
+    prices: PriceSnapshot,
     db_triggers: KucoinTriggersManager,
+    ownership: SymbolOwnership | None,
     update_period_sec: int = 60,
 ) -> None:
-    """Update price in USDT for each trigger saved in database, periodically"""
+    """Update price in USDT for each trigger saved in database and owned by this node, periodically"""
     while True:
         try:
             triggers = await db_triggers.get_list()
+            await prices.refresh()
             for trigger in triggers:
                 name = f"{trigger.from_symbol}-{trigger.to_symbol}"
-                trigger_price = await api_client.get_price_in_usdt(from_symbol=trigger.from_symbol)
+                if ownership and not ownership.owns(symbol=name):
+                    continue
+                trigger_price = await prices.get_price_in_usdt(from_symbol=trigger.from_symbol)
                 cached_trigger = await cache.get(name=name)
                 if cached_trigger is None:
                     cached_trigger = {}
@@ -46,21 +65,117 @@ async def update_prices(
             break
 
 
-async def listen_websocket(cache: Cache, ws_client: WSClient, amqp_client: AMQPClient) -> None:
+async def reconcile_triggers(
+    reconciler: TriggersReconciler,
+    check_period_sec: float = 5,
+    update_period_sec: int = 60 * 60,
+) -> None:
+    """
+    Apply triggers changed via api of other nodes and ingest nodes changes to subscriptions and cache,
+    as soon as they change and hourly to catch changes missed while the database listener was down.
+    """
+    version = reconciler.version
+    reconciled_at = time.monotonic()
+    while True:
+        await asyncio.sleep(check_period_sec)
+        try:
+            # shadow triggers table is small and has no change notifications, so it is polled
+            is_shadow_changed = await reconciler.sync_shadow_triggers()
+            if (
+                not is_shadow_changed
+                and reconciler.version == version
+                and time.monotonic() - reconciled_at < update_period_sec
+            ):
+                # state of symbols taken over arrives when their previous owner notices the change
+                await reconciler.take_over()
+                continue
+            version = reconciler.version
+            reconciled_at = time.monotonic()
+            await reconciler.reconcile()
+        except Exception as e:
+            LOGGER.error(f"Exception during reconciling triggers: {e}")
+
+
+async def track_trigger_books(
+    db_triggers: KucoinTriggersManager,
+    order_books: OrderBookManager,
+    ownership: SymbolOwnership | None,
+    update_period_sec: int = 60,
+) -> None:
+    """Keep order books mirrored for each trigger saved in database and owned by this node, periodically"""
+    while True:
+        try:
+            triggers = await db_triggers.get_list()
+            symbols = {f"{trigger.from_symbol}-{trigger.to_symbol}" for trigger in triggers}
+            if ownership:
+                symbols = ownership.filter(symbols=symbols)
+            # track is a no-op for synced books and restarts the sync of books failed to sync
+            for symbol in symbols:
+                await order_books.track(symbol=symbol)
+            for symbol in set(order_books.books) - symbols:
+                await order_books.unwatch(symbol=symbol)
+        except Exception as e:
+            LOGGER.error(f"Exception during tracking order books: {e}")
+        await asyncio.sleep(update_period_sec)
+
+
+async def listen_websocket(
+    cache: Cache,
+    ws_client: WSClient,
+    amqp_client: AMQPClient,
+    live_candles: LiveCandlesBuilder,
+    order_books: OrderBookManager,
+    ws_server: WSServer,
+    events: CopyBatcher,
+    trades_archive: TradeArchive,
+    shadow: ShadowEvaluator,
+    conflator: StateConflator,
+    readiness: Readiness,
+) -> None:
     """1. Start listening websocket fo new messages and run function to process each message"""
     try:
         async for message in ws_client.websocket:
-            await process_message(cache=cache, message=message, amqp_client=amqp_client)
+            await process_message(
+                cache=cache,
+                message=message,
+                amqp_client=amqp_client,
+                live_candles=live_candles,
+                order_books=order_books,
+                ws_server=ws_server,
+                events=events,
+                trades_archive=trades_archive,
+                shadow=shadow,
+                conflator=conflator,
+                readiness=readiness,
+            )
     except websockets.exceptions.ConnectionClosedError:
         LOGGER.error("[TASK] Websocket connection error on Kucoin side")
+        if readiness.is_draining:
+            return
         await ws_client.connect()
 
 
-async def process_message(cache: Cache, message: str | bytes, amqp_client: AMQPClient) -> None:
+async def process_message(
+    cache: Cache,
+    message: str | bytes,
+    amqp_client: AMQPClient,
+    live_candles: LiveCandlesBuilder,
+    order_books: OrderBookManager,
+    ws_server: WSServer,
+    events: CopyBatcher,
+    trades_archive: TradeArchive,
+    shadow: ShadowEvaluator,
+    conflator: StateConflator,
+    readiness: Readiness,
+) -> None:
     """2. Convert message to pydantic model and process it for each message type."""
 
-    # 1. convert message
-    kucoin_message: KucoinWSMessage = KucoinWSMessage.parse_raw(message)
+    # 1. convert message, order book deltas go to the book without model validation
+    raw_message = orjson.loads(message)
+    if (raw_message.get("topic") or "").startswith(LEVEL2_TOPIC):
+        order_books.process_delta(data=raw_message["data"])
+        return
+    kucoin_message: KucoinWSMessage = KucoinWSMessage.parse_obj(raw_message)
 
     # 2. get message type and process data if needed
     if kucoin_message.type == "welcome":
@@ -72,6 +187,54 @@ async def process_message(cache: Cache, message: str | bytes, amqp_client: AMQPC
         LOGGER.debug(f"[WS CLIENT] Server confirmed {message}")
         return
     if kucoin_message.type == "message":
+        # kucoin sends time in nanoseconds
+        time_ns = int(raw_message["data"]["time"])
+        price = float(kucoin_message.data.price)
+        size = float(kucoin_message.data.size)
+
+        # aggregate live candles, push trade and closed bars to dashboard, publishing never waits for clients
+        closed_bars = live_candles.add_trade(
+            symbol=kucoin_message.data.symbol,
+            ts=time_ns / 1_000_000_000,
+            price=price,
+            size=size,
+        )
+        ws_server.publish(
+            kind=DashboardTopicKind.TRADES,
+            symbol=kucoin_message.data.symbol,
+            data={
+                "time": time_ns // 1_000_000,
+                "price": price,
+                "size": size,
+                "side": kucoin_message.data.side,
+            },
+        )
+        conflator.update(
+            symbol=kucoin_message.data.symbol,
+            last_price=price,
+            last_side=kucoin_message.data.side,
+            last_trade_at=time_ns // 1_000_000,
+        )
+        if closed_bars:
+            ws_server.publish(kind=DashboardTopicKind.CANDLES, symbol=kucoin_message.data.symbol, data=closed_bars)
+
+        # archive trade
+        trades_archive.add_trade(
+            symbol=kucoin_message.data.symbol,
+            time_ns=time_ns,
+            price=price,
+            size=size,
+            side=kucoin_message.data.side,
+        )
+
+        # evaluate shadow triggers on the same trade, their alerts are only recorded
+        shadow.process_trade(
+            symbol=kucoin_message.data.symbol,
+            time_ns=time_ns,
+            side=kucoin_message.data.side,
+            size=size,
+        )
+
         # parse message
         parsed_message: ParsedWSMessage = ParsedWSMessage(
             symbol=kucoin_message.data.symbol,
@@ -79,10 +242,11 @@ async def process_message(cache: Cache, message: str | bytes, amqp_client: AMQPC
             size=kucoin_message.data.size,
             time=kucoin_message.data.time,
         )
-        await process_data(cache=cache, data=parsed_message, amqp_client=amqp_client)
+        await process_data(cache=cache, data=parsed_message, amqp_client=amqp_client, events=events)
+        readiness.mark(StartupPhase.FIRST_EVALUATION)
 
 
-async def process_data(cache: Cache, data: ParsedWSMessage, amqp_client: AMQPClient) -> None:
+async def process_data(cache: Cache, data: ParsedWSMessage, amqp_client: AMQPClient, events: CopyBatcher) -> None:
     """3. Process websocket messages with type `message`"""
 
     # 1. check if transaction is triggering
@@ -95,6 +259,18 @@ async def process_data(cache: Cache, data: ParsedWSMessage, amqp_client: AMQPCli
     if not is_triggering:
         return
 
+    # record triggering trade to history, written in batches
+    events.put(
+        {
+            "time": data.time,
+            "kind": EventKind.TRADE,
+            "symbol": data.symbol,
+            "side": data.side,
+            "size": float(data.size),
+            "value_usdt": float(decimal.Decimal(cached_trigger["price_usdt"]) * data.size),
+        }
+    )
+
     # add message to rabbitmq
     await amqp_client.publish(queue_name=TRIGGERING_MESSAGES_QUEUE, data=data.dict())
 
@@ -148,9 +324,22 @@ async def check_if_triggering(cache: Cache, symbol: str, size: decimal, side: Tr
     return is_triggering, cached_trigger
 
 
-async def process_triggered_data(cache: Cache, bot: TGBot, amqp_client: AMQPClient) -> None:
+async def process_triggered_data(
+    cache: Cache,
+    bot: TGBot,
+    amqp_client: AMQPClient,
+    events: CopyBatcher,
+    ws_server: WSServer,
+    conflator: StateConflator,
+    is_fenced: bool,
+) -> None:
     """Process consumed messages from rabbitmq"""
     async for message in amqp_client.consume(queue_name=TRIGGERING_MESSAGES_QUEUE):
+        # messages of a replaced ingest leader are dropped, so a stale leader can't double alerts
+        token = message.get("fencing_token")
+        if is_fenced and not await is_valid_token(cache=cache, name=get_election_name(AppRole.INGEST), token=token):
+            LOGGER.warning(f"[TASK] Dropping message with stale fencing token: {message}")
+            continue
         parsed_message = ParsedWSMessage(**message)
         # 1. get cached trigger
 
@@ -163,15 +352,30 @@ async def process_triggered_data(cache: Cache, bot: TGBot, amqp_client: AMQPClie
 
         # 2. add record for to cached events table
         cached_events_table = f"EVENTS-{cached_trigger_table_name}"
-        await cache.add_for_now(name=cached_events_table, time=parsed_message.time)
+        await cache.add_for_now(
+            name=cached_events_table,
+            time=parsed_message.time,
+            retention_seconds=max(parsed_trigger.period_seconds, EVENTS_RETENTION_SEC),
+        )
 
         # 3. get count of cached events
         transactions_count = await cache.get_count_for_period(
             name=cached_events_table,
             period_seconds=parsed_trigger.period_seconds,
         )
+        is_notified = await cache.is_notified(name=cached_trigger_table_name)
+        conflator.update(
+            symbol=parsed_message.symbol,
+            window_count=transactions_count,
+            transactions_max_count=parsed_trigger.transactions_max_count,
+            period_seconds=parsed_trigger.period_seconds,
+            is_notified=is_notified,
+        )
         if transactions_count == parsed_trigger.transactions_max_count:
-            if not parsed_trigger.is_notified:
+            # the flag is set atomically and expires with the trigger cooldown, so it is re-armed exactly
+            if not is_notified and await cache.set_notified(
+                name=cached_trigger_table_name, cooldown_seconds=parsed_trigger.cooldown_seconds
+            ):
                 # 4. send telegram notification
                 cached_transactions_count = await cache.get_count(name=f"EVENTS-{cached_trigger_table_name}")
                 text = (
@@ -183,8 +387,30 @@ async def process_triggered_data(cache: Cache, bot: TGBot, amqp_client: AMQPClie
                     f"all transactions count: {cached_transactions_count}"
                 )
                 await bot.send_notification(text=text)
-                parsed_trigger.is_notified = True
-                await cache.add(name=cached_trigger_table_name, obj=parsed_trigger.dict())
+                ws_server.publish(
+                    kind=DashboardTopicKind.ALERTS,
+                    symbol=parsed_message.symbol,
+                    data={
+                        "time": int(parsed_message.time.timestamp() * 1000),
+                        "side": parsed_trigger.side,
+                        "transactions_count": transactions_count,
+                        "period_seconds": parsed_trigger.period_seconds,
+                    },
+                )
+                events.put(
+                    {
+                        "time": parsed_message.time,
+                        "kind": EventKind.ALERT,
+                        "symbol": parsed_message.symbol,
+                        "side": parsed_trigger.side,
+                        "transactions_count": transactions_count,
+                    }
+                )
+                conflator.update(
+                    symbol=parsed_message.symbol,
+                    is_notified=True,
+                    last_alert_at=int(parsed_message.time.timestamp() * 1000),
+                )
 
 
 def make_log_string(side: str, size: Decimal, summ: Decimal, from_symbol: str, to_symbol: str) -> str:
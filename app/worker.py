@@ -0,0 +1,52 @@
+"""
+Runs application roles without the HTTP API.
+
+    python -m app.worker --roles ingest,consumer,scheduler,bot
+
+Roles default to `APP_ROLES` setting without `api`.
+Trades written by ingest are read by the api routes, so `TRADES_DIR` must be shared with api processes.
+"""
+import argparse
+import asyncio
+import signal
+
+from loguru import logger as LOGGER
+
+from app.application import Application
+from app.configs import Settings
+from app.utils.enums import AppRole
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Kucoin detector worker")
+    parser.add_argument("--roles", help=f"comma separated roles: {','.join(AppRole)}")
+    return parser.parse_args()
+
+
+async def run(settings: Settings) -> None:
+    # application registers its signal handlers on the running loop, so it is created inside it
+    application = Application(settings=settings)
+    await application.router.startup()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop_event.set)
+    LOGGER.warning(f"[WORKER] Running roles: {sorted(application.roles)}")
+    await stop_event.wait()
+
+    LOGGER.warning("[WORKER] Stopping...")
+    await application.router.shutdown()
+
+
+def main() -> None:
+    args = parse_args()
+    settings = Settings()
+    settings.APP_ROLES = args.roles or ",".join(role for role in settings.ROLES if role != AppRole.API)
+    if not settings.ROLES:
+        raise SystemExit("No roles to run")
+    asyncio.run(run(settings=settings))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,6 @@ echo "# ======================= Updating database schema"
 python -m alembic upgrade head
 
 echo "# ======================= Starting Service"
-python -m uvicorn --host 0.0.0.0 --port 8000 --use-colors --log-level debug "app.main:app"
+python -m uvicorn --host 0.0.0.0 --port 8000 --use-colors --log-level debug \
+    --workers "${APP_WORKERS:-1}" \
+    --ws-per-message-deflate "${WS_PER_MESSAGE_DEFLATE:-true}" "app.main:app"